@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking
+from .models import CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking, LLMCall
+from . import telemetry
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -68,3 +69,32 @@ class GoalTrackingAdmin(admin.ModelAdmin):
     list_filter = ('goal_type', 'is_achieved', 'target_date', 'created_at')
     search_fields = ('user__phone_number', 'goal_title')
     ordering = ('-target_date',)
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    """Read-only LLM telemetry with per-day totals and the heaviest users above the list"""
+    change_list_template = 'admin/ai_integration/llmcall/change_list.html'
+    list_display = ('created_at', 'user', 'purpose', 'cache', 'outcome', 'input_tokens', 'output_tokens', 'latency_ms')
+    list_filter = ('purpose', 'cache', 'outcome', 'created_at')
+    search_fields = ('user__phone_number',)
+    list_select_related = ('user',)
+    ordering = ('-created_at',)
+    # Counting every row for the paginator gets slow on a large table
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        # Rows still buffered in this process show up in the totals too
+        telemetry.buffer.flush()
+        extra_context = {
+            **(extra_context or {}),
+            'daily_usage': telemetry.daily_usage(),
+            'user_usage': telemetry.user_usage(),
+            'telemetry': telemetry.buffer.stats(),
+        }
+        return super().changelist_view(request, extra_context)
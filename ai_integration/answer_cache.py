@@ -0,0 +1,115 @@
+"""In-process answer cache for the AI chat.
+
+Answers are keyed by the normalized question plus a fingerprint of the profile
+fields that ``create_personalized_prompt`` reads (and, mid-conversation, of the
+conversation context), so users with the same question and the same profile
+share one Gemini round trip. Entries are evicted
+least-recently-used once the cache is full and expire after a fixed TTL. A
+profile change gives the user a new fingerprint, so their old entries simply
+stop matching; ``invalidate_user`` frees the entries the user created early,
+leaving answers other users with the same profile fields still read.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .prompts import profile_fingerprint
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return _WHITESPACE_RE.sub(" ", question.strip().lower()).rstrip(" ?!.")
+
+
+class AnswerCache:
+    """Size-bounded LRU cache with per-entry TTL and hit/miss accounting"""
+
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    def make_key(self, question, user_profile, conversation=None):
+        """``conversation`` is the fingerprint of the conversation context, None outside a conversation"""
+        key = (normalize_question(question), profile_fingerprint(user_profile))
+        return key if conversation is None else key + (conversation,)
+
+    def get(self, key):
+        """Return the cached answer for ``key`` or None, refreshing its LRU position"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            answer, expires_at, latency, user_id = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += latency
+            return answer
+
+    def set(self, key, answer, latency=0.0, user_id=None):
+        """Store an answer; ``latency`` is what a hit saves, ``user_id`` (its creator) enables invalidation"""
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic() + self.ttl, latency, user_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """Drop the answers the user created; returns how many"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[3] == user_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'saved_seconds': round(self.saved_seconds, 3),
+                'saved_llm_calls': self.hits,
+            }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+    ttl=settings.CHAT_CACHE_TTL,
+)
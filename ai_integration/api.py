@@ -0,0 +1,513 @@
+"""JSON API for the mobile client.
+
+Lists use keyset pagination (an opaque cursor holding the ordering values of
+the last row, so every page is an index range scan however deep the client
+pages), ``?fields=`` sparse field selection and rows serialized straight from
+``values()``. With a shared cache, GETs carry an ETag and Last-Modified derived
+from the per-user version stamps in versions.py, so a client revalidating
+unchanged data gets a 304 without a single database query.
+"""
+import base64
+import hashlib
+import json
+from datetime import date, datetime, time
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError
+from django.db.models import Q
+from django.forms.models import model_to_dict
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_http_methods, require_POST
+
+from . import conversation, goals, jobs, rollups, sync, tokens, versions
+from .calendar_index import WORKOUT_FIELDS, MEAL_FIELDS
+from .chat import answer_question
+from .context import UserContext, get_user_context
+from .dashboard import DashboardSnapshot, PROGRESS_FIELDS, GOAL_FIELDS
+from .forms import LoginForm, RegisterForm, UserProfileForm, WorkoutScheduleForm, MealPlanForm, DailyProgressForm, GoalTrackingForm
+from .models import WorkoutSchedule, MealPlan, DailyProgress, GoalTracking, Job, ChatMessage
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DEFAULT_TREND_PERIODS = 12
+MAX_TREND_PERIODS = 120
+
+JOB_FIELDS = (
+    'id', 'task', 'status', 'attempts', 'max_attempts', 'result', 'error', 'created_at', 'started_at', 'finished_at',
+)
+
+
+class Resource:
+    """How one user-owned model is listed, filtered and written through the API"""
+
+    def __init__(self, name, model, fields, ordering, date_field, form_class, flag=None):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.ordering = ordering
+        self.date_field = date_field
+        self.form_class = form_class
+        # Boolean set by the PATCH .../complete/ or .../consume/ action
+        self.flag = flag
+
+    @property
+    def ordering_fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+
+RESOURCES = {
+    'workouts': Resource('workouts', WorkoutSchedule, WORKOUT_FIELDS, ('scheduled_date', 'scheduled_time', 'id'),
+                         'scheduled_date', WorkoutScheduleForm, flag='is_completed'),
+    'meals': Resource('meals', MealPlan, MEAL_FIELDS, ('scheduled_date', 'scheduled_time', 'id'),
+                      'scheduled_date', MealPlanForm, flag='is_consumed'),
+    'progress': Resource('progress', DailyProgress, PROGRESS_FIELDS, ('-date', '-id'), 'date', DailyProgressForm),
+    'goals': Resource('goals', GoalTracking, GOAL_FIELDS, ('target_date', 'id'), 'target_date', GoalTrackingForm),
+}
+
+# Read-only: messages are appended by the chat endpoints
+CHAT_HISTORY = Resource('chat', ChatMessage, conversation.MESSAGE_FIELDS, ('-id',), 'created_at__date', None)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def error_response(message, status=400, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def api_view(view):
+    """JSON 401 instead of a login redirect, 400 for bad input, private revalidated caching"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response("Authentication required", status=401)
+        try:
+            response = view(request, *args, **kwargs)
+        except BadRequest as e:
+            return error_response(str(e))
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie', 'Authorization'])
+        return response
+    return wrapper
+
+
+def _versioned(*resources, daily=False):
+    """``condition()`` arguments answering from the user's version stamps of ``resources``
+
+    A view routed with a ``resource`` kwarg is versioned by that resource alone.
+    ``daily`` views also depend on today's date (today's lists, age), so their
+    validators change at midnight even when no stamp moved. Without a shared
+    cache (see ``versions.enabled``) no validators are sent and every GET is
+    answered in full.
+    """
+    def stamps(request, **kwargs):
+        names = [kwargs['resource']] if 'resource' in kwargs else resources
+        return versions.current(request.user.pk, *names)
+
+    def etag(request, *args, **kwargs):
+        if not versions.enabled():
+            return None
+        # The full path is part of the tag: each page and field selection is its own representation
+        raw = f"{request.user.pk}:{stamps(request, **kwargs)}:{request.get_full_path()}"
+        if daily:
+            raw += f":{date.today().isoformat()}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if not versions.enabled():
+            return None
+        modified = versions.last_modified(stamps(request, **kwargs))
+        if daily:
+            modified = max(modified, timezone.make_aware(datetime.combine(date.today(), time.min)))
+        return modified
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise BadRequest("Request body must be JSON")
+    if not isinstance(data, dict):
+        raise BadRequest("Request body must be a JSON object")
+    return data
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder)
+
+
+def encode_cursor(row, resource):
+    values = [row[field] for field in resource.ordering_fields]
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, resource):
+    """Ordering values of the last row of the previous page, converted back to Python"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        fields = [resource.model._meta.get_field(name) for name in resource.ordering_fields]
+        if len(values) != len(fields):
+            raise ValueError
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        raise BadRequest("Invalid cursor")
+
+
+def after_cursor(resource, values):
+    """Rows strictly after ``values`` in the resource ordering, e.g. (a > x) OR (a = x AND b > y)"""
+    condition_q = Q()
+    for i, field in enumerate(resource.ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f"{name}__{lookup}": values[i]})
+        for previous, value in zip(resource.ordering_fields[:i], values[:i]):
+            clause &= Q(**{previous: value})
+        condition_q |= clause
+    return condition_q
+
+
+def _selected_fields(request, allowed):
+    """Fields named in ``?fields=`` (unknown names are a 400), or all of ``allowed``"""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(allowed)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _query_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise BadRequest(f"'{name}' must be a date (YYYY-MM-DD)")
+    return day
+
+
+def _page_size(request, maximum=MAX_PAGE_SIZE, default=DEFAULT_PAGE_SIZE):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        raise BadRequest("'limit' must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def list_rows(request, resource):
+    """One page of the user's rows: {"results": [...], "next_cursor": "..." or null}"""
+    fields = _selected_fields(request, resource.fields)
+    limit = _page_size(request)
+    rows = resource.model.objects.filter(user=request.user)
+    start, end = _query_date(request, 'from'), _query_date(request, 'to')
+    if start:
+        rows = rows.filter(**{f"{resource.date_field}__gte": start})
+    if end:
+        rows = rows.filter(**{f"{resource.date_field}__lte": end})
+    cursor = request.GET.get('cursor')
+    if cursor:
+        rows = rows.filter(after_cursor(resource, decode_cursor(cursor, resource)))
+
+    # The ordering values are always fetched for the cursor, then dropped if not requested
+    extra = [field for field in resource.ordering_fields if field not in fields]
+    page = list(rows.order_by(*resource.ordering).values(*fields, *extra)[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1], resource) if len(page) > limit else None
+    page = page[:limit]
+    if extra:
+        for row in page:
+            for field in extra:
+                del row[field]
+    return {'results': page, 'next_cursor': next_cursor}
+
+
+def _row(instance, fields):
+    return {field: getattr(instance, instance._meta.get_field(field).attname) for field in fields}
+
+
+def _bind_form(form_class, instance, body):
+    """Form for ``body`` on top of the instance's values (model defaults when creating)
+
+    Clients only send the fields they set or change.
+    """
+    current = model_to_dict(instance or form_class._meta.model(), fields=form_class._meta.fields)
+    return form_class({**current, **body}, instance=instance)
+
+
+def _save_form(form, user, resource):
+    """Save a bound form for ``user``; returns the row as JSON or the validation errors"""
+    if not form.is_valid():
+        return error_response("Invalid data", errors=form.errors.get_json_data())
+    instance = form.save(commit=False)
+    created = instance._state.adding
+    instance.user = user
+    try:
+        instance.save()
+    except IntegrityError:
+        return error_response("Conflicts with an existing entry", status=409)
+    return json_response(_row(instance, resource.fields), status=201 if created else 200)
+
+
+@api_view
+@require_http_methods(["GET", "HEAD", "POST"])
+@_versioned()
+def collection_view(request, resource):
+    """GET lists the user's rows, POST creates one (progress upserts on its date)"""
+    resource = RESOURCES[resource]
+    if request.method != 'POST':
+        return json_response(list_rows(request, resource))
+
+    data = json_body(request)
+    instance = None
+    try:
+        day = parse_date(str(data.get('date') or '')) if resource.model is DailyProgress else None
+    except ValueError:
+        day = None  # Left to the form's validation
+    if day:
+        # One progress entry per day: posting a known date updates it
+        instance = DailyProgress.objects.filter(user=request.user, date=day).first()
+    return _save_form(_bind_form(resource.form_class, instance, data), request.user, resource)
+
+
+@api_view
+@require_http_methods(["GET", "HEAD", "PUT", "PATCH", "DELETE"])
+@_versioned()
+def detail_view(request, resource, pk):
+    """GET one row, PUT/PATCH update the given fields, DELETE removes it"""
+    resource = RESOURCES[resource]
+    rows = resource.model.objects.filter(user=request.user, pk=pk)
+    if request.method in ('GET', 'HEAD'):
+        row = rows.values(*_selected_fields(request, resource.fields)).first()
+        return json_response(row) if row else error_response("Not found", status=404)
+
+    if request.method == 'DELETE':
+        instance = rows.first()
+        if instance is None:
+            return error_response("Not found", status=404)
+        instance.delete()
+        return HttpResponse(status=204)
+
+    instance = rows.first()
+    if instance is None:
+        return error_response("Not found", status=404)
+    return _save_form(_bind_form(resource.form_class, instance, json_body(request)), request.user, resource)
+
+
+@api_view
+@require_http_methods(["PATCH", "POST"])
+def mark_done_view(request, resource, pk):
+    """Mark a workout completed or a meal consumed in a single UPDATE"""
+    resource = RESOURCES[resource]
+    updated = resource.model.objects.filter(user=request.user, pk=pk).update(
+        **{resource.flag: True, 'updated_at': timezone.now()}
+    )
+    if not updated:
+        return error_response("Not found", status=404)
+    # update() sends no post_save signal and skips auto_now
+    versions.bump(request.user.pk, resource.name)
+    if resource.model is WorkoutSchedule:
+        goals.evaluate_user_goals(request.user.pk, goals.WORKOUT_GOAL_TYPES)
+    return json_response({'id': pk, resource.flag: True})
+
+
+@api_view
+@require_http_methods(["GET", "HEAD"])
+@_versioned('progress')
+def progress_trends_view(request):
+    """Weekly or monthly progress totals and averages (``?period=week|month``), newest first"""
+    period = request.GET.get('period', 'week')
+    if period not in rollups.PERIODS:
+        raise BadRequest("'period' must be 'week' or 'month'")
+    limit = _page_size(request, maximum=MAX_TREND_PERIODS, default=DEFAULT_TREND_PERIODS)
+    results = rollups.trends(request.user, period, limit, _query_date(request, 'from'), _query_date(request, 'to'))
+    return json_response({'period': period, 'results': results})
+
+
+@api_view
+@require_http_methods(["GET", "HEAD"])
+@_versioned(*sync.FEEDS)
+def sync_view(request):
+    """Rows changed and ids deleted since ``?cursor=`` across workouts, meals, progress and goals"""
+    limit = _page_size(request, maximum=settings.SYNC_PAGE_SIZE, default=settings.SYNC_PAGE_SIZE)
+    try:
+        changes = sync.changes_since(request.user, request.GET.get('cursor'), limit)
+    except sync.InvalidCursor as e:
+        raise BadRequest(str(e))
+    return json_response(changes)
+
+
+@api_view
+@require_http_methods(["GET", "HEAD"])
+@_versioned(*versions.RESOURCES, daily=True)
+def dashboard_view(request):
+    """Today's dashboard snapshot; ``?fields=`` picks top-level keys"""
+    snapshot = DashboardSnapshot(request.user, context=get_user_context(request)).load()
+    fields = _selected_fields(request, snapshot)
+    return json_response({field: snapshot[field] for field in fields})
+
+
+@api_view
+@require_http_methods(["GET", "HEAD", "PUT", "PATCH"])
+@_versioned('profile', daily=True)
+def profile_view(request):
+    """GET the profile with its derived values, PUT/PATCH update the given fields"""
+    context = get_user_context(request)
+    profile = context.profile
+    if request.method in ('GET', 'HEAD'):
+        if profile is None:
+            return error_response("Profile not found", status=404)
+        summary = context.summary
+        return json_response({field: summary[field] for field in _selected_fields(request, summary)})
+
+    form = _bind_form(UserProfileForm, profile, json_body(request))
+    if not form.is_valid():
+        return error_response("Invalid data", errors=form.errors.get_json_data())
+    profile = form.save(commit=False)
+    profile.user = request.user
+    profile.save()
+    return json_response(UserContext(request.user, profile).summary)
+
+
+@api_view
+@require_POST
+def generate_plan_view(request):
+    """Queue an AI-generated week of workouts and meals from ``start`` (default today); poll the job"""
+    start = json_body(request).get('start')
+    if start is not None:
+        try:
+            start = parse_date(str(start))
+        except ValueError:
+            start = None
+        if start is None:
+            raise BadRequest("'start' must be a date (YYYY-MM-DD)")
+        start = start.isoformat()
+    job = jobs.enqueue('generate_weekly_plan', user=request.user, priority=5, start=start)
+    return json_response({'job': job.pk, 'status': job.status, 'status_url': reverse('api_job', args=[job.pk])},
+                         status=202)
+
+
+@api_view
+@require_http_methods(["GET", "HEAD"])
+def job_view(request, pk):
+    """Status of one of the user's background jobs, with its result once finished; poll until then"""
+    job = Job.objects.filter(user=request.user, pk=pk).values(*JOB_FIELDS).first()
+    if job is None:
+        return error_response("Not found", status=404)
+    response = json_response(job)
+    if job['status'] in (Job.QUEUED, Job.RUNNING):
+        response['Retry-After'] = max(1, round(settings.JOB_POLL_INTERVAL))
+    return response
+
+
+@api_view
+@require_http_methods(["POST"])
+def chat_view(request):
+    """POST {"message": "..."} and get {"message": answer} back"""
+    question = str(json_body(request).get('message', '')).strip()
+    if not question:
+        raise BadRequest("'message' is required")
+    answer, ok = answer_question(question, get_user_context(request).profile, request.user)
+    return json_response({'message': answer}, status=200 if ok else 503)
+
+
+@api_view
+@require_http_methods(["GET", "HEAD"])
+@_versioned('chat')
+def chat_history_view(request):
+    """The user's chat messages, newest first; pass ``next_cursor`` back as ``?cursor=`` for older ones"""
+    return json_response(list_rows(request, CHAT_HISTORY))
+
+
+# Token authentication. These endpoints take credentials in the body, not cookies,
+# so they are exempt from CSRF checks.
+
+def auth_error(message, status=400):
+    return JsonResponse({'success': False, 'error': message}, status=status)
+
+
+def _user_json(user):
+    return {
+        'id': user.pk,
+        'phone_number': user.phone_number,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+    }
+
+
+def _auth_body(request):
+    try:
+        return json_body(request)
+    except BadRequest:
+        return None
+
+
+@csrf_exempt
+@require_POST
+def auth_login_view(request):
+    """Exchange a phone number and password for an access token and a refresh token"""
+    data = _auth_body(request)
+    if data is None:
+        return auth_error("Request body must be a JSON object")
+    form = LoginForm(request, data=data)
+    if not form.is_valid():
+        return auth_error("Invalid phone number or password. Please try again.", status=401)
+    user = form.get_user()
+    return JsonResponse({'success': True, 'user': _user_json(user), **tokens.issue_tokens(user)})
+
+
+@csrf_exempt
+@require_POST
+def auth_register_view(request):
+    data = _auth_body(request)
+    if data is None:
+        return auth_error("Request body must be a JSON object")
+    form = RegisterForm(data)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'error': "Please correct the errors below.",
+                             'errors': form.errors.get_json_data()}, status=400)
+    user = form.save(commit=False)
+    user.set_password(form.cleaned_data['password'])
+    user.save()
+    return JsonResponse({'success': True, 'user': _user_json(user)}, status=201)
+
+
+@csrf_exempt
+@require_POST
+def auth_refresh_view(request):
+    """Trade a refresh token for a new access token and a new refresh token"""
+    data = _auth_body(request) or {}
+    try:
+        user = tokens.rotate_refresh_token(data.get('refresh_token'))
+    except tokens.InvalidToken as e:
+        return auth_error(str(e), status=401)
+    return JsonResponse({'success': True, **tokens.issue_tokens(user)})
+
+
+@csrf_exempt
+@require_POST
+def auth_logout_view(request):
+    """Revoke the given refresh token, or all of the user's with ``{"all": true}``"""
+    data = _auth_body(request) or {}
+    tokens.revoke_refresh_token(data.get('refresh_token'))
+    if data.get('all') and request.user.is_authenticated:
+        tokens.revoke_all(request.user.pk)
+    return JsonResponse({'success': True})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AiIntegrationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ai_integration"
+
+    def ready(self):
+        from . import metrics, signals, tasks  # noqa: F401
@@ -0,0 +1,73 @@
+"""Per-day calendar index for workouts and meals.
+
+Rows are grouped into one bucket per date in a single pass, sorted by time
+within each day, so week and month views iterate over ready-made buckets
+instead of scanning every item once per day.
+"""
+from calendar import monthrange
+from datetime import timedelta
+
+from .models import WorkoutSchedule, MealPlan
+
+
+WORKOUT_FIELDS = (
+    'id', 'workout_name', 'scheduled_date', 'scheduled_time', 'duration_minutes',
+    'workout_type', 'is_completed', 'notes',
+)
+MEAL_FIELDS = (
+    'id', 'meal_type', 'scheduled_date', 'scheduled_time', 'meal_name', 'calories',
+    'protein', 'carbs', 'fats', 'is_consumed', 'notes',
+)
+
+
+def _scheduled_time(row):
+    return row['scheduled_time']
+
+
+def bucket_by_date(start, end, **streams):
+    """Group each named stream of rows into per-day buckets for ``start``..``end``
+
+    Returns one dict per day, e.g. ``{'date': day, 'workouts': [...], 'meals': [...]}``
+    for ``bucket_by_date(start, end, workouts=rows, meals=rows)``. Rows outside
+    the range are ignored.
+    """
+    days = {}
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        days[day] = {'date': day, **{name: [] for name in streams}}
+
+    for name, rows in streams.items():
+        for row in rows:
+            bucket = days.get(row['scheduled_date'])
+            if bucket is not None:
+                bucket[name].append(row)
+
+    for bucket in days.values():
+        for name in streams:
+            # Already ordered when the rows come from an ordered query, which keeps this sort linear
+            bucket[name].sort(key=_scheduled_time)
+    return list(days.values())
+
+
+class CalendarIndex:
+    """Workouts and meals of one user grouped by day, two queries per range"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def range(self, start, end):
+        workouts = WorkoutSchedule.objects.filter(
+            user=self.user, scheduled_date__range=[start, end]
+        ).order_by('scheduled_date', 'scheduled_time').values(*WORKOUT_FIELDS)
+        meals = MealPlan.objects.filter(
+            user=self.user, scheduled_date__range=[start, end]
+        ).order_by('scheduled_date', 'scheduled_time').values(*MEAL_FIELDS)
+        return bucket_by_date(start, end, workouts=workouts, meals=meals)
+
+    def week(self, day):
+        start = day - timedelta(days=day.weekday())
+        return self.range(start, start + timedelta(days=6))
+
+    def month(self, day):
+        start = day.replace(day=1)
+        return self.range(start, day.replace(day=monthrange(day.year, day.month)[1]))
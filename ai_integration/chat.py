@@ -0,0 +1,74 @@
+"""Answering chat questions: conversation context, answer cache, near-duplicate
+index, prompt coalescing and the LLM gateway.
+
+Shared by the chat page and the JSON chat API so both go through the same
+caching and load-shedding path and record the same history.
+"""
+import logging
+import time
+
+from . import conversation, semantic, telemetry
+from .answer_cache import answer_cache
+from .coalescing import prompt_flight, prompt_key
+from .llm import get_gateway
+from .models import LLMCall
+from .prompts import create_personalized_prompt
+
+
+logger = logging.getLogger(__name__)
+
+
+CHAT_ERROR_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+
+
+def stored_answer(question, user_profile, context, user_id=None):
+    """``(cache_key, answer)`` where the answer is an exact cache hit, a near-duplicate's answer or None"""
+    started = time.perf_counter()
+    cache_key = answer_cache.make_key(question, user_profile, context.fingerprint)
+    answer = answer_cache.get(cache_key)
+    source = LLMCall.EXACT
+    # A follow-up may lean on earlier turns; another user's standalone question cannot answer it
+    if answer is None and context.fingerprint is None:
+        answer = semantic.get_index().match(question, semantic.profile_bucket(user_profile))
+        source = LLMCall.SEMANTIC
+    if answer is not None:
+        telemetry.record(LLMCall.CHAT, user_id, seconds=time.perf_counter() - started, cache=source)
+    return cache_key, answer
+
+
+def store_answer(cache_key, question, user_profile, context, answer, latency, user_id):
+    answer_cache.set(cache_key, answer, latency, user_id)
+    # Answers that lean on earlier turns of a conversation are not reused for other questions
+    if context.fingerprint is None:
+        semantic.get_index().add(question, semantic.profile_bucket(user_profile), answer)
+
+
+def answer_question(question, user_profile, user):
+    """Return ``(answer, ok)``; on failure the answer is the apology shown to the user
+
+    Answered questions are added to the user's chat history.
+    """
+    context = conversation.load_context(user.pk)
+    cache_key, answer = stored_answer(question, user_profile, context, user.pk)
+    if answer is None:
+        # Create personalized prompt with user data and the conversation so far
+        personalized_prompt = create_personalized_prompt(question, user_profile) + context.text
+        called = []
+
+        def generate():
+            called.append(True)
+            return get_gateway().generate(personalized_prompt, purpose=LLMCall.CHAT, user_id=user.pk)
+
+        started = time.monotonic()
+        try:
+            # Identical prompts already in flight share a single upstream call
+            answer = prompt_flight.do(prompt_key(personalized_prompt), generate)
+        except Exception as e:
+            logger.exception("Chat answer failed")
+            return f"{CHAT_ERROR_MESSAGE} Error: {str(e)}", False
+        if not called:
+            # Shared another caller's request, which the gateway recorded with its tokens
+            telemetry.record(LLMCall.CHAT, user.pk, seconds=time.monotonic() - started, cache=LLMCall.COALESCED)
+        store_answer(cache_key, question, user_profile, context, answer, time.monotonic() - started, user.pk)
+    conversation.record_turn(user, question, answer, context)
+    return answer, True
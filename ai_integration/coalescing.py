@@ -0,0 +1,121 @@
+"""Single-flight coalescing of identical in-flight LLM prompts.
+
+When many users send a byte-identical prompt at the same moment only the first
+caller (the leader) goes upstream; everyone else arriving while that call is
+in flight waits for it and receives the same answer. Within a process this is
+done with threads and events. With ``shared_cache`` set, workers also
+coordinate through the Django cache: one worker holds a short lock for the
+prompt and publishes the answer, the others poll for it.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, shared_cache=None, lock_timeout=30.0, result_ttl=5.0, poll_interval=0.05):
+        self.shared_cache = shared_cache
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.remote_coalesced = 0
+
+    def do(self, key, fn):
+        """Return ``fn()``, sharing one execution between concurrent callers with the same key"""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._execute(key, fn)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run(self, fn):
+        with self._lock:
+            self.executions += 1
+        return fn()
+
+    def _execute(self, key, fn):
+        if self.shared_cache is None:
+            return self._run(fn)
+
+        lock_key = f"singleflight:lock:{key}"
+        result_key = f"singleflight:result:{key}"
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            if self.shared_cache.add(lock_key, os.getpid(), self.lock_timeout):
+                try:
+                    result = self._run(fn)
+                    self.shared_cache.set(result_key, result, self.result_ttl)
+                    return result
+                finally:
+                    self.shared_cache.delete(lock_key)
+            # Another worker is leading this prompt; wait for its published answer
+            result = self.shared_cache.get(result_key)
+            if result is not None:
+                with self._lock:
+                    self.remote_coalesced += 1
+                return result
+            if time.monotonic() >= deadline:
+                return self._run(fn)
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            shared = self.coalesced + self.remote_coalesced
+            return {
+                'calls': self.calls,
+                'upstream_calls': self.executions,
+                'coalesced': self.coalesced,
+                'remote_coalesced': self.remote_coalesced,
+                'coalescing_ratio': round(shared / self.calls, 4) if self.calls else 0.0,
+                'in_flight': len(self._calls),
+                'cross_worker': self.shared_cache is not None,
+            }
+
+
+prompt_flight = SingleFlight(
+    shared_cache=caches[settings.LLM_COALESCE_CACHE] if settings.LLM_COALESCE_ACROSS_WORKERS else None,
+    lock_timeout=settings.LLM_CALL_TIMEOUT,
+)
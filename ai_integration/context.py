@@ -0,0 +1,137 @@
+"""Request-scoped user context: the user, their profile and derived body metrics.
+
+``user_context_middleware`` gives every request a lazy ``request.user_context``
+that loads the profile at most once per request (async views use
+``aget_user_context``). With a shared cache (``CACHE_SHARED``) the profile
+row is also cached across requests and dropped whenever the profile is saved
+or deleted (see signals.py); a per-process cache would miss deletes made by
+other workers, so without one each request reads the row once. Users resolved
+from a bearer token already carry their profile.
+Age, BMI and the nutrition targets (BMR, TDEE, calories and macros, see
+nutrition.py) are computed once per context, so views, templates and the JSON
+API all read the same memoized values.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from . import nutrition
+from .models import CustomUser, UserProfile
+
+
+# Stored for users without a profile, so they are cached too
+NO_PROFILE = {}
+
+_profile_rel = CustomUser._meta.get_field('userprofile')
+_profile_fields = [field.attname for field in UserProfile._meta.concrete_fields]
+
+
+def _cache_key(user_id):
+    return f"userctx:{user_id}"
+
+
+class UserContext:
+    """A user and their profile (or None) with memoized derived values"""
+
+    def __init__(self, user, profile):
+        self.user = user
+        self.profile = profile
+
+    @cached_property
+    def age(self):
+        return self.profile.get_age() if self.profile else None
+
+    @cached_property
+    def bmi(self):
+        return self.profile.get_bmi() if self.profile else None
+
+    @cached_property
+    def targets(self):
+        """nutrition.Targets for the profile, None until weight, height and date of birth are set"""
+        profile = self.profile
+        if profile is None:
+            return None
+        return nutrition.targets(profile.weight, profile.height, self.age, profile.gender,
+                                 profile.activity_level, profile.fitness_goal)
+
+    @property
+    def bmr(self):
+        """Basal metabolic rate (Mifflin-St Jeor)"""
+        return self.targets.bmr if self.targets else None
+
+    @property
+    def tdee(self):
+        """Maintenance calories: BMR times the activity multiplier"""
+        return self.targets.tdee if self.targets else None
+
+    @cached_property
+    def summary(self):
+        """Plain dict of the profile with its derived and display values, None without a profile"""
+        profile = self.profile
+        if profile is None:
+            return None
+        summary = {name: getattr(profile, name) for name in _profile_fields}
+        summary.update({
+            'age': self.age,
+            'bmi': self.bmi,
+            'bmr': self.bmr,
+            'tdee': self.tdee,
+            'calorie_target': self.targets.calories if self.targets else None,
+            'protein_g': self.targets.protein_g if self.targets else None,
+            'carbs_g': self.targets.carbs_g if self.targets else None,
+            'fats_g': self.targets.fats_g if self.targets else None,
+            'gender_display': profile.get_gender_display() if profile.gender else '',
+            'fitness_goal_display': profile.get_fitness_goal_display() if profile.fitness_goal else '',
+            'activity_level_display': profile.get_activity_level_display() if profile.activity_level else '',
+        })
+        return summary
+
+
+def _load_profile(user):
+    if _profile_rel.is_cached(user):
+        # Bearer-token users come with their profile already resolved
+        return _profile_rel.get_cached_value(user)
+    if not settings.CACHE_SHARED:
+        return UserProfile.objects.filter(user=user).first()
+    key = _cache_key(user.pk)
+    values = cache.get(key)
+    if values is None:
+        profile = UserProfile.objects.filter(user=user).first()
+        values = {name: getattr(profile, name) for name in _profile_fields} if profile else NO_PROFILE
+        cache.set(key, values, settings.USER_CONTEXT_CACHE_TTL)
+        return profile
+    if values == NO_PROFILE:
+        return None
+    return UserProfile.from_db('default', list(values), list(values.values()))
+
+
+def load_user_context(user):
+    """UserContext for ``user``, answered from the cache when possible"""
+    if not user.is_authenticated:
+        return UserContext(user, None)
+    profile = _load_profile(user)
+    # user.userprofile now answers without a query as well
+    _profile_rel.set_cached_value(user, profile)
+    return UserContext(user, profile)
+
+
+def invalidate_user_context(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def get_user_context(request):
+    """The request's UserContext, loaded on first use"""
+    context = getattr(request, '_user_context', None)
+    if context is None:
+        context = request._user_context = load_user_context(request.user)
+    return context
+
+
+async def aget_user_context(request):
+    context = getattr(request, '_user_context', None)
+    if context is None:
+        user = await request.auser()
+        context = request._user_context = await sync_to_async(load_user_context)(user)
+    return context
+
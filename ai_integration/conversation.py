@@ -0,0 +1,144 @@
+"""Chat history and the bounded conversation context sent with each question.
+
+Messages are append-only rows, read newest first through the (user, id)
+index: the history API pages with a keyset cursor, and the context of the next
+question is the latest ``CHAT_CONTEXT_TURNS`` turns verbatim plus a rolling
+summary of everything older, together under ``CHAT_CONTEXT_MAX_TOKENS``. The
+summary is not rewritten on every turn: once ``CHAT_SUMMARY_EVERY`` turns have
+dropped out of the verbatim window, a background job (see tasks.py) folds them
+into it with one LLM call. Loading the context reads a fixed number of rows,
+so prompt size and latency stay flat however long a conversation grows.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import jobs, versions
+from .llm import get_gateway
+from .models import ChatMessage, ChatSummary, Job, LLMCall
+from .prompts import CHARS_PER_TOKEN
+
+
+MESSAGE_FIELDS = ('id', 'role', 'content', 'created_at')
+
+ROLE_LABELS = {ChatMessage.USER: 'User', ChatMessage.ASSISTANT: 'Assistant'}
+
+CONTEXT_TEMPLATE = (
+    "\n\nEARLIER IN THIS CONVERSATION:\n{lines}\n\n"
+    "Answer the new question in light of this conversation."
+)
+
+SUMMARY_LINE = "Summary of older messages: {summary}"
+
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and their fitness and nutrition assistant in at most {words} "
+    "words. Keep what later answers need: the user's situation, goals, constraints and preferences, and the "
+    "advice or plans already given. Reply with the summary only.\n\n{previous}{transcript}"
+)
+
+# A single long message never fills the whole window
+MESSAGE_CHAR_LIMIT = 600
+
+ConversationContext = namedtuple('ConversationContext', ['text', 'fingerprint', 'summary_due'])
+
+NO_CONTEXT = ConversationContext('', None, False)
+
+
+def _clip(content, limit=MESSAGE_CHAR_LIMIT):
+    return content if len(content) <= limit else content[:limit - 1].rstrip() + "…"
+
+
+def _line(role, content):
+    return f"{ROLE_LABELS[role]}: {_clip(content)}"
+
+
+def render_context(summary, messages, budget):
+    """Conversation block for a prompt: the summary, then as many of ``messages`` (oldest first) as fit
+
+    The newest messages are kept when the block would exceed ``budget`` tokens.
+    """
+    if not summary and not messages:
+        return ''
+    room = budget * CHARS_PER_TOKEN - len(CONTEXT_TEMPLATE.format(lines=''))
+    lines = []
+    if summary:
+        lines.append(SUMMARY_LINE.format(summary=summary[:settings.CHAT_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN]))
+        room -= len(lines[0]) + 1
+    recent = []
+    for role, content in reversed(messages):
+        line = _line(role, content)
+        if len(line) + 1 > room:
+            break
+        recent.append(line)
+        room -= len(line) + 1
+    lines.extend(reversed(recent))
+    return CONTEXT_TEMPLATE.format(lines="\n".join(lines))
+
+
+def load_context(user_id):
+    """The conversation context of the user's next question, from two bounded index reads"""
+    summary, through = ChatSummary.objects.filter(user_id=user_id).values_list(
+        'text', 'summarized_through').first() or ('', 0)
+    window = settings.CHAT_CONTEXT_TURNS * 2
+    # Reading one summary batch past the window tells whether the summary is due
+    lookahead = window + settings.CHAT_SUMMARY_EVERY * 2
+    rows = list(ChatMessage.objects.filter(user_id=user_id, id__gt=through).order_by('-id').values_list(
+        'role', 'content')[:lookahead])
+    text = render_context(summary, rows[:window][::-1], settings.CHAT_CONTEXT_MAX_TOKENS)
+    if not text:
+        return NO_CONTEXT
+    return ConversationContext(text, hashlib.sha1(text.encode()).hexdigest(), len(rows) >= lookahead)
+
+
+def record_turn(user, question, answer, context=NO_CONTEXT):
+    """Append a question and its answer; queue a summary refresh when ``context`` says it is due"""
+    ChatMessage.objects.bulk_create([
+        ChatMessage(user=user, role=ChatMessage.USER, content=question),
+        ChatMessage(user=user, role=ChatMessage.ASSISTANT, content=answer),
+    ])
+    # bulk_create sends no post_save signal
+    versions.bump(user.pk, 'chat')
+    if context.summary_due:
+        pending = Job.objects.filter(task='summarize_chat', user=user, status__in=(Job.QUEUED, Job.RUNNING))
+        if not pending.exists():
+            jobs.enqueue('summarize_chat', user=user)
+
+
+def _summarize(user_id, summary, messages):
+    prompt = SUMMARY_PROMPT.format(
+        words=settings.CHAT_SUMMARY_MAX_TOKENS * 3 // 4,
+        previous=f"Summary so far: {summary}\n\n" if summary else "",
+        transcript="\n".join(_line(role, content) for message_id, role, content in messages),
+    )
+    answer = get_gateway().generate(prompt, purpose=LLMCall.SUMMARY, user_id=user_id)
+    return answer.strip()[:settings.CHAT_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN]
+
+
+def refresh_summary(user_id):
+    """Fold the messages older than the verbatim window into the summary, one batch per LLM call
+
+    Returns the number of messages folded in.
+    """
+    ChatSummary.objects.get_or_create(user_id=user_id)
+    window = settings.CHAT_CONTEXT_TURNS * 2
+    folded = 0
+    while True:
+        summary, through = ChatSummary.objects.filter(user_id=user_id).values_list(
+            'text', 'summarized_through').get()
+        newer = ChatMessage.objects.filter(user_id=user_id, id__gt=through)
+        # The newest message outside the verbatim window
+        cutoff = next(iter(newer.order_by('-id').values_list('id', flat=True)[window:window + 1]), None)
+        if cutoff is None:
+            return folded
+        batch = list(newer.filter(id__lte=cutoff).order_by('id').values_list(
+            'id', 'role', 'content')[:settings.CHAT_SUMMARY_EVERY * 2])
+        text = _summarize(user_id, summary, batch)
+        updated = ChatSummary.objects.filter(user_id=user_id, summarized_through=through).update(
+            text=text, summarized_through=batch[-1][0], updated_at=timezone.now(),
+        )
+        if not updated:
+            # Another worker folded these messages first
+            return folded
+        folded += len(batch)
@@ -0,0 +1,222 @@
+"""Dashboard snapshot service.
+
+Loads everything the dashboard and trainer pages (and JSON clients) show for a
+user and a date in a fixed number of queries, independent of how much data the
+user has: workouts, meals, today's progress and active goals, plus the profile
+from the request's user context. The result is a plain dict of plain values
+with counts and calorie needs already computed, so it can be cached or
+serialized as-is.
+
+The four queries do not depend on each other. ``aload`` runs them
+concurrently for the async page views. Django's async ORM sends every query
+through one shared sync thread, so gathering its coroutines only overlaps the
+waiting, not the round trips. With ``DASHBOARD_PARALLEL_QUERIES`` (off by
+default) each query instead runs on its own thread (and database connection)
+of a small pool, and the page waits for the slowest query rather than the sum
+of all four. That pays off against a remote database, at the price of up to
+``DASHBOARD_QUERY_THREADS`` more connections per worker; pool connections
+follow ``CONN_MAX_AGE`` like request connections do. Each connection reads
+its own snapshot, and rows written in the caller's open transaction are not
+visible to them.
+
+``daily_tip`` asks the LLM for a short tip of the day for the trainer page,
+cached per user and day. With ``DASHBOARD_AI_TIP`` the async trainer view
+requests it alongside the queries.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .calendar_index import WORKOUT_FIELDS, MEAL_FIELDS, bucket_by_date
+from .context import load_user_context
+from .llm import get_gateway
+from .models import WorkoutSchedule, MealPlan, DailyProgress, GoalTracking, LLMCall
+
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = (
+    'id', 'date', 'weight', 'calories_consumed', 'calories_burned', 'water_intake_glasses',
+    'steps_taken', 'mood_rating', 'notes',
+)
+GOAL_FIELDS = (
+    'id', 'goal_type', 'goal_title', 'target_value', 'current_value', 'target_date', 'is_achieved',
+)
+
+
+class DashboardSnapshot:
+    """Everything a user's dashboard shows for one date, loaded in QUERY_COUNT queries
+
+    Pass the request's ``user_context`` to reuse its profile; otherwise one is
+    loaded for ``user``.
+    """
+
+    QUERY_COUNT = 4
+    UPCOMING_DAYS = 7
+
+    def __init__(self, user, day=None, context=None):
+        self.user = user
+        self.context = context
+        self.day = day or date.today()
+        self.week_start = self.day - timedelta(days=self.day.weekday())
+        self.week_end = self.week_start + timedelta(days=6)
+        self.upcoming_end = self.day + timedelta(days=self.UPCOMING_DAYS)
+
+    # One query per schedule table covering the week and the upcoming window,
+    # split into today / week / upcoming in Python
+
+    def _workouts(self):
+        return WorkoutSchedule.objects.filter(
+            user=self.user, scheduled_date__range=[self.week_start, self.upcoming_end]
+        ).order_by('scheduled_date', 'scheduled_time').values(*WORKOUT_FIELDS)
+
+    def _meals(self):
+        return MealPlan.objects.filter(
+            user=self.user, scheduled_date__range=[self.week_start, self.week_end]
+        ).order_by('scheduled_date', 'scheduled_time').values(*MEAL_FIELDS)
+
+    def _today_progress(self):
+        return DailyProgress.objects.filter(user=self.user, date=self.day).values(*PROGRESS_FIELDS)
+
+    def _active_goals(self):
+        return GoalTracking.objects.filter(
+            user=self.user, is_achieved=False, target_date__gte=self.day
+        ).order_by('target_date').values(*GOAL_FIELDS)
+
+    def load(self):
+        context = self.context or load_user_context(self.user)
+        return self._build(
+            context, list(self._workouts()), list(self._meals()), self._today_progress().first(),
+            list(self._active_goals()),
+        )
+
+    async def aload(self, parallel=None):
+        """``load`` for async views, with the queries in flight together
+
+        ``parallel`` (default: ``DASHBOARD_PARALLEL_QUERIES``) runs them on the
+        query pool instead of through the async ORM.
+        """
+        if parallel is None:
+            parallel = settings.DASHBOARD_PARALLEL_QUERIES
+        context = self.context or await sync_to_async(load_user_context)(self.user)
+        if parallel:
+            rows = await asyncio.gather(
+                _in_pool(list, self._workouts()), _in_pool(list, self._meals()),
+                _in_pool(lambda queryset: queryset.first(), self._today_progress()),
+                _in_pool(list, self._active_goals()),
+            )
+        else:
+            rows = await asyncio.gather(
+                _alist(self._workouts()), _alist(self._meals()), self._today_progress().afirst(),
+                _alist(self._active_goals()),
+            )
+        return self._build(context, *rows)
+
+    def _build(self, context, workouts, meals, today_progress, active_goals):
+        day = self.day
+        today_workouts = [w for w in workouts if w['scheduled_date'] == day]
+        today_meals = [m for m in meals if m['scheduled_date'] == day]
+        week_workouts = [w for w in workouts if w['scheduled_date'] <= self.week_end]
+        upcoming_workouts = [w for w in workouts if w['scheduled_date'] >= day]
+
+        return {
+            'today': day,
+            'week_start': self.week_start,
+            'week_end': self.week_end,
+            'profile': context.summary,
+            'daily_calories': context.tdee or 0,
+            'today_workouts': today_workouts,
+            'today_meals': today_meals,
+            'week_workouts': week_workouts,
+            'week_meals': meals,
+            'upcoming_workouts': upcoming_workouts,
+            'week_calendar': bucket_by_date(self.week_start, self.week_end, workouts=week_workouts, meals=meals),
+            'upcoming_calendar': bucket_by_date(day, self.upcoming_end, workouts=upcoming_workouts),
+            'today_progress': today_progress,
+            'active_goals': active_goals,
+            'counts': {
+                'today_workouts': len(today_workouts),
+                'today_workouts_completed': sum(1 for w in today_workouts if w['is_completed']),
+                'today_meals': len(today_meals),
+                'today_meals_consumed': sum(1 for m in today_meals if m['is_consumed']),
+                'today_calories_planned': sum(m['calories'] for m in today_meals),
+                'week_workouts': len(week_workouts),
+                'week_meals': len(meals),
+                'upcoming_workouts': len(upcoming_workouts),
+                'active_goals': len(active_goals),
+            },
+        }
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+@functools.cache
+def _query_pool():
+    # Every thread keeps its own database connection
+    return ThreadPoolExecutor(max_workers=settings.DASHBOARD_QUERY_THREADS, thread_name_prefix="dashboard-db")
+
+
+def _run_query(fn, queryset):
+    # Pool threads see no request_started/finished signals: apply CONN_MAX_AGE and drop broken
+    # connections here, so idle threads do not hold connections open forever
+    close_old_connections()
+    try:
+        return fn(queryset)
+    finally:
+        close_old_connections()
+
+
+async def _in_pool(fn, queryset):
+    """``fn(queryset)`` on a thread of the query pool"""
+    return await sync_to_async(_run_query, thread_sensitive=False, executor=_query_pool())(fn, queryset)
+
+
+TIP_PROMPT = (
+    "You are a personal trainer. Write one practical fitness or nutrition tip for today, at most 30 words, "
+    "for this client: {profile}. Reply with the tip only."
+)
+
+TIP_PROFILE_FIELDS = ('fitness_goal_display', 'activity_level_display', 'age', 'gender_display')
+
+TIP_RETRY_AFTER = 300  # seconds
+
+
+def _tip_cache_key(user_id, day):
+    return f"tip:{user_id}:{day.isoformat()}"
+
+
+def daily_tip(context, day=None):
+    """An LLM-written tip of the day for the user, cached until midnight; None if the LLM fails"""
+    day = day or date.today()
+    key = _tip_cache_key(context.user.pk, day)
+    tip = cache.get(key)
+    if tip is not None:
+        return tip or None
+    summary = context.summary or {}
+    profile = ", ".join(f"{field.replace('_display', '')}: {summary[field]}"
+                        for field in TIP_PROFILE_FIELDS if summary.get(field)) or "no profile yet"
+    try:
+        tip = get_gateway().generate(TIP_PROMPT.format(profile=profile), timeout=settings.DASHBOARD_TIP_TIMEOUT,
+                                     purpose=LLMCall.TIP, user_id=context.user.pk).strip()
+    except Exception:
+        logger.exception("Daily tip for user %s failed", context.user.pk)
+        # Pages fall back to the static tip; try the LLM again in a while, not on every view
+        cache.set(key, '', TIP_RETRY_AFTER)
+        return None
+    midnight = datetime.combine(day + timedelta(days=1), time.min)
+    cache.set(key, tip, max(60, int((midnight - datetime.now()).total_seconds())))
+    return tip
+
+
+async def adaily_tip(context, day=None):
+    # The LLM call blocks a thread for seconds; keep it off the thread the async ORM uses
+    return await sync_to_async(daily_tip, thread_sensitive=False)(context, day)
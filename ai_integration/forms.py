@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
-from .models import CustomUser, UserProfile
+from .models import CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking
 
 
 class RegisterForm(forms.ModelForm):
@@ -101,3 +101,32 @@ class UserProfileForm(forms.ModelForm):
         if body_fat and (body_fat < 0 or body_fat > 100):
             raise forms.ValidationError("Body fat percentage must be between 0 and 100.")
         return body_fat
+
+
+# Forms validating JSON API payloads (the user always comes from the request)
+
+class WorkoutScheduleForm(forms.ModelForm):
+    class Meta:
+        model = WorkoutSchedule
+        fields = ['workout_name', 'scheduled_date', 'scheduled_time', 'duration_minutes', 'workout_type',
+                  'is_completed', 'notes']
+
+
+class MealPlanForm(forms.ModelForm):
+    class Meta:
+        model = MealPlan
+        fields = ['meal_type', 'scheduled_date', 'scheduled_time', 'meal_name', 'calories', 'protein', 'carbs',
+                  'fats', 'is_consumed', 'notes']
+
+
+class DailyProgressForm(forms.ModelForm):
+    class Meta:
+        model = DailyProgress
+        fields = ['date', 'weight', 'calories_consumed', 'calories_burned', 'water_intake_glasses', 'steps_taken',
+                  'mood_rating', 'notes']
+
+
+class GoalTrackingForm(forms.ModelForm):
+    class Meta:
+        model = GoalTracking
+        fields = ['goal_type', 'goal_title', 'target_value', 'current_value', 'target_date', 'is_achieved']
@@ -0,0 +1,160 @@
+"""Goal evaluation: GoalTracking.current_value and is_achieved derived from logged data.
+
+Each goal type maps to one metric over the user's entries between the day the
+goal was created and its target date:
+
+- weight_loss / muscle_gain: kg lost / gained between the first and latest logged weight
+- endurance: minutes of completed cardio and HIIT workouts
+- strength / flexibility: completed strength / flexibility workouts
+- nutrition: logged days within NUTRITION_TOLERANCE of the stored calorie target
+
+A goal is achieved once its value reaches ``target_value``; achieved goals are
+no longer evaluated. Metrics are correlated subqueries over the (user, date)
+indexes, so a whole chunk of goals of one type is evaluated by a single
+statement, and only goals whose value changed are written back.
+``evaluate_user_goals`` re-runs the same evaluation for one user's active goals
+when an entry arrives (see signals.py); ``evaluate_goals`` is the full pass.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Lower, TruncDate
+from django.utils import timezone
+
+from . import versions
+from .models import DailyProgress, GoalTracking, WorkoutSchedule
+
+
+ENDURANCE_WORKOUT_TYPES = ('cardio', 'hiit')
+STRENGTH_WORKOUT_TYPES = ('strength',)
+FLEXIBILITY_WORKOUT_TYPES = ('flexibility', 'yoga')
+
+# A day counts towards a nutrition goal within +/- 10% of the calorie target
+NUTRITION_TOLERANCE = 0.1
+
+
+def _window(queryset, date_field):
+    """Rows of the goal's user between the goal's creation and target date"""
+    return queryset.filter(**{
+        'user': OuterRef('user'),
+        f"{date_field}__gte": OuterRef('start_date'),
+        f"{date_field}__lte": OuterRef('target_date'),
+    })
+
+
+def _scalar(queryset, aggregate):
+    # Aggregate in a correlated subquery: GROUP BY the (single) user
+    return Coalesce(
+        Subquery(queryset.order_by().values('user').annotate(result=aggregate).values('result')[:1]),
+        Value(0.0), output_field=FloatField(),
+    )
+
+
+def _weight(order):
+    logged = _window(DailyProgress.objects, 'date').filter(weight__isnull=False)
+    return Subquery(logged.order_by(order).values('weight')[:1], output_field=FloatField())
+
+
+def _completed_workouts(workout_types):
+    return _window(WorkoutSchedule.objects, 'scheduled_date').annotate(kind=Lower('workout_type')).filter(
+        is_completed=True, kind__in=workout_types,
+    )
+
+
+def _weight_change(sign):
+    return lambda: Coalesce(sign * (_weight('date') - _weight('-date')), Value(0.0), output_field=FloatField())
+
+
+def _days_on_calorie_target():
+    days = _window(DailyProgress.objects, 'date').filter(
+        calories_consumed__gte=OuterRef('calorie_target') * (1 - NUTRITION_TOLERANCE),
+        calories_consumed__lte=OuterRef('calorie_target') * (1 + NUTRITION_TOLERANCE),
+    )
+    return _scalar(days, Count('id'))
+
+
+# Goal type: expression of its current value, evaluated per goal row
+GOAL_METRICS = {
+    'weight_loss': _weight_change(1),
+    'muscle_gain': _weight_change(-1),
+    'endurance': lambda: _scalar(_completed_workouts(ENDURANCE_WORKOUT_TYPES), Sum('duration_minutes')),
+    'strength': lambda: _scalar(_completed_workouts(STRENGTH_WORKOUT_TYPES), Count('id')),
+    'flexibility': lambda: _scalar(_completed_workouts(FLEXIBILITY_WORKOUT_TYPES), Count('id')),
+    'nutrition': _days_on_calorie_target,
+}
+
+# Goal types to re-evaluate when each kind of entry changes
+PROGRESS_GOAL_TYPES = ('weight_loss', 'muscle_gain', 'nutrition')
+WORKOUT_GOAL_TYPES = ('endurance', 'strength', 'flexibility')
+
+
+def active_goals():
+    return GoalTracking.objects.filter(is_achieved=False)
+
+
+def _changes(goals):
+    """``(id, user_id, value, achieved)`` of the goals in ``goals`` whose derived state changed"""
+    changes = []
+    goal_types = set(goals.order_by().values_list('goal_type', flat=True).distinct())
+    for goal_type in goal_types & set(GOAL_METRICS):
+        rows = goals.filter(goal_type=goal_type).annotate(
+            start_date=TruncDate('created_at'),
+            calorie_target=F('user__nutritiontarget__calories'),
+            value=GOAL_METRICS[goal_type](),
+        ).values_list('id', 'user_id', 'current_value', 'target_value', 'value')
+        for goal_id, user_id, current_value, target_value, value in rows:
+            value = round(value, 2)
+            achieved = value >= target_value
+            if value != current_value or achieved:
+                changes.append((goal_id, user_id, value, achieved))
+    return changes
+
+
+def _write(changes):
+    """One UPDATE per changed goal in a single executemany, then bump the owners' goal versions"""
+    if not changes:
+        return
+    ops = connection.ops
+    now = ops.adapt_datetimefield_value(timezone.now())
+    meta = GoalTracking._meta
+    columns = [meta.get_field(name).column for name in ('current_value', 'is_achieved', 'updated_at')]
+    assignments = ", ".join(f"{ops.quote_name(column)} = %s" for column in columns)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Goals already achieved (by a concurrent pass) keep their state
+        cursor.executemany(
+            f"UPDATE {ops.quote_name(meta.db_table)} SET {assignments} "
+            f"WHERE {ops.quote_name(meta.pk.column)} = %s AND {ops.quote_name(columns[1])} = %s",
+            [(value, achieved, now, goal_id, False) for goal_id, user_id, value, achieved in changes],
+        )
+    # Raw updates send no post_save signal
+    for user_id in {user_id for goal_id, user_id, value, achieved in changes}:
+        versions.bump(user_id, 'goals')
+
+
+def evaluate_user_goals(user_id, goal_types=None):
+    """Re-evaluate one user's active goals (of ``goal_types``); returns the number changed"""
+    goals = active_goals().filter(user_id=user_id)
+    if goal_types is not None:
+        goals = goals.filter(goal_type__in=goal_types)
+    changes = _changes(goals)
+    _write(changes)
+    return len(changes)
+
+
+def evaluate_goals(chunk_size=5000):
+    """Re-evaluate every active goal in id-ordered chunks
+
+    Yields ``(goals_done, goals_changed)`` after every chunk.
+    """
+    last_id = 0
+    goals_done = goals_changed = 0
+    while True:
+        ids = list(active_goals().filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        chunk = active_goals().filter(id__gte=ids[0], id__lte=ids[-1])
+        last_id = ids[-1]
+        changes = _changes(chunk)
+        _write(changes)
+        goals_done += len(ids)
+        goals_changed += len(changes)
+        yield goals_done, goals_changed
@@ -0,0 +1,152 @@
+"""Database-backed background jobs.
+
+Views enqueue slow work (``enqueue('seed_sample_plan', user=user)``) and
+return at once; ``manage.py run_jobs`` runs a pool of worker threads or
+processes that claim queued jobs in priority order. A claimed job is invisible
+to other workers for ``JOB_VISIBILITY_TIMEOUT`` seconds: if its worker dies,
+the job is requeued once that lock expires. Failed jobs are retried with
+exponential backoff until ``max_attempts`` runs have failed. Clients poll
+``/api/jobs/<id>/`` for the status and result.
+
+Tasks are plain functions registered with ``@task`` (see tasks.py). They are
+called with the job's user (or None) and its payload as keyword arguments and
+return a JSON-serializable result.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+# Claim order, served by the partial index on queued jobs
+CLAIM_ORDER = ('-priority', 'run_after', 'id')
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+def task(name):
+    """Register the decorated function as the task ``name``"""
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(task_name, user=None, priority=0, delay=0, max_attempts=None, **payload):
+    """Queue ``task_name`` to run with ``payload`` in a worker; returns the Job"""
+    if task_name not in TASKS:
+        raise UnknownTask(f"Unknown task: {task_name}")
+    return Job.objects.create(
+        task=task_name, user=user, payload=payload, priority=priority,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def requeue_expired(now=None):
+    """Give running jobs whose lock expired to another worker, or fail them if out of attempts"""
+    now = now or timezone.now()
+    expired = Job.objects.filter(status=Job.RUNNING, locked_until__lt=now)
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error="Worker did not finish within the visibility timeout",
+        locked_until=None, finished_at=now,
+    )
+    requeued = expired.update(status=Job.QUEUED, locked_by='', locked_until=None)
+    return requeued, failed
+
+
+def claim(worker, limit=1, now=None):
+    """Lock up to ``limit`` due jobs for ``worker``, highest priority first"""
+    now = now or timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by(*CLAIM_ORDER)
+    lock = {
+        'status': Job.RUNNING, 'locked_by': worker, 'attempts': F('attempts') + 1, 'started_at': now,
+        'locked_until': now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        # Concurrent workers skip each other's rows instead of queueing on the same jobs
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**lock)
+    else:
+        # SQLite: single-statement writes wait for the write lock (a read-then-write
+        # transaction would fail instead); the status check makes losing a race harmless
+        ids = list(due.values_list('id', flat=True)[:limit])
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(**lock)
+    if not ids:
+        return []
+    claimed = Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=worker)
+    return list(claimed.select_related('user').order_by(*CLAIM_ORDER))
+
+
+def run_job(job, worker):
+    """Run a claimed job and record its result, retry or failure"""
+    function = TASKS.get(job.task)
+    try:
+        if function is None:
+            raise UnknownTask(f"Unknown task: {job.task}")
+        result = function(user=job.user, **job.payload)
+    except Exception as e:
+        now = timezone.now()
+        error = traceback.format_exc(limit=5)
+        if job.attempts < job.max_attempts and not isinstance(e, UnknownTask):
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            logger.warning("Job %s (%s) failed, retrying in %ss", job.pk, job.task, delay)
+            outcome = {'status': Job.QUEUED, 'run_after': now + timedelta(seconds=delay), 'locked_by': ''}
+        else:
+            logger.exception("Job %s (%s) failed", job.pk, job.task)
+            outcome = {'status': Job.FAILED, 'finished_at': now}
+        outcome.update(error=error, locked_until=None)
+    else:
+        outcome = {'status': Job.SUCCEEDED, 'result': result, 'error': '', 'locked_until': None,
+                   'finished_at': timezone.now()}
+    # A worker whose lock expired (and whose job moved on) records nothing
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker).update(**outcome) == 1
+
+
+def work(worker, stop=None, burst=False, poll_interval=None):
+    """Claim and run jobs until ``stop`` is set, or until none are due when ``burst``
+
+    Returns the number of jobs run.
+    """
+    stop = stop or threading.Event()
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    done = 0
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            requeue_expired()
+            jobs = claim(worker)
+        except DatabaseError:
+            # Busy or briefly unreachable database: keep the worker alive and try again
+            logger.exception("Worker %s could not claim jobs", worker)
+            jobs = []
+        if not jobs:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        for job in jobs:
+            run_job(job, worker)
+            done += 1
+    close_old_connections()
+    return done
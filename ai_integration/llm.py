@@ -0,0 +1,408 @@
+"""Gateway that owns every LLM call made by the app.
+
+Calls go through :class:`LLMGateway`, which caps the number of in-flight
+requests per process, keeps a bounded wait queue (rejecting fast once it is
+full), enforces a deadline per call, retries transient failures with jittered
+exponential backoff and trips a circuit breaker while the provider is
+degraded. Providers are small adapters with a sync ``generate`` and an async
+``stream``; :class:`StubProvider` is a local stand-in for tests and offline
+runs.
+
+The Gemini SDK takes about half a second to import, so :class:`GeminiProvider`
+imports and configures it on its first call rather than at module import;
+management commands and tests that never call the LLM skip it. ``warm_up``
+loads it ahead of time; the gunicorn config calls it in every worker right
+after fork (``LLM_WARMUP``), so the first chat request does not pay for it.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import metrics, telemetry
+
+
+class LLMError(Exception):
+    """Base class for errors raised by the gateway itself"""
+
+
+class LLMOverloaded(LLMError):
+    """The wait queue is full or no slot freed up in time"""
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open because the provider keeps failing"""
+
+
+class LLMTimeout(LLMError):
+    """The call did not finish before its deadline"""
+
+
+# Telemetry outcome of a failed call; other exceptions count as 'error'
+OUTCOMES = {LLMTimeout: 'timeout', LLMOverloaded: 'rejected', LLMUnavailable: 'rejected'}
+
+
+# Providers
+
+
+class GeminiProvider:
+    """Google Gemini adapter; the SDK is imported on first use"""
+
+    def __init__(self, model_name="gemini-2.0-flash"):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        import google.generativeai as genai
+
+        if settings.GEMINI_API_ENDPOINT:
+            # Another host speaking the Gemini REST API, e.g. the load-test stub (loadtest.py)
+            genai.configure(api_key=settings.GEMINI_API_KEY, transport="rest",
+                            client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+        return genai.GenerativeModel(self.model_name)
+
+    def warm_up(self):
+        """Import the SDK and open the sync client the first ``generate`` would create"""
+        from google.generativeai import client
+
+        model = self.model
+        client.get_default_generative_client()
+        return model
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    async def stream(self, prompt):
+        # The first call may still have to import the SDK; keep that off the event loop
+        model = self._model or await asyncio.to_thread(lambda: self.model)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubProvider:
+    """Local stand-in for Gemini with configurable latency and failures"""
+
+    default_answer = "Stay hydrated, eat a balanced meal with carbs and protein, and warm up before training."
+
+    def __init__(self, answer=None, latency=0.0, fail_times=0, fail_after=None):
+        self.answer = answer or self.default_answer
+        self.latency = latency
+        self.fail_times = fail_times
+        self.fail_after = fail_after
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def _maybe_fail(self):
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("Stub provider failure")
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        self._maybe_fail()
+        return self.answer
+
+    async def stream(self, prompt):
+        self.prompts.append(prompt)
+        self._maybe_fail()
+        words = self.answer.split(" ")
+        for index, word in enumerate(words):
+            if self.fail_after is not None and index >= self.fail_after:
+                raise RuntimeError("Stub stream interrupted")
+            if self.latency:
+                await asyncio.sleep(self.latency / len(words))
+            yield word if index == len(words) - 1 else word + " "
+
+
+# Circuit breaker
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures, half-open after ``reset_timeout``"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise LLMUnavailable unless a call may go through right now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise LLMUnavailable("The AI service is temporarily unavailable.")
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                # Only one trial call probes the provider while half-open
+                if self._trial_in_flight:
+                    raise LLMUnavailable("The AI service is temporarily unavailable.")
+                self._trial_in_flight = True
+
+    def release_trial(self):
+        """Give back a half-open trial that never reached the provider"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# Gateway
+
+class LLMGateway:
+    def __init__(self, provider, max_concurrency=8, max_queue=32, queue_timeout=2.0,
+                 call_timeout=30.0, max_retries=2, backoff_base=0.5, backoff_max=4.0,
+                 breaker=None):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _acquire_slot(self, deadline):
+        """Take a concurrency slot, waiting in the bounded queue if needed"""
+        if self._slots.acquire(blocking=False):
+            self._slot_taken()
+            return
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LLMOverloaded("The AI service is busy right now.")
+            self.waiting += 1
+        try:
+            wait = max(0.0, min(self.queue_timeout, deadline - time.monotonic()))
+            acquired = self._slots.acquire(timeout=wait)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise LLMOverloaded("The AI service is busy right now.")
+        self._slot_taken()
+
+    def _slot_taken(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _release_slot(self, *args):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _call_once(self, prompt, deadline):
+        self._acquire_slot(deadline)
+        future = self._executor.submit(self.provider.generate, prompt)
+        # The slot is held until the provider call really returns, even if the
+        # caller gave up on it, so abandoned calls still count against the cap
+        future.add_done_callback(self._release_slot)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            raise LLMTimeout("The AI service took too long to respond.")
+
+    def _record(self, started, error, purpose, user_id, prompt, answer):
+        seconds = time.perf_counter() - started
+        outcome = OUTCOMES.get(type(error), 'error') if error is not None else 'ok'
+        metrics.record_llm_call(seconds, outcome)
+        telemetry.record(purpose, user_id, prompt, answer, seconds, outcome)
+
+    def generate(self, prompt, timeout=None, purpose='other', user_id=None):
+        """Return the provider's answer for ``prompt`` or raise
+
+        ``purpose`` and ``user_id`` attribute the call in the LLM telemetry.
+        """
+        started = time.perf_counter()
+        answer = error = None
+        try:
+            answer = self._generate(prompt, timeout)
+            return answer
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(started, error, purpose, user_id, prompt, answer)
+
+    def _generate(self, prompt, timeout):
+        deadline = time.monotonic() + (timeout or self.call_timeout)
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                answer = self._call_once(prompt, deadline)
+            except LLMOverloaded:
+                self.breaker.release_trial()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return answer
+
+    async def stream(self, prompt, timeout=None, purpose='other', user_id=None):
+        """Async generator of answer chunks; retries only before the first chunk was sent"""
+        started = time.perf_counter()
+        chunks = []
+        error = None
+        try:
+            async for text in self._stream(prompt, timeout):
+                chunks.append(text)
+                yield text
+        except BaseException as e:
+            # Includes the client going away mid-answer (cancellation, generator closed)
+            error = e
+            raise
+        finally:
+            self._record(started, error, purpose, user_id, prompt, "".join(chunks))
+
+    async def _stream(self, prompt, timeout):
+        deadline = time.monotonic() + (timeout or self.call_timeout)
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                await asyncio.to_thread(self._acquire_slot, deadline)
+            except LLMOverloaded:
+                self.breaker.release_trial()
+                raise
+            emitted = False
+            chunks = None
+            try:
+                chunks = self.provider.stream(prompt)
+                # The deadline bounds the time to the first chunk and every gap between chunks
+                while True:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    try:
+                        text = await asyncio.wait_for(anext(chunks), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeout("The AI service took too long to respond.")
+                    emitted = True
+                    deadline = time.monotonic() + (timeout or self.call_timeout)
+                    yield text
+            except Exception:
+                self.breaker.record_failure()
+                delay = self._backoff(attempt)
+                if emitted or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or closed by a departing client: neither a success nor a
+                # failure, but a half-open trial must not stay claimed forever
+                self.breaker.release_trial()
+                raise
+            finally:
+                self._release_slot()
+                if chunks is not None:
+                    await chunks.aclose()
+            self.breaker.record_success()
+            return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'breaker_state': self.breaker.state,
+            }
+
+
+@cache
+def get_gateway():
+    """Process-wide gateway built from the LLM_* settings"""
+    return LLMGateway(
+        import_string(settings.LLM_PROVIDER)(),
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        max_queue=settings.LLM_MAX_QUEUE,
+        queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+        call_timeout=settings.LLM_CALL_TIMEOUT,
+        max_retries=settings.LLM_MAX_RETRIES,
+        breaker=CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_RESET),
+    )
+
+
+def warm_up():
+    """Build the gateway and load its provider's client now instead of on the first LLM call
+
+    Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    provider = get_gateway().provider
+    if hasattr(provider, 'warm_up'):
+        provider.warm_up()
+    return time.perf_counter() - started
+
+
+@receiver(setting_changed)
+def _reset_gateway(setting, **kwargs):
+    if setting.startswith(("LLM_", "GEMINI_")):
+        get_gateway.cache_clear()
@@ -0,0 +1,297 @@
+"""End-to-end load testing: a stub Gemini server and a scripted load generator.
+
+``GeminiStub`` is a local HTTP server answering the Gemini REST
+``generateContent`` / ``streamGenerateContent`` calls after a delay drawn
+from a ``LatencyModel``. Pointing ``GEMINI_API_ENDPOINT`` at it sends the
+real ``GeminiProvider`` (SDK, gateway, retries and all) to the stub instead
+of Google. ``run_load`` logs in synthetic users (see seeding.py) through the
+login form and has each of them walk the site like a person would (dashboard,
+trainer, profile, a chat question), recording the latency and status of
+every request. ``LoadReport`` turns the samples into throughput and
+p50/p95/p99 latency per endpoint. ``manage.py load_test`` wires it together
+and saves the report as JSON for comparing runs across commits.
+"""
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+STUB_ANSWER = (
+    "Eat a balanced meal with complex carbs and lean protein about two hours before training, "
+    "stay hydrated, and warm up for ten minutes before your first working set."
+)
+
+QUESTIONS = [
+    "What should I eat before training?",
+    "How much protein do I need to build muscle?",
+    "How many rest days should I take each week?",
+    "What is a good beginner cardio routine?",
+    "How can I lose belly fat?",
+    "What should I eat after my workout?",
+    "How do I improve my squat form?",
+    "Is it okay to train with sore muscles?",
+    "How much water should I drink per day?",
+    "What stretches help with lower back pain?",
+]
+
+
+class LatencyModel:
+    """Response delay in seconds: ``fixed``, ``uniform`` (mean +/- spread) or ``lognormal`` (median, sigma)"""
+
+    KINDS = ('fixed', 'uniform', 'lognormal')
+
+    def __init__(self, kind='lognormal', mean_ms=800, spread=0.5, seed=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.mean_ms = mean_ms
+        self.spread = spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.kind == 'fixed':
+                ms = self.mean_ms
+            elif self.kind == 'uniform':
+                ms = self._rng.uniform(self.mean_ms * (1 - self.spread), self.mean_ms * (1 + self.spread))
+            else:
+                ms = self._rng.lognormvariate(math.log(self.mean_ms), self.spread)
+        return max(0.0, ms) / 1000
+
+    def describe(self):
+        return {'distribution': self.kind, 'mean_ms': self.mean_ms, 'spread': self.spread}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server.stub
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = urllib.parse.urlsplit(self.path).path
+        if not path.endswith((":generateContent", ":streamGenerateContent")):
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown method {path}"}})
+            return
+        delay = stub.latency.sample()
+        failed = stub.record(delay)
+        time.sleep(delay)
+        if failed:
+            self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded.",
+                                            "status": "UNAVAILABLE"}})
+            return
+        candidate = {"content": {"parts": [{"text": stub.answer}], "role": "model"}, "finishReason": "STOP",
+                     "index": 0}
+        usage = {"promptTokenCount": 0, "candidatesTokenCount": len(stub.answer) // 4}
+        if path.endswith(":streamGenerateContent"):
+            # REST streaming without alt=sse is one JSON array of chunks
+            self._send_json(200, [{"candidates": [candidate], "usageMetadata": usage}])
+        else:
+            self._send_json(200, {"candidates": [candidate], "usageMetadata": usage})
+
+
+class GeminiStub:
+    """Local stand-in for the Gemini REST API, served from a background thread"""
+
+    def __init__(self, latency=None, error_rate=0.0, answer=STUB_ANSWER, host="127.0.0.1", port=0, seed=None):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.answer = answer
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_delay = 0.0
+        self.server = ThreadingHTTPServer((host, port), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, delay):
+        """Count a request; returns True when it should fail"""
+        with self._lock:
+            self.requests += 1
+            self.total_delay += delay
+            failed = self._rng.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="gemini-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.latency.describe(),
+                'error_rate': self.error_rate,
+                'requests': self.requests,
+                'errors': self.errors,
+                'avg_delay_ms': round(self.total_delay / self.requests * 1000, 1) if self.requests else 0.0,
+            }
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated ``q``-th percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class LoadReport:
+    """Latency samples and failures per endpoint, summarized as throughput and percentiles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.samples[endpoint].append(seconds)
+            self.statuses[endpoint][str(status)] += 1
+            if not 200 <= status < 400:
+                self.failures[endpoint] += 1
+
+    def _summary(self, samples, failures, duration):
+        samples = sorted(samples)
+        ms = lambda seconds: round(seconds * 1000, 1) if seconds is not None else None
+        return {
+            'requests': len(samples),
+            'failures': failures,
+            'throughput_rps': round(len(samples) / duration, 2) if duration else 0.0,
+            'mean_ms': ms(sum(samples) / len(samples)) if samples else None,
+            'p50_ms': ms(percentile(samples, 50)),
+            'p95_ms': ms(percentile(samples, 95)),
+            'p99_ms': ms(percentile(samples, 99)),
+            'max_ms': ms(samples[-1]) if samples else None,
+        }
+
+    def summary(self, duration):
+        with self._lock:
+            endpoints = {
+                endpoint: {**self._summary(samples, self.failures[endpoint], duration),
+                           'statuses': dict(self.statuses[endpoint])}
+                for endpoint, samples in sorted(self.samples.items())
+            }
+            every = [seconds for samples in self.samples.values() for seconds in samples]
+            overall = self._summary(every, sum(self.failures.values()), duration)
+        return {'duration_s': round(duration, 2), 'overall': overall, 'endpoints': endpoints}
+
+
+class VirtualUser:
+    """One synthetic user with its own cookie session, driving the HTML pages"""
+
+    def __init__(self, base_url, phone_number, password, report, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.phone_number = phone_number
+        self.password = password
+        self.report = report
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def _csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == "csrftoken"), "")
+
+    def request(self, method, path, data=None, name=None):
+        """Timed request recorded under ``name`` (default ``"METHOD path"``); returns the status"""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if method == "POST":
+            request.add_header("X-CSRFToken", self._csrf_token())
+            request.add_header("Referer", self.base_url + path)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 599  # Connection failed or timed out
+        self.report.record(name or f"{method} {path}", time.perf_counter() - started, status)
+        return status
+
+    def login(self):
+        self.request("GET", "/login/")
+        self.request("POST", "/login/", {"username": self.phone_number, "password": self.password})
+        return any(cookie.name == "sessionid" for cookie in self.cookies)
+
+    def visit(self, question):
+        """One pass through the app: dashboard, trainer, profile and a chat question"""
+        self.request("GET", "/dashboard/")
+        self.request("GET", "/trainer/")
+        self.request("GET", "/profile/")
+        self.request("GET", "/chat/")
+        self.request("POST", "/chat/", {"question": question})
+
+
+def run_load(base_url, phone_numbers, password, duration=30.0, think_time=0.5, cold=False, seed=0):
+    """Run one virtual user per phone number for ``duration`` seconds; returns the report summary
+
+    With ``cold`` every question is unique, so no chat answer comes from a cache.
+    """
+    report = LoadReport()
+    deadline = time.monotonic() + duration
+    logged_in = []
+    started = time.perf_counter()
+
+    def drive(index, phone_number):
+        rng = random.Random(seed + index)
+        user = VirtualUser(base_url, phone_number, password, report)
+        if not user.login():
+            return
+        logged_in.append(phone_number)
+        visits = 0
+        while time.monotonic() < deadline:
+            question = rng.choice(QUESTIONS)
+            if cold:
+                question = f"{question} (ref {index}-{visits})"
+            user.visit(question)
+            visits += 1
+            if think_time:
+                time.sleep(rng.uniform(0, 2 * think_time))
+
+    threads = [threading.Thread(target=drive, args=(index, phone_number), name=f"vu-{index}", daemon=True)
+               for index, phone_number in enumerate(phone_numbers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = report.summary(time.perf_counter() - started)
+    summary['users_logged_in'] = len(logged_in)
+    return summary
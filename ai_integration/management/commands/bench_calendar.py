@@ -0,0 +1,76 @@
+import random
+import time as timer
+from datetime import date, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+
+from ai_integration.calendar_index import bucket_by_date
+
+
+NESTED_TEMPLATE = Template("""
+{% for day in days %}{{ day|date:"D" }}
+{% for workout in workouts %}{% if workout.scheduled_date == day %}{{ workout.scheduled_time|time:"H:i" }} {{ workout.workout_name }}
+{% endif %}{% endfor %}{% for meal in meals %}{% if meal.scheduled_date == day %}{{ meal.scheduled_time|time:"H:i" }} {{ meal.meal_name }}
+{% endif %}{% endfor %}{% endfor %}
+""")
+
+BUCKET_TEMPLATE = Template("""
+{% for bucket in calendar %}{{ bucket.date|date:"D" }}
+{% for workout in bucket.workouts %}{{ workout.scheduled_time|time:"H:i" }} {{ workout.workout_name }}
+{% endfor %}{% for meal in bucket.meals %}{{ meal.scheduled_time|time:"H:i" }} {{ meal.meal_name }}
+{% endfor %}{% endfor %}
+""")
+
+
+class Command(BaseCommand):
+    help = "Benchmark the per-day calendar index against the nested day x item template loops"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=5000, help="Workouts and meals per user (total)")
+        parser.add_argument("--days", type=int, default=31, help="Length of the date range")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _rows(self, count, start, days, name_key):
+        rows = [
+            {
+                "scheduled_date": start + timedelta(days=random.randrange(days)),
+                "scheduled_time": time(random.randrange(24), random.choice((0, 15, 30, 45))),
+                name_key: f"Item {i}",
+            }
+            for i in range(count)
+        ]
+        rows.sort(key=lambda row: (row["scheduled_date"], row["scheduled_time"]))
+        return rows
+
+    def _best_of(self, repeat, fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = timer.perf_counter()
+            fn()
+            best = min(best, timer.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        random.seed(7)
+        start = date.today().replace(day=1)
+        days = options["days"]
+        end = start + timedelta(days=days - 1)
+        workouts = self._rows(options["items"] // 5, start, days, "workout_name")
+        meals = self._rows(options["items"] - len(workouts), start, days, "meal_name")
+        day_list = [start + timedelta(days=i) for i in range(days)]
+        repeat = options["repeat"]
+
+        nested = self._best_of(repeat, lambda: NESTED_TEMPLATE.render(
+            Context({"days": day_list, "workouts": workouts, "meals": meals})
+        ))
+        build = self._best_of(repeat, lambda: bucket_by_date(start, end, workouts=workouts, meals=meals))
+        bucketed = self._best_of(repeat, lambda: BUCKET_TEMPLATE.render(
+            Context({"calendar": bucket_by_date(start, end, workouts=workouts, meals=meals)})
+        ))
+
+        self.stdout.write(f"{len(workouts)} workouts + {len(meals)} meals over {days} days (best of {repeat})")
+        self.stdout.write(f"  nested template loops:      {nested * 1000:9.1f} ms")
+        self.stdout.write(f"  bucket index build:         {build * 1000:9.1f} ms")
+        self.stdout.write(f"  bucket index + template:    {bucketed * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {nested / bucketed:.1f}x"))
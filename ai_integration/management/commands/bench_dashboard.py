@@ -0,0 +1,112 @@
+import asyncio
+import statistics
+import time as timer
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from ai_integration.context import load_user_context
+from ai_integration.dashboard import DashboardSnapshot, _tip_cache_key, adaily_tip, daily_tip
+from ai_integration.llm import get_gateway
+from ai_integration.models import CustomUser
+from ai_integration.seeding import seed_population
+
+
+class SimulatedLatency:
+    """Execute wrapper adding a fixed delay to every query, like a database across the network"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        timer.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        for conn in [connection] if connection is not None else connections.all():
+            if self not in conn.execute_wrappers:
+                conn.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.install()
+        # Connections opened later, e.g. by the query pool's threads
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for conn in connections.all():
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+
+class Command(BaseCommand):
+    help = ("Compare the sync dashboard load with the async one (async ORM, and the parallel query pool) "
+            "under a simulated database round trip, with and without the LLM tip of the day")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--db-latency-ms", type=float, default=5, help="Delay added to every query")
+        parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latency of the stub LLM for the tip")
+        parser.add_argument("--days", type=int, default=60, help="Days of history for the synthetic user")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def _median_ms(self, fn, repeat):
+        fn()
+        samples = []
+        for _ in range(repeat):
+            started = timer.perf_counter()
+            fn()
+            samples.append(timer.perf_counter() - started)
+        return statistics.median(samples) * 1000
+
+    def handle(self, *args, **options):
+        # Committed rows: the parallel path reads them over other connections
+        for _ in seed_population(1, days=options["days"], phone_prefix="95"):
+            pass
+        user = CustomUser.objects.get(phone_number="9500000000")
+        context = load_user_context(user)
+        repeat = options["repeat"]
+        snapshot = lambda: DashboardSnapshot(user, context=context)
+        loop = asyncio.new_event_loop()
+        run = loop.run_until_complete
+
+        def without_cached_tip(fn):
+            def call():
+                cache.delete(_tip_cache_key(user.pk, snapshot().day))
+                return fn()
+            return call
+
+        def sync_with_tip():
+            snapshot().load()
+            daily_tip(context)
+
+        async def gathered(parallel):
+            return await asyncio.gather(snapshot().aload(parallel=parallel), adaily_tip(context))
+
+        try:
+            with override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider"), \
+                    SimulatedLatency(options["db_latency_ms"] / 1000):
+                get_gateway().provider.latency = options["llm_latency_ms"] / 1000
+                results = [
+                    ("sync: queries one after another", lambda: snapshot().load()),
+                    ("async ORM, gathered", lambda: run(snapshot().aload(parallel=False))),
+                    ("async, parallel query pool", lambda: run(snapshot().aload(parallel=True))),
+                    ("sync + LLM tip", without_cached_tip(sync_with_tip)),
+                    ("async ORM + LLM tip, gathered", without_cached_tip(lambda: run(gathered(False)))),
+                    ("parallel pool + LLM tip, gathered", without_cached_tip(lambda: run(gathered(True)))),
+                ]
+                timings = [(label, self._median_ms(fn, repeat)) for label, fn in results]
+        finally:
+            loop.close()
+            CustomUser.objects.filter(pk=user.pk).delete()
+
+        self.stdout.write(f"Dashboard snapshot ({DashboardSnapshot.QUERY_COUNT} queries), "
+                          f"{options['db_latency_ms']:.0f} ms per query, {options['llm_latency_ms']:.0f} ms "
+                          f"LLM tip, median of {repeat}:")
+        baseline = {False: timings[0][1], True: timings[3][1]}
+        for index, (label, ms) in enumerate(timings):
+            speedup = baseline[index >= 3] / ms
+            self.stdout.write(f"  {label:<36} {ms:8.1f} ms  {speedup:4.1f}x")
@@ -0,0 +1,105 @@
+import random
+import time as timer
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from ai_integration import goals, nutrition
+from ai_integration.models import CustomUser, DailyProgress, GoalTracking, NutritionTarget, WorkoutSchedule
+from ai_integration.seeding import seed_population
+
+
+class Rollback(Exception):
+    pass
+
+
+def per_goal_value(goal):
+    """The per-row way: a few ORM queries for every goal"""
+    start = timezone.localtime(goal.created_at).date()
+    progress = DailyProgress.objects.filter(user_id=goal.user_id, date__gte=start, date__lte=goal.target_date)
+    workouts = WorkoutSchedule.objects.filter(
+        user_id=goal.user_id, scheduled_date__gte=start, scheduled_date__lte=goal.target_date, is_completed=True,
+    ).annotate(kind=Lower('workout_type'))
+    if goal.goal_type in ('weight_loss', 'muscle_gain'):
+        weights = progress.filter(weight__isnull=False)
+        first = weights.order_by('date').values_list('weight', flat=True).first()
+        latest = weights.order_by('-date').values_list('weight', flat=True).first()
+        change = first - latest if first is not None else 0.0
+        return change if goal.goal_type == 'weight_loss' else -change
+    if goal.goal_type == 'endurance':
+        return workouts.filter(kind__in=goals.ENDURANCE_WORKOUT_TYPES).aggregate(
+            total=Sum('duration_minutes'))['total'] or 0.0
+    if goal.goal_type == 'strength':
+        return workouts.filter(kind__in=goals.STRENGTH_WORKOUT_TYPES).count()
+    if goal.goal_type == 'flexibility':
+        return workouts.filter(kind__in=goals.FLEXIBILITY_WORKOUT_TYPES).count()
+    target = NutritionTarget.objects.filter(user_id=goal.user_id).values_list('calories', flat=True).first()
+    if target is None:
+        return 0.0
+    return progress.filter(
+        calories_consumed__gte=target * (1 - goals.NUTRITION_TOLERANCE),
+        calories_consumed__lte=target * (1 + goals.NUTRITION_TOLERANCE),
+    ).aggregate(days=Count('id'))['days']
+
+
+class Command(BaseCommand):
+    help = "Benchmark the chunked goal evaluation pass against per-goal queries (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--days", type=int, default=60, help="Days of history per user")
+        parser.add_argument("--goals", type=int, default=100000)
+        parser.add_argument("--sample", type=int, default=2000, help="Goals timed with per-goal queries")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        end = date.today()
+        try:
+            with transaction.atomic():
+                for _ in seed_population(options["users"], days=options["days"], end=end, phone_prefix="94"):
+                    pass
+                for _ in nutrition.recompute_targets():
+                    pass
+                users = list(CustomUser.objects.filter(phone_number__startswith="94").values_list('id', flat=True))
+                bench_goals = GoalTracking.objects.filter(user__phone_number__startswith="94")
+                bench_goals.delete()
+                goal_types = list(goals.GOAL_METRICS)
+                GoalTracking.objects.bulk_create([
+                    GoalTracking(user_id=users[i % len(users)], goal_type=goal_types[i % len(goal_types)],
+                                 goal_title="Benchmark goal", target_value=rng.choice([5, 50, 500, 5000]),
+                                 target_date=end + timedelta(days=rng.randint(0, 90)))
+                    for i in range(options["goals"])
+                ], batch_size=5000)
+                # Goals set on the first day of the history
+                bench_goals.update(created_at=timezone.now() - timedelta(days=options["days"]))
+
+                sample = rng.sample(list(bench_goals), options["sample"])
+                started = timer.perf_counter()
+                expected = {goal.pk: round(per_goal_value(goal), 2) for goal in sample}
+                per_goal = (timer.perf_counter() - started) / len(sample)
+
+                started = timer.perf_counter()
+                for goals_done, goals_changed in goals.evaluate_goals(chunk_size=options["chunk_size"]):
+                    pass
+                full_pass = timer.perf_counter() - started
+
+                stored = dict(GoalTracking.objects.filter(pk__in=expected).values_list('pk', 'current_value'))
+                mismatches = sum(1 for pk, value in expected.items() if stored[pk] != value)
+                assert not mismatches, f"{mismatches} of {len(expected)} sampled goals differ"
+                achieved = bench_goals.filter(is_achieved=True).count()
+                raise Rollback
+        except Rollback:
+            pass
+
+        estimate = per_goal * goals_done
+        self.stdout.write(f"{goals_done} active goals of {len(users)} users, {options['days']} days of history; "
+                          f"{options['sample']} sampled goals identical")
+        self.stdout.write(f"  per-goal queries (estimated): {estimate:9.1f} s  ({per_goal * 1000:.2f} ms/goal)")
+        self.stdout.write(f"  chunked evaluation pass:      {full_pass:9.1f} s  ({goals_changed} changed, "
+                          f"{achieved} achieved)")
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {estimate / full_pass:.1f}x"))
@@ -0,0 +1,87 @@
+import random
+import time as timer
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from ai_integration.models import UserProfile
+from ai_integration.nutrition import batch_targets, encode_profiles, targets
+
+
+def _age(dob, today):
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+class Command(BaseCommand):
+    help = "Benchmark the NumPy batch nutrition targets against the per-row Python loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _rows(self, count):
+        """PROFILE_COLUMNS tuples, with some incomplete profiles mixed in"""
+        activity_levels = [choice for choice, label in UserProfile.ACTIVITY_LEVEL_CHOICES] + ['']
+        goals = [choice for choice, label in UserProfile.GOAL_CHOICES] + ['']
+        rows = []
+        for user_id in range(count):
+            complete = random.random() > 0.05
+            rows.append((
+                user_id,
+                date(1955, 1, 1) + timedelta(days=random.randrange(18000)) if complete else None,
+                random.choice(['male', 'female', 'other', '']),
+                round(random.gauss(172, 9), 1),
+                round(random.gauss(75, 14), 1) if complete else None,
+                random.choice(activity_levels),
+                random.choice(goals),
+            ))
+        return rows
+
+    def _best_of(self, repeat, fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = timer.perf_counter()
+            fn()
+            best = min(best, timer.perf_counter() - started)
+        return best
+
+    def _loop(self, rows, today):
+        return [
+            targets(weight, height, _age(dob, today) if dob else None, gender, activity_level, goal)
+            for user_id, dob, gender, height, weight, activity_level, goal in rows
+        ]
+
+    def _batch(self, rows, today):
+        encoded = encode_profiles(rows, today)
+        return encoded, batch_targets(**encoded)
+
+    def handle(self, *args, **options):
+        random.seed(5)
+        today = date.today()
+        rows = self._rows(options["profiles"])
+        repeat = options["repeat"]
+
+        # Both paths must agree before their speed means anything
+        expected = self._loop(rows, today)
+        encoded, computed = self._batch(rows, today)
+        for i, result in enumerate(expected):
+            if result is None:
+                assert computed["tdee"][i] != computed["tdee"][i], f"row {i} should be incomplete"
+            else:
+                assert (result.tdee, result.calories, result.protein_g, result.carbs_g, result.fats_g) == tuple(
+                    int(computed[name][i]) for name in ("tdee", "calories", "protein_g", "carbs_g", "fats_g")
+                ), f"row {i} differs"
+
+        loop = self._best_of(repeat, lambda: self._loop(rows, today))
+        encode = self._best_of(repeat, lambda: encode_profiles(rows, today))
+        batch = self._best_of(repeat, lambda: batch_targets(**encoded))
+        total = self._best_of(repeat, lambda: self._batch(rows, today))
+
+        self.stdout.write(f"{len(rows)} profiles (best of {repeat}), results identical")
+        self.stdout.write(f"  per-row Python loop:        {loop * 1000:9.1f} ms")
+        self.stdout.write(f"  encode rows to arrays:      {encode * 1000:9.1f} ms")
+        self.stdout.write(f"  NumPy batch arithmetic:     {batch * 1000:9.1f} ms")
+        self.stdout.write(f"  encode + batch:             {total * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"  speedup: {loop / total:.1f}x end to end, {loop / batch:.0f}x on the arithmetic"
+        ))
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time as timer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter: boots Django the way a worker does, serves one request, then loads the LLM client
+WORKER_SCRIPT = r'''
+import io, json, os, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+handler = time.perf_counter()
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": "/login/", "QUERY_STRING": "", "SCRIPT_NAME": "",
+    "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost", "SERVER_PROTOCOL": "HTTP/1.1",
+    "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+}
+statuses = []
+b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+first_request = time.perf_counter()
+sdk_imported = "google.generativeai" in sys.modules
+from ai_integration.llm import warm_up
+warm_up_seconds = warm_up()
+print(json.dumps({
+    "setup": setup - started, "handler": handler - setup, "first_request": first_request - handler,
+    "ready": first_request - started, "status": statuses[0], "sdk_imported_before_first_call": sdk_imported,
+    "llm_warm_up": warm_up_seconds,
+}))
+'''
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)$")
+
+
+class Command(BaseCommand):
+    help = ("Benchmark cold start: Django setup, time to first request and LLM client load in a fresh worker, "
+            "wall time of management commands and the slowest imports")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement (median)")
+        parser.add_argument("--command", action="append", dest="commands",
+                            help='Management command line to time, e.g. "check" (repeatable; default: check)')
+        parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+
+    def _env(self):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE",
+                                                                      "fitness_ai_web.settings")}
+        # The real provider, so its import and client setup are measured; no request is sent
+        env["LLM_PROVIDER"] = "ai_integration.llm.GeminiProvider"
+        env.setdefault("GEMINI_API_KEY", "bench-startup")
+        return env
+
+    def _run(self, args, **kwargs):
+        result = subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=settings.BASE_DIR,
+                                env=self._env(), check=False, **kwargs)
+        if result.returncode:
+            raise CommandError(f"{' '.join(args)} failed:\n{result.stderr[-2000:]}")
+        return result
+
+    def _worker(self):
+        started = timer.perf_counter()
+        sample = json.loads(self._run(["-c", WORKER_SCRIPT]).stdout.strip().splitlines()[-1])
+        sample["process"] = timer.perf_counter() - started
+        return sample
+
+    def _command(self, command_line):
+        started = timer.perf_counter()
+        self._run(["manage.py", *command_line.split()])
+        return timer.perf_counter() - started
+
+    def _slowest_imports(self, top):
+        """Cumulative import time of the top-level modules django.setup() pulls in"""
+        stderr = self._run(["-X", "importtime", "-c", "import django; django.setup()"]).stderr
+        modules = []
+        for line in stderr.splitlines():
+            match = IMPORT_TIME_RE.match(line)
+            if match and len(match.group(2)) == 1:
+                modules.append((int(match.group(1)) / 1e6, match.group(3)))
+        return sorted(modules, reverse=True)[:top]
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        workers = [self._worker() for _ in range(repeat)]
+        median = lambda key: statistics.median(sample[key] for sample in workers)
+        self.stdout.write(f"Fresh worker, median of {repeat}:")
+        for label, key in (
+            ("import django + django.setup()", "setup"),
+            ("request handler (middleware)", "handler"),
+            ("first request GET /login/", "first_request"),
+            ("ready: django import to first response", "ready"),
+            ("process wall time, warm-up included", "process"),
+            ("LLM client load (warm-up / first call)", "llm_warm_up"),
+        ):
+            self.stdout.write(f"  {label:<40} {median(key) * 1000:8.1f} ms")
+        if any(sample["status"][:3] != "200" for sample in workers):
+            self.stdout.write(self.style.WARNING(f"  first request answered {workers[0]['status']}"))
+        imported = any(sample["sdk_imported_before_first_call"] for sample in workers)
+        self.stdout.write(f"  LLM SDK imported before the first LLM call: {'yes' if imported else 'no'}")
+
+        self.stdout.write(f"Management commands, median of {repeat}:")
+        for command_line in options["commands"] or ["check"]:
+            seconds = statistics.median(self._command(command_line) for _ in range(repeat))
+            self.stdout.write(f"  {'manage.py ' + command_line:<40} {seconds * 1000:8.1f} ms")
+
+        self.stdout.write("Slowest imports of django.setup():")
+        for seconds, module in self._slowest_imports(options["top"]):
+            self.stdout.write(f"  {module:<40} {seconds * 1000:8.1f} ms")
@@ -0,0 +1,103 @@
+import json
+import random
+import time as timer
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from ai_integration import api
+from ai_integration.models import CustomUser
+from ai_integration.seeding import seed_population
+from ai_integration.sync import FEEDS
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark delta sync against refetching every list, for one synthetic user (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=180, help="Days of history for the user")
+        parser.add_argument("--changes", type=int, default=20, help="Rows changed and deleted between syncs")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _get(self, user, view, path, params=None, **kwargs):
+        request = RequestFactory().get(path, params or {})
+        request.user = user
+        started = timer.perf_counter()
+        response = view(request, **kwargs)
+        return response, timer.perf_counter() - started
+
+    def _full_refetch(self, user):
+        """Every page of every list endpoint, as a client without sync would do"""
+        total_bytes = total_time = 0
+        for resource in FEEDS:
+            cursor = None
+            while True:
+                params = {"limit": api.MAX_PAGE_SIZE, **({"cursor": cursor} if cursor else {})}
+                response, elapsed = self._get(user, api.collection_view, f"/api/{resource}/", params,
+                                              resource=resource)
+                total_bytes += len(response.content)
+                total_time += elapsed
+                cursor = json.loads(response.content)["next_cursor"]
+                if not cursor:
+                    break
+        return total_bytes, total_time
+
+    def _sync(self, user, cursor=None):
+        total_bytes = total_time = 0
+        while True:
+            response, elapsed = self._get(user, api.sync_view, "/api/sync/", {"cursor": cursor} if cursor else {})
+            total_bytes += len(response.content)
+            total_time += elapsed
+            data = json.loads(response.content)
+            cursor = data["cursor"]
+            if not data["has_more"]:
+                return total_bytes, total_time, cursor
+
+    def _best_of(self, repeat, fn):
+        results = [fn() for _ in range(repeat)]
+        return min(results, key=lambda result: result[1])
+
+    def handle(self, *args, **options):
+        random.seed(11)
+        repeat = options["repeat"]
+        try:
+            with transaction.atomic():
+                for _ in seed_population(1, days=options["days"], phone_prefix="93"):
+                    pass
+                user = CustomUser.objects.get(phone_number="9300000000")
+                # Pretend the history was written yesterday, outside the sync overlap window
+                yesterday = timezone.now() - timedelta(days=1)
+                rows = 0
+                for model, fields in FEEDS.values():
+                    rows += model.objects.filter(user=user).update(updated_at=yesterday)
+
+                full_bytes, full_time = self._best_of(repeat, lambda: self._full_refetch(user))
+                initial_bytes, initial_time, cursor = self._sync(user)
+
+                # A day of typical activity: some rows edited, a few deleted
+                workouts = list(FEEDS["workouts"][0].objects.filter(user=user)[:options["changes"]])
+                for workout in workouts:
+                    workout.is_completed = not workout.is_completed
+                    workout.save()
+                for meal in FEEDS["meals"][0].objects.filter(user=user)[:options["changes"] // 4]:
+                    meal.delete()
+                delta_bytes, delta_time, _ = self._best_of(repeat, lambda: self._sync(user, cursor))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{rows} rows over {options['days']} days, {options['changes']} edits "
+                          f"+ {options['changes'] // 4} deletes between syncs (best of {repeat})")
+        self.stdout.write(f"  full refetch of all lists:  {full_bytes / 1024:9.1f} KiB {full_time * 1000:9.1f} ms")
+        self.stdout.write(f"  initial sync:               {initial_bytes / 1024:9.1f} KiB {initial_time * 1000:9.1f} ms")
+        self.stdout.write(f"  delta sync:                 {delta_bytes / 1024:9.1f} KiB {delta_time * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"  delta vs refetch: {full_bytes / delta_bytes:.0f}x smaller, {full_time / delta_time:.0f}x faster"
+        ))
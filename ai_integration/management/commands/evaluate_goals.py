@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_integration.goals import evaluate_goals
+
+
+class Command(BaseCommand):
+    help = "Re-evaluate the current value and achievement of every active goal from logged data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Goals per statement and transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        goals_done = goals_changed = 0
+        for goals_done, goals_changed in evaluate_goals(chunk_size=options["chunk_size"]):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{goals_done} goals, {goals_changed} changed ({goals_done / elapsed:,.0f} goals/s)")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Evaluated {goals_done} goals in {elapsed:.1f}s, {goals_changed} changed"
+        ))
@@ -0,0 +1,141 @@
+import json
+import subprocess
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from ai_integration import loadtest
+from ai_integration.answer_cache import answer_cache
+from ai_integration.llm import get_gateway
+from ai_integration.models import CustomUser
+from ai_integration.seeding import seed_population
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, timeout=5, check=False).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Drive the site with many logged-in synthetic users against a stub Gemini server and report "
+            "throughput and p50/p95/p99 latency per endpoint as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+        parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between visits (seconds)")
+        parser.add_argument("--cold", action="store_true", help="Unique chat questions, so no answer is cached")
+        parser.add_argument("--days", type=int, default=30, help="Days of history per synthetic user")
+        parser.add_argument("--phone-prefix", default="96")
+        parser.add_argument("--password", default="loadtest-pass")
+        parser.add_argument("--latency", choices=loadtest.LatencyModel.KINDS, default="lognormal",
+                            help="Distribution of the stub's response time")
+        parser.add_argument("--latency-ms", type=float, default=800, help="Mean (median for lognormal) in ms")
+        parser.add_argument("--latency-spread", type=float, default=0.5,
+                            help="Relative spread for uniform, sigma for lognormal")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub calls answered with 503")
+        parser.add_argument("--stub-port", type=int, default=0, help="Port of the stub (0 picks a free one)")
+        parser.add_argument("--base-url", help="Load an already running server (point its GEMINI_API_ENDPOINT "
+                                               "at the stub) instead of serving the app in this process")
+        parser.add_argument("--output", help="Report path (default: load-test-<commit>-<time>.json)")
+        parser.add_argument("--compare", help="Earlier report to print the latency changes against")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic users afterwards")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        # The app threads read the users over their own connections, so they are committed
+        for users_done, rows_written in seed_population(options["users"], days=options["days"],
+                                                        password=options["password"],
+                                                        phone_prefix=options["phone_prefix"]):
+            pass
+        phone_numbers = [f"{options['phone_prefix']}{i:08d}" for i in range(options["users"])]
+
+        latency = loadtest.LatencyModel(options["latency"], options["latency_ms"], options["latency_spread"], seed=1)
+        stub = loadtest.GeminiStub(latency, error_rate=options["error_rate"], port=options["stub_port"], seed=1)
+        stub.start()
+        self.stdout.write(f"Gemini stub on {stub.url} ({options['latency']}, {options['latency_ms']:.0f} ms)")
+        server = None
+        base_url = options["base_url"]
+        overrides = override_settings(LLM_PROVIDER="ai_integration.llm.GeminiProvider",
+                                      GEMINI_API_ENDPOINT=stub.url, GEMINI_API_KEY="load-test")
+        try:
+            if base_url is None:
+                overrides.enable()
+                answer_cache.clear()
+                server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+                server.daemon_threads = True
+                server.set_app(WSGIHandler())
+                threading.Thread(target=server.serve_forever, name="app-server", daemon=True).start()
+                base_url = f"http://127.0.0.1:{server.server_address[1]}"
+                self.stdout.write(f"Serving the app on {base_url}")
+            started_at = timezone.now()
+            self.stdout.write(f"{options['users']} users for {options['duration']:.0f}s...")
+            summary = loadtest.run_load(base_url, phone_numbers, options["password"], options["duration"],
+                                        options["think_time"], options["cold"])
+            report = {
+                'commit': _commit(),
+                'started_at': started_at.isoformat(),
+                'target': 'in-process' if server else base_url,
+                'options': {name: options[name] for name in (
+                    'users', 'duration', 'think_time', 'cold', 'days', 'latency', 'latency_ms', 'latency_spread',
+                    'error_rate')},
+                'stub': stub.stats(),
+                **summary,
+            }
+            if server:
+                report['gateway'] = get_gateway().stats()
+                report['answer_cache'] = answer_cache.stats()
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+                overrides.disable()
+            stub.stop()
+            if options["cleanup"]:
+                CustomUser.objects.filter(phone_number__in=phone_numbers).delete()
+
+        output = options["output"] or (
+            f"load-test-{report['commit'] or 'local'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        self._print(report, previous)
+        if report['users_logged_in'] < options["users"]:
+            self.stdout.write(self.style.WARNING(
+                f"Only {report['users_logged_in']} of {options['users']} users could log in"))
+        self.stdout.write(self.style.SUCCESS(f"Report saved to {output}"))
+
+    def _print(self, report, previous):
+        previous_endpoints = previous['endpoints'] if previous else {}
+        self.stdout.write(f"{'endpoint':<16} {'requests':>8} {'fail':>5} {'req/s':>7} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        rows = [*report['endpoints'].items(), ('overall', report['overall'])]
+        for endpoint, stats in rows:
+            line = (f"{endpoint:<16} {stats['requests']:>8} {stats['failures']:>5} {stats['throughput_rps']:>7.1f} "
+                    f"{stats['p50_ms'] or 0:>8.1f} {stats['p95_ms'] or 0:>8.1f} {stats['p99_ms'] or 0:>8.1f}")
+            before = previous['overall'] if previous and endpoint == 'overall' else previous_endpoints.get(endpoint)
+            if before and before.get('p95_ms') and stats['p95_ms']:
+                line += f"   p95 {(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}% vs {previous.get('commit')}"
+            self.stdout.write(line)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from ai_integration.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete delta sync tombstones older than SYNC_TOMBSTONE_DAYS (run daily)"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Deleted {prune_tombstones()} tombstones"))
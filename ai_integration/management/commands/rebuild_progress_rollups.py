@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_integration.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the weekly and monthly progress rollups of every user from their daily entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Users per query and transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users_done = rollups_written = 0
+        for users_done, rollups_written in rebuild_rollups(chunk_size=options["chunk_size"]):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{users_done} users, {rollups_written} rollups ({users_done / elapsed:,.0f} users/s)")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rollups_written} rollups for {users_done} users in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_integration.nutrition import recompute_targets
+
+
+class Command(BaseCommand):
+    help = "Recompute BMR, TDEE, calorie and macro targets for every profile in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Profiles per query and transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        profiles_done = 0
+        for profiles_done, rows_written in recompute_targets(chunk_size=options["chunk_size"]):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{profiles_done} profiles ({profiles_done / elapsed:,.0f} profiles/s)")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Recomputed targets for {profiles_done} profiles in {elapsed:.1f}s"))
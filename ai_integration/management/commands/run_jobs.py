@@ -0,0 +1,66 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ai_integration import jobs
+
+
+def _process_main(index, stop, burst, poll_interval):
+    # Spawned children start without Django; forked ones already have it
+    import django
+    django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent sets ``stop`` instead
+    jobs.work(jobs.worker_name(index), stop, burst=burst, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = "Run background jobs with a pool of worker threads (or processes) until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                            help="Number of worker threads or processes")
+        parser.add_argument("--processes", action="store_true",
+                            help="Run workers as processes, for CPU-bound tasks")
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due")
+        parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL,
+                            help="Seconds an idle worker waits before polling again")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        burst, poll_interval = options["burst"], options["poll_interval"]
+        if options["processes"]:
+            stop = multiprocessing.Event()
+            # Children must not inherit open database connections
+            connections.close_all()
+            workers = [
+                multiprocessing.Process(target=_process_main, args=(i, stop, burst, poll_interval), daemon=True)
+                for i in range(concurrency)
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=jobs.work, args=(jobs.worker_name(i), stop),
+                                 kwargs={"burst": burst, "poll_interval": poll_interval}, daemon=True)
+                for i in range(concurrency)
+            ]
+
+        def shutdown(signum, frame):
+            # Running jobs finish; their workers then exit instead of claiming more
+            self.stdout.write("Stopping after the running jobs...")
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+        kind = "processes" if options["processes"] else "threads"
+        self.stdout.write(f"Running jobs with {concurrency} worker {kind}")
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            # join() with a timeout keeps the main thread responsive to signals
+            while worker.is_alive():
+                worker.join(timeout=1)
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
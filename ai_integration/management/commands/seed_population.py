@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_integration.seeding import seed_population
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users with profiles, schedules, progress and goals for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--days", type=int, default=90, help="Days of history per user, ending today")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Users per transaction")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT")
+        parser.add_argument("--password", default="loadtest-pass", help="Password shared by every synthetic user")
+        parser.add_argument("--phone-prefix", default="90")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users_done = rows_written = 0
+        for users_done, rows_written in seed_population(
+            options["users"],
+            days=options["days"],
+            chunk_size=options["chunk_size"],
+            batch_size=options["batch_size"],
+            password=options["password"],
+            phone_prefix=options["phone_prefix"],
+            seed=options["seed"],
+        ):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{users_done}/{options['users']} users, {rows_written} rows "
+                f"({rows_written / elapsed:,.0f} rows/s)"
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {users_done} users / {rows_written} rows in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,360 @@
+"""Per-request performance metrics in the Prometheus text format.
+
+``metrics_middleware`` times every request and, through hooks, what it spent
+its time on: SQL queries (an execute wrapper installed on every database
+connection), LLM calls (``LLMGateway`` reports each one) and template
+rendering (the ``TimedDjangoTemplates`` backend). The per-request totals are
+added to in-memory histograms labelled by view, so finding out whether a slow
+``/dashboard/`` is SQL, templates or the LLM is one query in Prometheus.
+
+Recording is a few counter increments under one lock, cheap enough to leave
+on. Each worker process keeps its own registry; with ``METRICS_DIR`` set,
+workers write a snapshot to ``METRICS_DIR/metrics-<pid>-<start>.json`` at most
+every ``METRICS_FLUSH_INTERVAL`` seconds, from a background thread so requests
+(and the event loop) never wait on the file, and ``/metrics`` serves the sum of
+every worker's snapshot (its own live values included), so any gunicorn worker
+can answer the scrape. The start time in the name keeps a new worker that
+reuses a dead worker's pid from overwriting its snapshot. Empty the directory
+when deploying; snapshots of stopped workers keep counting, as counters should.
+"""
+import atexit
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+from django.utils.decorators import sync_and_async_middleware
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Name: (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', "Requests by view, method and status", None),
+    'http_request_duration_seconds': ('histogram', "Total request latency per view", LATENCY_BUCKETS),
+    'http_request_db_queries': ('histogram', "SQL queries per request", COUNT_BUCKETS),
+    'http_request_db_seconds': ('histogram', "Time spent in SQL per request", LATENCY_BUCKETS),
+    'http_request_llm_calls': ('histogram', "LLM calls per request", COUNT_BUCKETS),
+    'http_request_llm_seconds': ('histogram', "Time spent waiting for the LLM per request", LATENCY_BUCKETS),
+    'http_request_template_seconds': ('histogram', "Template rendering time per request", LATENCY_BUCKETS),
+    'llm_call_duration_seconds': ('histogram', "Latency of every LLM call, inside requests or not", LATENCY_BUCKETS),
+}
+
+UNMATCHED_VIEW = "<unmatched>"
+
+
+class Registry:
+    """Counters and fixed-bucket histograms keyed by (name, label values)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+        self.histograms = {}
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self.counters[name, labels] = self.counters.get((name, labels), 0) + amount
+
+    def observe_many(self, observations):
+        """Add ``(name, labels, value)`` observations under a single lock acquisition"""
+        with self._lock:
+            for name, labels, value in observations:
+                buckets = METRICS[name][2]
+                series = self.histograms.get((name, labels))
+                if series is None:
+                    series = self.histograms[name, labels] = [0] * (len(buckets) + 2)
+                series[bisect.bisect_left(buckets, value)] += 1
+                series[-1] += value
+
+    def observe(self, name, labels, value):
+        self.observe_many([(name, labels, value)])
+
+    def snapshot(self):
+        """JSON-friendly copy of every series"""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), list(series)] for (name, labels), series in self.histograms.items()
+                ],
+            }
+
+
+registry = Registry()
+
+LABEL_NAMES = {
+    'http_requests_total': ('view', 'method', 'status'),
+    'llm_call_duration_seconds': ('outcome',),
+}
+
+
+def merge(snapshots):
+    """Sum snapshots of several processes into ``(counters, histograms)`` dicts"""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(labels))
+            total = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, *extra):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render(counters, histograms):
+    """Prometheus text exposition of merged series"""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        names = LABEL_NAMES.get(name, ('view',))
+        series = counters if kind == 'counter' else histograms
+        keys = sorted(key for key in series if key[0] == name)
+        if not keys:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in keys:
+            labels = key[1]
+            if kind == 'counter':
+                lines.append(f"{name}{_label_text(names, labels)} {series[key]}")
+                continue
+            counts, total = series[key][:-1], series[key][-1]
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_label_text(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(names, labels)} {round(total, 6)}")
+            lines.append(f"{name}_count{_label_text(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_flush_lock = threading.Lock()
+
+# (pid, "<pid>-<start>") of this process; recomputed in a forked child
+_process = (None, None)
+
+
+def _process_key():
+    global _process
+    pid = os.getpid()
+    if _process[0] != pid:
+        _process = (pid, f"{pid}-{time.time_ns()}")
+    return _process[1]
+
+
+def _snapshot_path():
+    return os.path.join(settings.METRICS_DIR, f"metrics-{_process_key()}.json")
+
+
+def flush(force=False):
+    """Write this process's snapshot for the other workers, at most every METRICS_FLUSH_INTERVAL seconds"""
+    if not settings.METRICS_DIR:
+        return False
+    now = time.monotonic()
+    if not force and now - registry.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+        return False
+    # One writer per process; a request that finds the flush taken skips it
+    if not _flush_lock.acquire(blocking=force):
+        return False
+    try:
+        registry.flushed_at = now
+        path = _snapshot_path()
+        temporary = f"{path}.tmp"
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with open(temporary, "w") as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(temporary, path)
+    finally:
+        _flush_lock.release()
+    return True
+
+
+atexit.register(flush, force=True)
+
+
+def _flush_in_background():
+    """Start a flush on a daemon thread when one is due and none is running"""
+    if not settings.METRICS_DIR or _flush_lock.locked():
+        return
+    if time.monotonic() - registry.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+        return
+    threading.Thread(target=flush, name="metrics-flush", daemon=True).start()
+
+
+def collect():
+    """Text exposition of this process's live series plus every other worker's last snapshot"""
+    snapshots = [registry.snapshot()]
+    if settings.METRICS_DIR:
+        own = _snapshot_path()
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, "metrics-*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Being replaced right now; the next scrape reads it
+    return render(*merge(snapshots))
+
+
+# Per-request accounting
+
+class RequestMetrics:
+    """Totals of one request; queries may also run on the dashboard's pool threads, hence the lock"""
+
+    __slots__ = ('_lock', 'db_seconds', 'llm_calls', 'llm_seconds', 'queries', 'template_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.template_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+    def add_llm_call(self, seconds):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def add_template(self, seconds):
+        with self._lock:
+            self.template_seconds += seconds
+
+
+# Copied into sync_to_async threads, so async views and their sync helpers share one instance
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.add_query(time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def record_llm_call(seconds, outcome):
+    """Called by the LLM gateway for every call"""
+    current = _current.get()
+    if current is not None:
+        current.add_llm_call(seconds)
+    registry.observe('llm_call_duration_seconds', (outcome,), seconds)
+
+
+class TimedTemplate:
+    """Backend template that adds its render time to the current request"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        current = _current.get()
+        if current is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            current.add_template(time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times reported to the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _record_request(request, response, current, seconds):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else UNMATCHED_VIEW
+    status = response.status_code if response is not None else 500
+    registry.inc('http_requests_total', (view, request.method, str(status)))
+    labels = (view,)
+    registry.observe_many([
+        ('http_request_duration_seconds', labels, seconds),
+        ('http_request_db_queries', labels, current.queries),
+        ('http_request_db_seconds', labels, current.db_seconds),
+        ('http_request_llm_calls', labels, current.llm_calls),
+        ('http_request_llm_seconds', labels, current.llm_seconds),
+        ('http_request_template_seconds', labels, current.template_seconds),
+    ])
+    _flush_in_background()
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Record latency, SQL, LLM and template time of every request; keep it first in MIDDLEWARE"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            current = RequestMetrics()
+            token = _current.set(current)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await get_response(request)
+                return response
+            finally:
+                # A streamed response is timed up to its headers
+                _record_request(request, response, current, time.perf_counter() - started)
+                _current.reset(token)
+    else:
+        def middleware(request):
+            current = RequestMetrics()
+            token = _current.set(current)
+            started = time.perf_counter()
+            response = None
+            try:
+                response = get_response(request)
+                return response
+            finally:
+                _record_request(request, response, current, time.perf_counter() - started)
+                _current.reset(token)
+    return middleware
@@ -0,0 +1,68 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+
+from .context import get_user_context
+from .tokens import resolved_users, verify_access_token
+
+
+def bearer_token(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def _authenticate(request, user):
+    """Authenticate the request as ``user`` (anonymous when the token was invalid)
+
+    Runs after AuthenticationMiddleware and replaces its lazy session user
+    before anything reads it, so the session is never loaded or saved. A
+    bearer token cannot be sent by a browser on its own, so CSRF checks are
+    skipped; a bad token never falls back to the session cookie.
+    """
+    request.user = user or AnonymousUser()
+
+    async def auser():
+        return request.user
+
+    request.auser = auser
+    request._dont_enforce_csrf_checks = True
+
+
+@sync_and_async_middleware
+def bearer_token_middleware(get_response):
+    """Authenticate ``Authorization: Bearer <access token>`` requests without sessions"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = bearer_token(request)
+            if token is not None:
+                user_id = verify_access_token(token)
+                user = None
+                if user_id is not None:
+                    user = resolved_users.get(user_id) or await sync_to_async(resolved_users.load)(user_id)
+                _authenticate(request, user)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            token = bearer_token(request)
+            if token is not None:
+                user_id = verify_access_token(token)
+                _authenticate(request, resolved_users.resolve(user_id) if user_id is not None else None)
+            return get_response(request)
+    return middleware
+
+
+@sync_and_async_middleware
+def user_context_middleware(get_response):
+    """Attach a lazy ``request.user_context`` (see context.py); runs after authentication"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # Async views must use aget_user_context() instead
+            request.user_context = SimpleLazyObject(lambda: get_user_context(request))
+            return await get_response(request)
+    else:
+        def middleware(request):
+            request.user_context = SimpleLazyObject(lambda: get_user_context(request))
+            return get_response(request)
+    return middleware
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0005_alter_userprofile_gender'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyprogress',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='goaltracking',
+            index=models.Index(condition=models.Q(('is_achieved', False)), fields=['user', 'target_date'], name='goal_user_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='meal_user_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutschedule',
+            index=models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='workout_user_date_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_progress_per_user_day'),
+        ),
+    ]
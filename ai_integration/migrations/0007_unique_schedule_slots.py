@@ -0,0 +1,58 @@
+# Generated manually: turn the schedule lookup indexes into unique slot constraints
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+logger = logging.getLogger(__name__)
+
+
+def merge_duplicate_slots(apps, schema_editor):
+    """Merge every duplicated slot into one row so the unique constraints can be created
+
+    The row kept is a completed (consumed) one if any, else the oldest; the
+    others are deleted and their number logged. This cannot be undone.
+    """
+    for model_name, fields, flag in [
+        ('WorkoutSchedule', ['user', 'scheduled_date', 'scheduled_time'], 'is_completed'),
+        ('MealPlan', ['user', 'scheduled_date', 'scheduled_time', 'meal_type'], 'is_consumed'),
+    ]:
+        model = apps.get_model('ai_integration', model_name)
+        duplicates = model.objects.values(*fields).annotate(rows=Count('id')).filter(rows__gt=1)
+        removed = 0
+        for slot in duplicates:
+            slot.pop('rows')
+            rows = model.objects.filter(**slot)
+            keep_id = rows.order_by('-' + flag, 'id').values_list('id', flat=True)[0]
+            removed += rows.exclude(id=keep_id).delete()[0]
+        if removed:
+            logger.warning("Merged duplicate %s slots: deleted %s rows", model_name, removed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0006_schedule_progress_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_slots, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='workoutschedule',
+            name='workout_user_date_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='mealplan',
+            name='meal_user_date_time_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='workoutschedule',
+            constraint=models.UniqueConstraint(fields=('user', 'scheduled_date', 'scheduled_time'), name='unique_workout_per_user_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='mealplan',
+            constraint=models.UniqueConstraint(fields=('user', 'scheduled_date', 'scheduled_time', 'meal_type'), name='unique_meal_per_user_slot'),
+        ),
+    ]
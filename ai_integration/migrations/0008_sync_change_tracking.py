@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-18 17:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0007_unique_schedule_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dailyprogress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='goaltracking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='mealplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='workoutschedule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='dailyprogress',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='progress_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goaltracking',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='goal_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='meal_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutschedule',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='workout_user_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='synctombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 17:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0009_refresh_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NutritionTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bmi', models.FloatField(blank=True, null=True)),
+                ('bmr', models.FloatField(blank=True, null=True)),
+                ('tdee', models.IntegerField(blank=True, null=True)),
+                ('calories', models.IntegerField(blank=True, null=True)),
+                ('protein_g', models.IntegerField(blank=True, null=True)),
+                ('carbs_g', models.IntegerField(blank=True, null=True)),
+                ('fats_g', models.IntegerField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
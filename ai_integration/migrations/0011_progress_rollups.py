@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 17:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0010_nutrition_targets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('days_logged', models.IntegerField(default=0)),
+                ('calories_consumed', models.IntegerField(default=0)),
+                ('calories_burned', models.IntegerField(default=0)),
+                ('water_intake_glasses', models.IntegerField(default=0)),
+                ('steps_taken', models.IntegerField(default=0)),
+                ('avg_weight', models.FloatField(blank=True, null=True)),
+                ('min_weight', models.FloatField(blank=True, null=True)),
+                ('max_weight', models.FloatField(blank=True, null=True)),
+                ('avg_mood', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'period', 'start'), name='unique_rollup_per_period')],
+            },
+        ),
+    ]
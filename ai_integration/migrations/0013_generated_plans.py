@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0012_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('constraints', models.JSONField()),
+                ('plan', models.JSONField()),
+                ('times_used', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
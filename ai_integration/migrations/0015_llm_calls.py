@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 18:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0014_chat_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('chat', 'Chat answer'), ('summary', 'Chat summary'), ('plan', 'Weekly plan'), ('other', 'Other')], default='other', max_length=10)),
+                ('cache', models.CharField(choices=[('miss', 'Called the LLM'), ('exact', 'Answer cache'), ('semantic', 'Near-duplicate index'), ('coalesced', 'Shared an in-flight call')], default='miss', max_length=10)),
+                ('outcome', models.CharField(choices=[('ok', 'OK'), ('error', 'Error'), ('timeout', 'Timed out'), ('rejected', 'Rejected (busy or circuit open)')], default='ok', max_length=10)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='llm_call_created_idx'), models.Index(fields=['user', 'created_at'], name='llm_call_user_idx')],
+            },
+        ),
+    ]
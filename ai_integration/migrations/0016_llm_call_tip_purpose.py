@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_integration', '0015_llm_calls'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='llmcall',
+            name='purpose',
+            field=models.CharField(choices=[('chat', 'Chat answer'), ('summary', 'Chat summary'), ('plan', 'Weekly plan'), ('tip', 'Tip of the day'), ('other', 'Other')], default='other', max_length=10),
+        ),
+    ]
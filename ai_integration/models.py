@@ -122,6 +122,20 @@ class WorkoutSchedule(models.Model):
     is_completed = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Delta sync change feed: a user's rows changed since a cursor, in (updated_at, id) order
+            models.Index(fields=['user', 'updated_at', 'id'], name='workout_user_updated_idx'),
+        ]
+        constraints = [
+            # One workout per user per time slot; the unique index also serves the hot path
+            # (one user's schedule for a date range, ordered by time)
+            models.UniqueConstraint(
+                fields=['user', 'scheduled_date', 'scheduled_time'], name='unique_workout_per_user_slot'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.phone_number} - {self.workout_name} on {self.scheduled_date}"
@@ -149,6 +163,18 @@ class MealPlan(models.Model):
     is_consumed = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Delta sync change feed: a user's rows changed since a cursor, in (updated_at, id) order
+            models.Index(fields=['user', 'updated_at', 'id'], name='meal_user_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'scheduled_date', 'scheduled_time', 'meal_type'], name='unique_meal_per_user_slot'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.phone_number} - {self.meal_name} ({self.meal_type})"
@@ -156,7 +182,7 @@ class MealPlan(models.Model):
 # 5️⃣ Daily Progress Model
 class DailyProgress(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    date = models.DateField(unique=True)
+    date = models.DateField()
     weight = models.FloatField(null=True, blank=True)
     calories_consumed = models.IntegerField(default=0)
     calories_burned = models.IntegerField(default=0)
@@ -165,7 +191,25 @@ class DailyProgress(models.Model):
     mood_rating = models.IntegerField(choices=[(i, i) for i in range(1, 11)], null=True, blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Delta sync change feed: a user's rows changed since a cursor, in (updated_at, id) order
+            models.Index(fields=['user', 'updated_at', 'id'], name='progress_user_updated_idx'),
+        ]
+        constraints = [
+            # One progress row per user per day (also serves (user, date) lookups)
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_progress_per_user_day'),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Rollups refresh the period an edited entry moved out of as well
+        instance._loaded_date = instance.__dict__.get('date')
+        return instance
+
     def __str__(self):
         return f"{self.user.phone_number} - {self.date}"
 
@@ -188,6 +232,248 @@ class GoalTracking(models.Model):
     target_date = models.DateField()
     is_achieved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Delta sync change feed: a user's rows changed since a cursor, in (updated_at, id) order
+            models.Index(fields=['user', 'updated_at', 'id'], name='goal_user_updated_idx'),
+            # Active (not yet achieved) goals of a user ordered by target date
+            models.Index(
+                fields=['user', 'target_date'],
+                condition=models.Q(is_achieved=False),
+                name='goal_user_active_date_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.phone_number} - {self.goal_title}"
+
+# 7️⃣ Sync Tombstone Model
+class SyncTombstone(models.Model):
+    """Records a deleted workout, meal, progress entry or goal so delta sync can report it"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    resource = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.resource} #{self.object_id}"
+
+# 8️⃣ Refresh Token Model
+class RefreshToken(models.Model):
+    """A mobile client's refresh token, stored as a SHA-256 hash; rotated on every use"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} - refresh token {self.token_hash[:8]}"
+
+# 9️⃣ Nutrition Target Model
+class NutritionTarget(models.Model):
+    """Daily energy and macro targets derived from the profile (see nutrition.py); NULL while incomplete"""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
+    bmi = models.FloatField(null=True, blank=True)
+    bmr = models.FloatField(null=True, blank=True)
+    tdee = models.IntegerField(null=True, blank=True)
+    calories = models.IntegerField(null=True, blank=True)
+    protein_g = models.IntegerField(null=True, blank=True)
+    carbs_g = models.IntegerField(null=True, blank=True)
+    fats_g = models.IntegerField(null=True, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.calories} kcal"
+
+# 🔟 Progress Rollup Model
+class ProgressRollup(models.Model):
+    """DailyProgress aggregated per user and calendar week or month (see rollups.py)"""
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # Monday of the week or first day of the month
+    start = models.DateField()
+    days_logged = models.IntegerField(default=0)
+    calories_consumed = models.IntegerField(default=0)
+    calories_burned = models.IntegerField(default=0)
+    water_intake_glasses = models.IntegerField(default=0)
+    steps_taken = models.IntegerField(default=0)
+    avg_weight = models.FloatField(null=True, blank=True)
+    min_weight = models.FloatField(null=True, blank=True)
+    max_weight = models.FloatField(null=True, blank=True)
+    avg_mood = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also serves trend reads: a user's periods in start order
+            models.UniqueConstraint(fields=['user', 'period', 'start'], name='unique_rollup_per_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.period} of {self.start}"
+
+# 1️⃣1️⃣ Background Job Model
+class Job(models.Model):
+    """A unit of slow work run off the request path by ``manage.py run_jobs`` (see jobs.py)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    # A running job whose lock expired is handed to another worker
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: queued jobs in priority order; the index stays as small as the backlog
+            models.Index(
+                fields=['-priority', 'run_after', 'id'], condition=models.Q(status='queued'), name='job_queued_idx',
+            ),
+            # Requeueing running jobs whose visibility timeout expired
+            models.Index(fields=['locked_until'], condition=models.Q(status='running'), name='job_running_lock_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+# 1️⃣2️⃣ Generated Plan Model
+class GeneratedPlan(models.Model):
+    """A validated week of workouts and meals from the LLM, shared by every profile with the same constraints"""
+    fingerprint = models.CharField(max_length=64, unique=True)
+    constraints = models.JSONField()
+    plan = models.JSONField()
+    times_used = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Plan {self.fingerprint[:8]} (used {self.times_used}x)"
+
+# 1️⃣3️⃣ Chat Message Model
+class ChatMessage(models.Model):
+    """One message of a user's chat with the AI; rows are only ever appended"""
+    USER = 'user'
+    ASSISTANT = 'assistant'
+    ROLE_CHOICES = [
+        (USER, 'User'),
+        (ASSISTANT, 'Assistant'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # History pages and the recent context window: newest first per user
+            models.Index(fields=['user', '-id'], name='chat_message_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.role} #{self.pk}"
+
+# 1️⃣4️⃣ Chat Summary Model
+class ChatSummary(models.Model):
+    """Rolling summary of a user's chat messages older than the verbatim context window"""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
+    text = models.TextField(blank=True)
+    # Id of the newest message folded into the summary
+    summarized_through = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Chat summary of {self.user_id} through #{self.summarized_through}"
+
+# 1️⃣5️⃣ LLM Call Model
+class LLMCall(models.Model):
+    """Telemetry of one LLM request or cached chat answer, written in batches (see telemetry.py)"""
+    CHAT = 'chat'
+    SUMMARY = 'summary'
+    PLAN = 'plan'
+    TIP = 'tip'
+    OTHER = 'other'
+    PURPOSE_CHOICES = [
+        (CHAT, 'Chat answer'),
+        (SUMMARY, 'Chat summary'),
+        (PLAN, 'Weekly plan'),
+        (TIP, 'Tip of the day'),
+        (OTHER, 'Other'),
+    ]
+
+    MISS = 'miss'
+    EXACT = 'exact'
+    SEMANTIC = 'semantic'
+    COALESCED = 'coalesced'
+    CACHE_CHOICES = [
+        (MISS, 'Called the LLM'),
+        (EXACT, 'Answer cache'),
+        (SEMANTIC, 'Near-duplicate index'),
+        (COALESCED, 'Shared an in-flight call'),
+    ]
+
+    OK = 'ok'
+    ERROR = 'error'
+    TIMEOUT = 'timeout'
+    REJECTED = 'rejected'
+    OUTCOME_CHOICES = [
+        (OK, 'OK'),
+        (ERROR, 'Error'),
+        (TIMEOUT, 'Timed out'),
+        (REJECTED, 'Rejected (busy or circuit open)'),
+    ]
+
+    # No database constraint: a buffered row may name a user deleted before it was flushed
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES, default=OTHER)
+    cache = models.CharField(max_length=10, choices=CACHE_CHOICES, default=MISS)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, default=OK)
+    # Estimated from the text length, like the prompt budget
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Per-day aggregates and time-bounded listings
+            models.Index(fields=['created_at'], name='llm_call_created_idx'),
+            # Per-user usage over a period
+            models.Index(fields=['user', 'created_at'], name='llm_call_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.purpose} for {self.user_id} ({self.outcome}, {self.latency_ms} ms)"
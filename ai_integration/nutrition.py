@@ -0,0 +1,190 @@
+"""Energy expenditure and nutrition targets: BMI, BMR, TDEE, calorie and macro targets.
+
+Both entry points share one set of coefficients. ``targets()`` is the plain
+Python fast path for one profile, used by the dashboard through the user
+context (for a single value NumPy's per-call overhead would dominate).
+``batch_targets()`` computes whole arrays of profiles with NumPy for reports,
+reminders and plan generation, and ``recompute_targets()`` stores the results
+for the entire profile table in NutritionTarget, one chunk at a time.
+"""
+import math
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .models import UserProfile, NutritionTarget
+
+
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'very_active': 1.9
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+
+# Daily calories relative to maintenance (TDEE)
+GOAL_CALORIE_ADJUSTMENTS = {
+    'weight_loss': -500,
+    'muscle_gain': 300,
+}
+MIN_CALORIES = 1200
+
+# Protein in grams per kg of body weight, fat as a share of calories, carbs make up the rest
+GOAL_PROTEIN_PER_KG = {
+    'weight_loss': 2.0,
+    'muscle_gain': 2.0,
+    'strength': 1.8,
+    'endurance': 1.4,
+}
+DEFAULT_PROTEIN_PER_KG = 1.6
+FAT_SHARE = 0.25
+
+Targets = namedtuple('Targets', ['bmi', 'bmr', 'tdee', 'calories', 'protein_g', 'carbs_g', 'fats_g'])
+
+# Columns of UserProfile read by the batch path, in this order
+PROFILE_COLUMNS = ('user_id', 'dob', 'gender', 'height', 'weight', 'activity_level', 'fitness_goal')
+
+TARGET_FIELDS = ('bmi', 'bmr', 'tdee', 'calories', 'protein_g', 'carbs_g', 'fats_g')
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def targets(weight, height, age, gender, activity_level, fitness_goal):
+    """Targets for one person, or None until weight, height and age are known"""
+    if not (weight and height and age):
+        return None
+    bmr = 10 * weight + 6.25 * height - 5 * age + (5 if gender == 'male' else -161)
+    tdee = int(bmr * ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER))
+    calories = max(MIN_CALORIES, tdee + GOAL_CALORIE_ADJUSTMENTS.get(fitness_goal, 0))
+    protein = round(weight * GOAL_PROTEIN_PER_KG.get(fitness_goal, DEFAULT_PROTEIN_PER_KG))
+    fats = round(calories * FAT_SHARE / 9)
+    carbs = max(0, round((calories - protein * 4 - fats * 9) / 4))
+    return Targets(round(weight / (height / 100) ** 2, 2), bmr, tdee, calories, protein, carbs, fats)
+
+
+def _lookup(codes, table, default):
+    """Map an array of choice codes through ``table`` without a Python loop per row"""
+    values = np.full(len(codes), default, dtype=np.float64)
+    for code, value in table.items():
+        values[codes == code] = value
+    return values
+
+
+def ages(dobs, today=None):
+    """Whole years between each date of birth and ``today``; NaN where unknown"""
+    today = today or date.today()
+    # Day ordinals are much cheaper to build than NumPy's own date object parsing
+    ordinals = np.array([dob.toordinal() if dob else 0 for dob in dobs], dtype=np.int64)
+    known = ordinals > 0
+    born = (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+    years = born.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = born.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    days = (born - born.astype('datetime64[M]')).astype(np.int64) + 1
+    before_birthday = (months * 100 + days) > (today.month * 100 + today.day)
+    result = (today.year - years - before_birthday).astype(np.float64)
+    result[~known] = np.nan
+    return result
+
+
+def encode_profiles(rows, today=None):
+    """Column arrays for ``batch_targets`` from ``PROFILE_COLUMNS`` value rows"""
+    if not rows:
+        columns = [[] for _ in PROFILE_COLUMNS]
+    else:
+        columns = list(zip(*rows))
+    user_ids, dobs, genders, heights, weights, activity_levels, goals = columns
+    goals = np.array(goals, dtype=object)
+    return {
+        'user_id': np.array(user_ids, dtype=np.int64),
+        'weight': np.array(weights, dtype=np.float64),  # None becomes NaN
+        'height': np.array(heights, dtype=np.float64),
+        'age': ages(dobs, today),
+        'is_male': np.array(genders, dtype=object) == 'male',
+        'activity_multiplier': _lookup(
+            np.array(activity_levels, dtype=object), ACTIVITY_MULTIPLIERS, DEFAULT_ACTIVITY_MULTIPLIER
+        ),
+        'calorie_adjustment': _lookup(goals, GOAL_CALORIE_ADJUSTMENTS, 0),
+        'protein_per_kg': _lookup(goals, GOAL_PROTEIN_PER_KG, DEFAULT_PROTEIN_PER_KG),
+    }
+
+
+def batch_targets(weight, height, age, is_male, activity_multiplier, calorie_adjustment, protein_per_kg, **extra):
+    """``targets()`` over arrays; every output is NaN where weight, height or age is missing"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valid = (weight > 0) & (height > 0) & (age > 0)
+        bmr = 10 * weight + 6.25 * height - 5 * age + np.where(is_male, 5.0, -161.0)
+        tdee = np.trunc(bmr * activity_multiplier)
+        calories = np.maximum(MIN_CALORIES, tdee + calorie_adjustment)
+        protein = np.round(weight * protein_per_kg)
+        fats = np.round(calories * FAT_SHARE / 9)
+        carbs = np.maximum(0, np.round((calories - protein * 4 - fats * 9) / 4))
+        bmi = np.round(weight / (height / 100) ** 2, 2)
+    result = {
+        'bmi': bmi, 'bmr': bmr, 'tdee': tdee, 'calories': calories,
+        'protein_g': protein, 'carbs_g': carbs, 'fats_g': fats,
+    }
+    for values in result.values():
+        values[~valid] = np.nan
+    return result
+
+
+def _upsert_targets(cursor, rows):
+    """INSERT ... ON CONFLICT (user) DO UPDATE for NutritionTarget rows"""
+    ops = connection.ops
+    meta = NutritionTarget._meta
+    fields = [meta.get_field(name) for name in ('user', *TARGET_FIELDS, 'computed_at')]
+    columns = ", ".join(ops.quote_name(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    suffix = ops.on_conflict_suffix_sql(
+        fields, OnConflict.UPDATE, [field.column for field in fields[1:]], [meta.get_field('user').column]
+    )
+    cursor.executemany(
+        f"INSERT INTO {ops.quote_name(meta.db_table)} ({columns}) VALUES ({placeholders}) {suffix}", rows
+    )
+
+
+def _target_rows(encoded, computed, now):
+    values = np.column_stack([computed[name] for name in TARGET_FIELDS])
+    rows = []
+    for user_id, row in zip(encoded['user_id'].tolist(), values.tolist()):
+        # NaN (incomplete profile) is stored as NULL; integral targets as ints
+        bmi, bmr, *rest = [None if math.isnan(value) else value for value in row]
+        rows.append((user_id, bmi, bmr, *[None if value is None else int(value) for value in rest], now))
+    return rows
+
+
+def recompute_targets(chunk_size=5000, today=None):
+    """Recompute and store the targets of every profile, one transaction per chunk
+
+    Yields ``(profiles_done, rows_written)`` after every chunk.
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    last_id = 0
+    done = 0
+    while True:
+        chunk = list(
+            UserProfile.objects.filter(id__gt=last_id).order_by('id').values_list('id', *PROFILE_COLUMNS)[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        encoded = encode_profiles([row[1:] for row in chunk], today)
+        rows = _target_rows(encoded, batch_targets(**encoded), now)
+        with transaction.atomic(), connection.cursor() as cursor:
+            _upsert_targets(cursor, rows)
+        done += len(chunk)
+        yield done, len(rows)
+
+
+def update_target(profile, age=None):
+    """Store the targets of one profile right after it changes (scalar path)"""
+    result = targets(profile.weight, profile.height, age if age is not None else profile.get_age(),
+                     profile.gender, profile.activity_level, profile.fitness_goal)
+    values = result._asdict() if result else dict.fromkeys(TARGET_FIELDS)
+    NutritionTarget.objects.update_or_create(user_id=profile.user_id, defaults=values)
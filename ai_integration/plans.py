@@ -0,0 +1,343 @@
+"""AI weekly plans: a structured week of workouts and meals generated by the LLM.
+
+The profile is reduced to the constraints a plan depends on: goal, workout
+frequency and duration, equipment, exercise preferences, dietary restrictions,
+allergies, medical conditions and the daily calorie target. Free text is
+normalized and numbers are bucketed, so many users share one fingerprint.
+A fresh GeneratedPlan for the fingerprint is reused without calling the LLM.
+Otherwise the model is asked for JSON only, and the reply is parsed, validated
+and repaired into a well-formed week (see ``repair_plan``). The week is then
+written for the user with one bulk_create per model.
+"""
+import hashlib
+import json
+import math
+import re
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from . import nutrition, telemetry, versions
+from .coalescing import SingleFlight
+from .llm import get_gateway
+from .models import GeneratedPlan, LLMCall, MealPlan, WorkoutSchedule
+
+
+PLAN_DAYS = 7
+DEFAULT_WORKOUTS_PER_WEEK = 3
+DEFAULT_WORKOUT_MINUTES = 45
+DEFAULT_DAILY_CALORIES = 2000
+# Buckets that let similar profiles share a plan
+WORKOUT_MINUTES_STEP = 15
+CALORIE_STEP = 100
+# A day's meals are rescaled when they miss the calorie target by more than this
+CALORIE_TOLERANCE = 0.15
+# Replies that cannot be repaired are re-requested once, with the problem stated
+GENERATION_ATTEMPTS = 2
+
+MEAL_TYPES = [choice for choice, label in MealPlan.MEAL_CHOICES]
+MEAL_TYPE_ALIASES = {
+    'morning snack': 'snack1', 'afternoon snack': 'snack2', 'evening snack': 'snack3',
+    **{label.lower(): choice for choice, label in MealPlan.MEAL_CHOICES},
+}
+SNACK_TYPES = ('snack1', 'snack2', 'snack3')
+DEFAULT_MEAL_TIMES = {
+    'breakfast': '08:00', 'snack1': '10:30', 'lunch': '13:00', 'snack2': '15:30', 'dinner': '19:00', 'snack3': '21:00',
+}
+DEFAULT_WORKOUT_TIME = '07:00'
+
+# Free-text answers that mean "nothing"
+NONE_WORDS = {'', '-', 'na', 'n/a', 'no', 'none', 'nothing', 'nil'}
+_SPLIT_RE = re.compile(r"[,;/\n]|\band\b")
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+
+PLAN_PROMPT = (
+    "You are a professional fitness coach and nutritionist. Create a {days}-day plan for a client "
+    "with these constraints:\n{constraints}\n\n"
+    "Rules:\n"
+    "- Exactly {workouts_per_week} workouts on different days, each about {workout_minutes} minutes, "
+    "using only the listed equipment (bodyweight exercises if none) and safe for any medical conditions.\n"
+    "- Every day has breakfast, snack1, lunch, snack2 and dinner totalling about {daily_calories} kcal, "
+    "respecting the dietary restrictions and never using an allergen.\n"
+    "- Days are numbered 1 to {days}; times are 24-hour HH:MM.\n\n"
+    "Reply with JSON only, no prose and no markdown, in exactly this shape:\n"
+    '{{"workouts": [{{"day": 1, "name": "...", "type": "Cardio", "time": "07:00", "duration_minutes": 30}}], '
+    '"meals": [{{"day": 1, "meal_type": "breakfast", "name": "...", "time": "08:00", '
+    '"calories": 400, "protein": 25, "carbs": 45, "fats": 12}}]}}'
+)
+
+RETRY_NOTE = "\n\nYour previous reply could not be used ({error}). Reply with the JSON object only."
+
+plan_flight = SingleFlight()
+
+
+class InvalidPlan(ValueError):
+    pass
+
+
+def _items(text):
+    """Normalized, de-duplicated, sorted items of a comma/"and"-separated free-text answer"""
+    items = {re.sub(r"\s+", " ", item).strip(" .").lower() for item in _SPLIT_RE.split(text or '')}
+    return sorted(items - NONE_WORDS)
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def plan_constraints(profile, today=None):
+    """Everything a plan depends on, normalized so equivalent profiles compare equal"""
+    if profile is None:
+        return {
+            'goal': 'general_fitness', 'workouts_per_week': DEFAULT_WORKOUTS_PER_WEEK,
+            'workout_minutes': DEFAULT_WORKOUT_MINUTES, 'equipment': [], 'exercise_types': [],
+            'dietary_restrictions': [], 'allergies': [], 'medical_conditions': [],
+            'daily_calories': DEFAULT_DAILY_CALORIES,
+        }
+    targets = nutrition.targets(profile.weight, profile.height, profile.get_age(), profile.gender,
+                                profile.activity_level, profile.fitness_goal)
+    minutes = profile.workout_duration or DEFAULT_WORKOUT_MINUTES
+    return {
+        'goal': profile.fitness_goal or 'general_fitness',
+        'workouts_per_week': _clamp(profile.workout_frequency or DEFAULT_WORKOUTS_PER_WEEK, 1, PLAN_DAYS),
+        'workout_minutes': _clamp(round(minutes / WORKOUT_MINUTES_STEP) * WORKOUT_MINUTES_STEP, 15, 120),
+        'equipment': _items(profile.available_equipment),
+        'exercise_types': _items(profile.preferred_exercise_types),
+        'dietary_restrictions': _items(profile.dietary_restrictions),
+        'allergies': _items(profile.allergies),
+        'medical_conditions': _items(profile.medical_conditions),
+        'daily_calories': round((targets.calories if targets else DEFAULT_DAILY_CALORIES) / CALORIE_STEP)
+        * CALORIE_STEP,
+    }
+
+
+def constraints_fingerprint(constraints):
+    return hashlib.sha256(json.dumps(constraints, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def build_plan_prompt(constraints):
+    lines = "\n".join(
+        f"- {name.replace('_', ' ')}: {', '.join(value) if isinstance(value, list) else value}"
+        for name, value in constraints.items()
+        if value not in ([], '')
+    )
+    return PLAN_PROMPT.format(days=PLAN_DAYS, constraints=lines, **constraints)
+
+
+def parse_plan(text):
+    """The JSON object in a model reply, tolerating code fences, surrounding prose and trailing commas"""
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        raise InvalidPlan("no JSON object in the reply")
+    raw = text[start:end + 1]
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        try:
+            data = json.loads(_TRAILING_COMMA_RE.sub(r"\1", raw))
+        except ValueError as e:
+            raise InvalidPlan(f"malformed JSON: {e}")
+    if not isinstance(data, dict):
+        raise InvalidPlan("the reply is not a JSON object")
+    return data
+
+
+def _number(value, default=None):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(number) else number
+
+
+def _time(value, default):
+    """'HH:MM' from the common ways a model writes a time of day"""
+    text = str(value or '').strip().upper()
+    for pattern in ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%I %p', '%I%p'):
+        try:
+            return datetime.strptime(text, pattern).strftime('%H:%M')
+        except ValueError:
+            continue
+    return default
+
+
+def _text(value, limit):
+    return re.sub(r"\s+", " ", str(value or '')).strip()[:limit]
+
+
+def _day(value):
+    day = _number(value)
+    return int(day) if day is not None and day == int(day) and 1 <= day <= PLAN_DAYS else None
+
+
+def _repair_workouts(entries, constraints):
+    workouts = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        day, name = _day(entry.get('day')), _text(entry.get('name'), 100)
+        # One workout per day, at most as many days as the profile asks for
+        if day is None or not name or day in workouts or len(workouts) >= constraints['workouts_per_week']:
+            continue
+        minutes = _number(entry.get('duration_minutes'), constraints['workout_minutes'])
+        workouts[day] = {
+            'day': day,
+            'name': name,
+            'type': _text(entry.get('type'), 50) or 'General',
+            'time': _time(entry.get('time'), DEFAULT_WORKOUT_TIME),
+            'duration_minutes': int(_clamp(round(minutes), 10, 180)),
+        }
+    return sorted(workouts.values(), key=lambda workout: workout['day'])
+
+
+def _meal_type(value, taken):
+    meal_type = _text(value, 30).lower()
+    meal_type = MEAL_TYPE_ALIASES.get(meal_type, meal_type)
+    if meal_type == 'snack':
+        # Plain "snack"s fill the snack slots in order
+        meal_type = next((snack for snack in SNACK_TYPES if snack not in taken), None)
+    return meal_type if meal_type in MEAL_TYPES and meal_type not in taken else None
+
+
+def _repair_meals(entries, constraints):
+    days = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        day, name = _day(entry.get('day')), _text(entry.get('name'), 100)
+        calories = _number(entry.get('calories'))
+        if day is None or not name or not calories or calories <= 0:
+            continue
+        meals = days.get(day, {})
+        meal_type = _meal_type(entry.get('meal_type'), meals)
+        if meal_type is None:
+            continue
+        days[day] = meals
+        calories = _clamp(calories, 20, 3000)
+        # Missing macros get the sample plan's 30/40/30 protein/carbs/fat split
+        meals[meal_type] = {
+            'day': day,
+            'meal_type': meal_type,
+            'name': name,
+            'time': _time(entry.get('time'), DEFAULT_MEAL_TIMES[meal_type]),
+            'calories': calories,
+            'protein': max(0.0, _number(entry.get('protein'), calories * 0.3 / 4)),
+            'carbs': max(0.0, _number(entry.get('carbs'), calories * 0.4 / 4)),
+            'fats': max(0.0, _number(entry.get('fats'), calories * 0.3 / 9)),
+        }
+    if not days:
+        raise InvalidPlan("no usable meals")
+
+    target = constraints['daily_calories']
+    repaired = []
+    for day in range(1, PLAN_DAYS + 1):
+        # A day the model skipped repeats the closest earlier (or first) planned day
+        source = days.get(day) or days[max((d for d in days if d < day), default=min(days))]
+        total = sum(meal['calories'] for meal in source.values())
+        scale = target / total if abs(total - target) > target * CALORIE_TOLERANCE else 1.0
+        for meal in sorted(source.values(), key=lambda meal: (meal['time'], MEAL_TYPES.index(meal['meal_type']))):
+            repaired.append({
+                **meal, 'day': day, 'calories': round(meal['calories'] * scale),
+                'protein': round(meal['protein'] * scale, 1), 'carbs': round(meal['carbs'] * scale, 1),
+                'fats': round(meal['fats'] * scale, 1),
+            })
+    return repaired
+
+
+def repair_plan(data, constraints):
+    """A well-formed week from a parsed reply, or InvalidPlan
+
+    Malformed entries are dropped and duplicates resolved, missing fields get
+    defaults, workouts are capped at the requested frequency, days without
+    meals repeat another day and each day's meals are scaled to the calorie
+    target when they miss it by more than CALORIE_TOLERANCE.
+    """
+    workouts = _repair_workouts(data.get('workouts'), constraints)
+    if not workouts:
+        raise InvalidPlan("no usable workouts")
+    return {'workouts': workouts, 'meals': _repair_meals(data.get('meals'), constraints)}
+
+
+def _generate(constraints, user_id=None):
+    prompt = build_plan_prompt(constraints)
+    last_error = None
+    for attempt in range(GENERATION_ATTEMPTS):
+        reply = get_gateway().generate(
+            prompt if last_error is None else prompt + RETRY_NOTE.format(error=last_error),
+            purpose=LLMCall.PLAN, user_id=user_id,
+        )
+        try:
+            return repair_plan(parse_plan(reply), constraints)
+        except InvalidPlan as e:
+            last_error = e
+    raise last_error
+
+
+def get_plan(profile, user_id=None):
+    """``(plan, reused)`` for the profile's constraints; the LLM is called only without a fresh shared plan
+
+    ``profile`` may be None (the defaults of ``plan_constraints``); ``user_id``
+    attributes the call in the LLM telemetry.
+    """
+    constraints = plan_constraints(profile)
+    fingerprint = constraints_fingerprint(constraints)
+    fresh = GeneratedPlan.objects.filter(
+        fingerprint=fingerprint, created_at__gte=timezone.now() - timedelta(days=settings.PLAN_REUSE_DAYS),
+    )
+    cached = fresh.values_list('plan', flat=True).first()
+    if cached is not None:
+        fresh.update(times_used=F('times_used') + 1)
+        telemetry.record(LLMCall.PLAN, user_id, cache=LLMCall.EXACT)
+        return cached, True
+
+    # Workers generating for the same constraints at once share one LLM call
+    plan = plan_flight.do(fingerprint, lambda: _generate(constraints, user_id))
+    try:
+        GeneratedPlan.objects.update_or_create(fingerprint=fingerprint, defaults={
+            'constraints': constraints, 'plan': plan, 'times_used': 1, 'created_at': timezone.now(),
+        })
+    except IntegrityError:
+        # Another process stored the same fingerprint first; its plan is as good
+        pass
+    return plan, False
+
+
+def apply_plan(user, plan, start=None):
+    """Write the plan as the user's workouts and meals from ``start`` with one bulk_create per model"""
+    start = start or date.today()
+
+    def parse_time(value):
+        return datetime.strptime(value, '%H:%M').time()
+
+    workouts = [
+        WorkoutSchedule(
+            user=user, scheduled_date=start + timedelta(days=workout['day'] - 1),
+            scheduled_time=parse_time(workout['time']), workout_name=workout['name'],
+            workout_type=workout['type'], duration_minutes=workout['duration_minutes'],
+        )
+        for workout in plan['workouts']
+    ]
+    meals = [
+        MealPlan(
+            user=user, scheduled_date=start + timedelta(days=meal['day'] - 1),
+            scheduled_time=parse_time(meal['time']), meal_type=meal['meal_type'], meal_name=meal['name'],
+            calories=meal['calories'], protein=meal['protein'], carbs=meal['carbs'], fats=meal['fats'],
+        )
+        for meal in plan['meals']
+    ]
+    # Slots the user already filled are kept
+    WorkoutSchedule.objects.bulk_create(workouts, ignore_conflicts=True)
+    MealPlan.objects.bulk_create(meals, ignore_conflicts=True)
+    # bulk_create sends no post_save signals
+    versions.bump(user.pk, 'workouts', 'meals')
+    return len(workouts), len(meals)
+
+
+def generate_weekly_plan(user, profile, start=None):
+    """Get (or reuse) a plan for ``profile`` (None without one) and write it for ``user``; returns a summary"""
+    plan, reused = get_plan(profile, user.pk)
+    workouts, meals = apply_plan(user, plan, start)
+    return {'reused': reused, 'workouts': workouts, 'meals': meals}
@@ -0,0 +1,250 @@
+"""Personalized prompt builder for the AI chat.
+
+The prompt is assembled from a fixed template and a compact "profile context
+block". The block lists only the profile fields that are actually filled in
+and is cached per profile version (``updated_at`` plus the current date, since
+age is derived from it), so it is rebuilt only when the profile changes. A
+cheap token estimate keeps every prompt under ``PROMPT_MAX_INPUT_TOKENS``.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date
+
+from django.conf import settings
+
+
+CHARS_PER_TOKEN = 4
+
+PROMPT_TEMPLATE = (
+    'You are a professional fitness and nutrition AI assistant. The user is asking: "{question}"\n\n'
+    "Give a personalized, encouraging, specific and actionable answer.{profile}"
+)
+
+PROFILE_TEMPLATE = (
+    "\n\nUSER PROFILE:\n{fields}\n\n"
+    "Tailor the answer to this profile: respect their equipment, dietary restrictions and meal "
+    "preferences, and always prioritize safety given any medical conditions."
+)
+
+NO_PROFILE_BLOCK = (
+    "\n\nNote: The user hasn't completed their profile yet. Encourage them to fill out their "
+    "profile for more personalized advice."
+)
+
+# Free-text fields are cut to this many characters when a prompt is over budget
+FIELD_CHAR_LIMIT = 200
+
+# Fields dropped (in this order) when a prompt is still over budget; health fields are never dropped
+OPTIONAL_FIELDS = ['Meal Preferences', 'Preferred Exercise', 'Body Fat', 'Target Weight', 'BMI']
+
+ProfileContext = namedtuple('ProfileContext', ['items', 'text', 'fingerprint', 'legacy_chars'])
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _profile_items(profile):
+    """(label, value) pairs for every profile field that has a value"""
+    age = profile.get_age()
+    bmi = profile.get_bmi()
+    items = [
+        ('Age', age),
+        ('Gender', profile.get_gender_display() if profile.gender else None),
+        ('Height', f"{profile.height} cm" if profile.height else None),
+        ('Weight', f"{profile.weight} kg" if profile.weight else None),
+        ('BMI', bmi),
+        ('Body Fat', f"{profile.body_fat_percentage}%" if profile.body_fat_percentage else None),
+        ('Goal', profile.get_fitness_goal_display() if profile.fitness_goal else None),
+        ('Activity', profile.get_activity_level_display() if profile.activity_level else None),
+        ('Target Weight', f"{profile.target_weight} kg" if profile.target_weight else None),
+        ('Medical Conditions', profile.medical_conditions),
+        ('Medications', profile.medications),
+        ('Allergies', profile.allergies),
+        ('Preferred Exercise', profile.preferred_exercise_types),
+        ('Equipment', profile.available_equipment),
+        ('Workout', f"{profile.workout_duration} min" if profile.workout_duration else None),
+        ('Frequency', f"{profile.workout_frequency} days/week" if profile.workout_frequency else None),
+        ('Dietary Restrictions', profile.dietary_restrictions),
+        ('Meal Preferences', profile.meal_preferences),
+    ]
+    return [(label, str(value).strip()) for label, value in items if value not in (None, '')]
+
+
+def _render_block(items):
+    return PROFILE_TEMPLATE.format(fields="\n".join(f"- {label}: {value}" for label, value in items))
+
+
+# The previous verbose prompt, kept only to report the before/after prompt size
+LEGACY_HEADER_TEMPLATE = """You are a professional fitness and nutrition AI assistant. The user is asking: "{question}"
+
+Please provide a comprehensive, personalized response based on their profile data. Be encouraging, specific, and actionable."""
+
+LEGACY_PROFILE_TEMPLATE = """
+USER PROFILE DATA:
+- Age: {}
+- Gender: {}
+- Height: {} cm
+- Weight: {} kg
+- BMI: {}
+- Body Fat: {}%
+- Fitness Goal: {}
+- Activity Level: {}
+- Target Weight: {} kg
+- Medical Conditions: {}
+- Medications: {}
+- Allergies: {}
+- Preferred Exercise Types: {}
+- Available Equipment: {}
+- Workout Duration: {} minutes per session
+- Workout Frequency: {} days per week
+- Dietary Restrictions: {}
+- Meal Preferences: {}
+
+Please tailor your response specifically to this user's profile, goals, and constraints. If they ask about exercises, consider their available equipment. If they ask about nutrition, consider their dietary restrictions and meal preferences. Always prioritize their safety and medical conditions.
+"""
+
+LEGACY_NO_PROFILE = "\n\nNote: The user hasn't completed their profile yet. Encourage them to fill out their profile for more personalized advice."
+
+
+def _legacy_block_chars(profile):
+    return len(LEGACY_PROFILE_TEMPLATE.format(
+        profile.get_age() or 'Not provided', profile.get_gender_display() if profile.gender else 'Not provided',
+        profile.height, profile.weight, profile.get_bmi() or 'Not calculated', profile.body_fat_percentage,
+        profile.get_fitness_goal_display() if profile.fitness_goal else 'Not specified',
+        profile.get_activity_level_display() if profile.activity_level else 'Not specified',
+        profile.target_weight, profile.medical_conditions or 'None reported',
+        profile.medications or 'None reported', profile.allergies or 'None reported',
+        profile.preferred_exercise_types or 'Not specified', profile.available_equipment or 'Not specified',
+        profile.workout_duration, profile.workout_frequency, profile.dietary_restrictions or 'None',
+        profile.meal_preferences or 'Not specified',
+    ))
+
+
+class ProfileContextCache:
+    """Bounded LRU of rendered profile blocks keyed by profile version"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, profile):
+        key = (profile.pk, profile.updated_at, date.today()) if profile.pk else None
+        if key is not None:
+            with self._lock:
+                context = self._entries.get(key)
+                if context is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return context
+        items = _profile_items(profile)
+        text = _render_block(items)
+        context = ProfileContext(
+            items, text, hashlib.sha1(text.encode()).hexdigest(), _legacy_block_chars(profile)
+        )
+        if key is not None:
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = context
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return context
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+profile_contexts = ProfileContextCache()
+
+
+class PromptStats:
+    """Running average prompt size, compared with what the old verbose builder would have sent"""
+
+    LEGACY_HEADER_CHARS = len(LEGACY_HEADER_TEMPLATE.format(question=""))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.prompts = 0
+        self.chars = 0
+        self.legacy_chars = 0
+        self.over_budget = 0
+
+    def record(self, question, prompt, legacy_block_chars, over_budget):
+        with self._lock:
+            self.prompts += 1
+            self.chars += len(prompt)
+            self.legacy_chars += self.LEGACY_HEADER_CHARS + len(question) + legacy_block_chars
+            self.over_budget += int(over_budget)
+
+    def stats(self):
+        with self._lock:
+            if not self.prompts:
+                return {'prompts': 0}
+            return {
+                'prompts': self.prompts,
+                'avg_tokens': round(self.chars / self.prompts / CHARS_PER_TOKEN, 1),
+                'avg_tokens_before': round(self.legacy_chars / self.prompts / CHARS_PER_TOKEN, 1),
+                'saved_ratio': round(1 - self.chars / self.legacy_chars, 4),
+                'trimmed_to_budget': self.over_budget,
+                'profile_block_hits': profile_contexts.hits,
+                'profile_block_misses': profile_contexts.misses,
+            }
+
+
+prompt_stats = PromptStats()
+
+
+def _fit_to_budget(question, items, budget):
+    """Shorten free text, then drop optional fields, then cut the question until under budget"""
+    items = [(label, value[:FIELD_CHAR_LIMIT]) for label, value in items]
+    prompt = PROMPT_TEMPLATE.format(question=question, profile=_render_block(items))
+    for label in OPTIONAL_FIELDS:
+        if estimate_tokens(prompt) <= budget:
+            return prompt
+        items = [item for item in items if item[0] != label]
+        prompt = PROMPT_TEMPLATE.format(question=question, profile=_render_block(items))
+    overflow = (estimate_tokens(prompt) - budget) * CHARS_PER_TOKEN
+    if overflow > 0:
+        question = question[:max(0, len(question) - overflow)]
+        prompt = PROMPT_TEMPLATE.format(question=question, profile=_render_block(items))
+    return prompt
+
+
+def profile_fingerprint(user_profile):
+    """Hash of the profile block, i.e. of everything the prompt reads from the profile"""
+    if user_profile is None:
+        return "no-profile"
+    return profile_contexts.get(user_profile).fingerprint
+
+
+def create_personalized_prompt(question, user_profile, budget=None):
+    """Create a personalized prompt based on user's fitness data"""
+    budget = budget or settings.PROMPT_MAX_INPUT_TOKENS
+    if user_profile is None:
+        context = None
+        prompt = PROMPT_TEMPLATE.format(question=question, profile=NO_PROFILE_BLOCK)
+    else:
+        context = profile_contexts.get(user_profile)
+        prompt = PROMPT_TEMPLATE.format(question=question, profile=context.text)
+
+    over_budget = estimate_tokens(prompt) > budget
+    if over_budget and context is not None:
+        prompt = _fit_to_budget(question, context.items, budget)
+    elif over_budget:
+        prompt = PROMPT_TEMPLATE.format(question=question[:budget * CHARS_PER_TOKEN // 2], profile=NO_PROFILE_BLOCK)
+
+    legacy_block_chars = context.legacy_chars if context else len(LEGACY_NO_PROFILE)
+    prompt_stats.record(question, prompt, legacy_block_chars, over_budget)
+    return prompt
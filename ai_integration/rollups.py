@@ -0,0 +1,146 @@
+"""Weekly and monthly rollups of DailyProgress for trend views.
+
+Trend reads never aggregate raw entries: they read ProgressRollup rows, one
+per user and calendar week (Monday to Sunday) or month, so a year of weekly
+trends is 52 rows however many entries back it. Saving or deleting an entry
+recomputes just the week and month it belongs to (and the ones it moved out
+of) with a single aggregate query over at most a month of entries; rows that
+bypass signals (seeding, raw inserts) are backfilled by
+``rebuild_progress_rollups``.
+"""
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import CustomUser, DailyProgress, ProgressRollup
+
+
+PERIODS = ('week', 'month')
+
+TRUNCATE = {'week': TruncWeek, 'month': TruncMonth}
+
+# Rollup field: (aggregate, DailyProgress field)
+AGGREGATES = {
+    'days_logged': (Count, 'id'),
+    'calories_consumed': (Sum, 'calories_consumed'),
+    'calories_burned': (Sum, 'calories_burned'),
+    'water_intake_glasses': (Sum, 'water_intake_glasses'),
+    'steps_taken': (Sum, 'steps_taken'),
+    'avg_weight': (Avg, 'weight'),
+    'min_weight': (Min, 'weight'),
+    'max_weight': (Max, 'weight'),
+    'avg_mood': (Avg, 'mood_rating'),
+}
+ROLLUP_FIELDS = tuple(AGGREGATES)
+
+# Totals that trends also report per logged day
+DAILY_AVERAGES = ('calories_consumed', 'calories_burned', 'water_intake_glasses', 'steps_taken')
+
+
+def period_bounds(period, day):
+    """First and last day of the week or month containing ``day``"""
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def _aggregates(suffix, **filter_kwargs):
+    # Aliases must not clash with DailyProgress field names
+    return {f"{name}_{suffix}": function(field, **filter_kwargs) for name, (function, field) in AGGREGATES.items()}
+
+
+def _rollup_values(values, suffix):
+    result = {name: values[f"{name}_{suffix}"] for name in ROLLUP_FIELDS}
+    # Round averages so rollups compare equal however they were computed
+    for name in ('avg_weight', 'avg_mood'):
+        if result[name] is not None:
+            result[name] = round(result[name], 2)
+    return result
+
+
+def _upsert(rollups):
+    ProgressRollup.objects.bulk_create(
+        rollups, update_conflicts=True, unique_fields=['user', 'period', 'start'],
+        update_fields=[*ROLLUP_FIELDS, 'updated_at'],
+    )
+
+
+def refresh_periods(user_id, days):
+    """Recompute the user's week and month rollups containing any of ``days``
+
+    Every affected period is aggregated by one query over the user's
+    ``(user, date)`` index; periods left without entries lose their rollup.
+    """
+    bounds = sorted({(period, *period_bounds(period, day)) for period in PERIODS for day in days if day})
+    if not bounds:
+        return
+    aggregates = {}
+    for i, (period, start, end) in enumerate(bounds):
+        aggregates.update(_aggregates(i, filter=Q(date__range=(start, end))))
+    values = DailyProgress.objects.filter(
+        user_id=user_id, date__range=(min(start for _, start, _ in bounds), max(end for _, _, end in bounds)),
+    ).aggregate(**aggregates)
+
+    fresh, emptied = [], []
+    for i, (period, start, end) in enumerate(bounds):
+        if values[f"days_logged_{i}"]:
+            fresh.append(ProgressRollup(user_id=user_id, period=period, start=start, **_rollup_values(values, i)))
+        else:
+            emptied.append(Q(period=period, start=start))
+    with transaction.atomic():
+        if fresh:
+            _upsert(fresh)
+        if emptied:
+            ProgressRollup.objects.filter(reduce(or_, emptied), user_id=user_id).delete()
+
+
+def rebuild_rollups(chunk_size=1000, batch_size=5000):
+    """Recompute every user's rollups from their entries, one transaction per chunk of users
+
+    Yields ``(users_done, rollups_written)`` after every chunk.
+    """
+    last_id = 0
+    users_done = rollups_written = 0
+    while True:
+        user_ids = list(CustomUser.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not user_ids:
+            return
+        first_id, last_id = user_ids[0], user_ids[-1]
+        entries = DailyProgress.objects.filter(user_id__gte=first_id, user_id__lte=last_id)
+        rollups = []
+        for period in PERIODS:
+            # One GROUP BY (user, period start) per period for the whole chunk
+            rows = entries.annotate(period_start=TRUNCATE[period]('date')).values(
+                'user_id', 'period_start'
+            ).annotate(**_aggregates('all')).order_by()
+            rollups += [
+                ProgressRollup(user_id=row['user_id'], period=period, start=row['period_start'],
+                               **_rollup_values(row, 'all'))
+                for row in rows
+            ]
+        with transaction.atomic():
+            ProgressRollup.objects.filter(user_id__gte=first_id, user_id__lte=last_id).delete()
+            ProgressRollup.objects.bulk_create(rollups, batch_size=batch_size)
+        users_done += len(user_ids)
+        rollups_written += len(rollups)
+        yield users_done, rollups_written
+
+
+def trends(user, period, limit, start=None, end=None):
+    """The user's latest ``limit`` rollups of ``period`` (newest first), optionally between two dates"""
+    rows = ProgressRollup.objects.filter(user=user, period=period)
+    if start:
+        rows = rows.filter(start__gte=period_bounds(period, start)[0])
+    if end:
+        rows = rows.filter(start__lte=end)
+    results = list(rows.order_by('-start').values('start', *ROLLUP_FIELDS)[:limit])
+    for row in results:
+        for name in DAILY_AVERAGES:
+            row[f"{name}_per_day"] = round(row[name] / row['days_logged'])
+    return results
@@ -0,0 +1,209 @@
+"""Bulk seeding of sample plans and synthetic users.
+
+Rows are written in batches that skip conflicting rows (``bulk_create`` with
+``ignore_conflicts`` for the sample plan, INSERT ... ON CONFLICT DO NOTHING via
+``executemany`` for the synthetic population), relying on the unique slot
+constraints of the schedule and progress tables. Seeding therefore costs a
+handful of round trips per batch and re-running it does not duplicate rows.
+"""
+import random
+from datetime import date, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from . import versions
+from .models import CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking
+
+
+SAMPLE_WORKOUTS = [
+    {'name': 'Morning Cardio', 'type': 'Cardio', 'time': time(7, 0), 'duration': 30},
+    {'name': 'Strength Training', 'type': 'Strength', 'time': time(18, 0), 'duration': 45},
+    {'name': 'Yoga Session', 'type': 'Flexibility', 'time': time(19, 30), 'duration': 30},
+    {'name': 'HIIT Workout', 'type': 'HIIT', 'time': time(7, 0), 'duration': 25},
+    {'name': 'Swimming', 'type': 'Cardio', 'time': time(17, 0), 'duration': 40},
+]
+
+SAMPLE_MEALS = [
+    {'name': 'Protein Oatmeal', 'type': 'breakfast', 'time': time(8, 0), 'calories': 350},
+    {'name': 'Greek Yogurt', 'type': 'snack1', 'time': time(10, 30), 'calories': 150},
+    {'name': 'Grilled Chicken Salad', 'type': 'lunch', 'time': time(13, 0), 'calories': 450},
+    {'name': 'Apple & Almonds', 'type': 'snack2', 'time': time(15, 30), 'calories': 200},
+    {'name': 'Salmon & Vegetables', 'type': 'dinner', 'time': time(19, 0), 'calories': 500},
+]
+
+
+def sample_workout(user_id, day, workout, is_completed=False):
+    return WorkoutSchedule(
+        user_id=user_id,
+        scheduled_date=day,
+        scheduled_time=workout['time'],
+        workout_name=workout['name'],
+        workout_type=workout['type'],
+        duration_minutes=workout['duration'],
+        is_completed=is_completed,
+    )
+
+
+def sample_meal(user_id, day, meal, is_consumed=False):
+    return MealPlan(
+        user_id=user_id,
+        scheduled_date=day,
+        scheduled_time=meal['time'],
+        meal_type=meal['type'],
+        meal_name=meal['name'],
+        calories=meal['calories'],
+        protein=meal['calories'] * 0.3 / 4,  # Rough protein calculation
+        carbs=meal['calories'] * 0.4 / 4,   # Rough carbs calculation
+        fats=meal['calories'] * 0.3 / 9,    # Rough fats calculation
+        is_consumed=is_consumed,
+    )
+
+
+def seed_sample_plan(user, start=None, days=7):
+    """Create a week of sample workouts and meals for one user in two queries"""
+    start = start or date.today()
+    workouts = []
+    meals = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        # Mark the first 2 days as done
+        workouts.append(sample_workout(user.pk, day, SAMPLE_WORKOUTS[i % len(SAMPLE_WORKOUTS)], i < 2))
+        meals.extend(sample_meal(user.pk, day, meal, i < 2) for meal in SAMPLE_MEALS)
+    WorkoutSchedule.objects.bulk_create(workouts, ignore_conflicts=True)
+    MealPlan.objects.bulk_create(meals, ignore_conflicts=True)
+    # bulk_create sends no post_save signals
+    versions.bump(user.pk, 'workouts', 'meals')
+
+
+def _synthetic_profile(rng, user_id):
+    return UserProfile(
+        user_id=user_id,
+        dob=date(rng.randint(1955, 2005), rng.randint(1, 12), rng.randint(1, 28)),
+        gender=rng.choice(['male', 'female', 'other']),
+        height=round(rng.gauss(172, 9), 1),
+        weight=round(rng.gauss(75, 14), 1),
+        fitness_goal=rng.choice([choice for choice, label in UserProfile.GOAL_CHOICES]),
+        activity_level=rng.choice([choice for choice, label in UserProfile.ACTIVITY_LEVEL_CHOICES]),
+        target_weight=round(rng.gauss(70, 10), 1),
+        workout_duration=rng.choice([20, 30, 45, 60]),
+        workout_frequency=rng.randint(2, 6),
+    )
+
+
+def _insert_ignore(cursor, model, field_names, rows, batch_size):
+    """executemany() an INSERT that skips rows violating a unique constraint; returns the rows inserted
+
+    Used for the bulk of the synthetic population: plain tuples avoid building a
+    model instance and compiling SQL per row, which is what limits bulk_create.
+    """
+    ops = connection.ops
+    fields = [model._meta.get_field(name) for name in field_names]
+    columns = ", ".join(ops.quote_name(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    suffix = ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    sql = (
+        f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(model._meta.db_table)} "
+        f"({columns}) VALUES ({placeholders}) {suffix}"
+    )
+    inserted = 0
+    for offset in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[offset:offset + batch_size])
+        # The total over all statements; skipped rows do not count
+        inserted += max(cursor.rowcount, 0)
+    return inserted
+
+
+def seed_population(count, days=90, chunk_size=500, end=None, password="loadtest-pass",
+                    phone_prefix="90", seed=0, batch_size=5000):
+    """Create ``count`` synthetic users with ``days`` of history each, one transaction per chunk
+
+    Users get zero-padded phone numbers (``phone_prefix`` + 8 digits) and all
+    share ``password``, which is hashed once. Users that already exist are
+    skipped. Yields ``(users_done, rows_written)`` after every committed chunk;
+    ``rows_written`` counts the rows actually inserted, not the ones skipped as
+    conflicts.
+    """
+    rng = random.Random(seed)
+    ops = connection.ops
+    password_hash = make_password(password)
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+    # Adapt the repeated date/time/timestamp values to the backend once, not per row
+    now = ops.adapt_datetimefield_value(timezone.now())
+    day_list = [(start + timedelta(days=i), ops.adapt_datefield_value(start + timedelta(days=i))) for i in range(days)]
+    workout_times = [ops.adapt_timefield_value(workout['time']) for workout in SAMPLE_WORKOUTS]
+    meal_rows = [
+        (ops.adapt_timefield_value(meal['time']), meal['type'], meal['name'], meal['calories'],
+         meal['calories'] * 0.3 / 4, meal['calories'] * 0.4 / 4, meal['calories'] * 0.3 / 9)
+        for meal in SAMPLE_MEALS
+    ]
+    goal_types = [choice for choice, label in GoalTracking.GOAL_TYPES]
+    rows_written = 0
+
+    for chunk_start in range(0, count, chunk_size):
+        numbers = [f"{phone_prefix}{i:08d}" for i in range(chunk_start, min(count, chunk_start + chunk_size))]
+        # Zero-padded numbers sort lexically, so a range lookup covers exactly this chunk
+        chunk_users = CustomUser.objects.filter(phone_number__range=(numbers[0], numbers[-1]))
+        with transaction.atomic():
+            existing = set(chunk_users.values_list('id', flat=True))
+            CustomUser.objects.bulk_create(
+                [CustomUser(phone_number=number, password=password_hash, first_name=f"Load{number[-5:]}")
+                 for number in numbers],
+                batch_size=batch_size, ignore_conflicts=True,
+            )
+            # Users from an earlier run keep their data; only new users are populated
+            user_ids = [user_id for user_id in chunk_users.values_list('id', flat=True) if user_id not in existing]
+            profiles = [_synthetic_profile(rng, user_id) for user_id in user_ids]
+            UserProfile.objects.bulk_create(profiles, batch_size=batch_size, ignore_conflicts=True)
+
+            workouts, meals, progress, goals = [], [], [], []
+            for profile in profiles:
+                user_id = profile.user_id
+                workout_chance = profile.workout_frequency / 7
+                for day, db_day in day_list:
+                    past = day < end
+                    if rng.random() < workout_chance:
+                        index = rng.randrange(len(SAMPLE_WORKOUTS))
+                        workout = SAMPLE_WORKOUTS[index]
+                        workouts.append((
+                            user_id, workout['name'], db_day, workout_times[index], workout['duration'],
+                            workout['type'], past and rng.random() < 0.7, '', now, now,
+                        ))
+                    for meal_time, meal_type, name, calories, protein, carbs, fats in meal_rows:
+                        meals.append((
+                            user_id, meal_type, db_day, meal_time, name, calories, protein, carbs, fats,
+                            past and rng.random() < 0.8, '', now, now,
+                        ))
+                    progress.append((
+                        user_id, db_day, round(profile.weight + rng.uniform(-1.5, 1.5), 1),
+                        rng.randint(1400, 3200), rng.randint(1700, 3200), rng.randint(2, 12),
+                        rng.randint(1500, 18000), rng.randint(3, 10), '', now, now,
+                    ))
+                goals.append((
+                    user_id, rng.choice(goal_types), "Synthetic goal", round(rng.uniform(5, 100), 1), 0.0,
+                    ops.adapt_datefield_value(end + timedelta(days=rng.randint(7, 180))), False, now, now,
+                ))
+
+            # New users and their profiles, then what the INSERTs really added
+            rows_written += 2 * len(user_ids)
+            with connection.cursor() as cursor:
+                rows_written += _insert_ignore(cursor, WorkoutSchedule, [
+                    'user', 'workout_name', 'scheduled_date', 'scheduled_time', 'duration_minutes',
+                    'workout_type', 'is_completed', 'notes', 'created_at', 'updated_at',
+                ], workouts, batch_size)
+                rows_written += _insert_ignore(cursor, MealPlan, [
+                    'user', 'meal_type', 'scheduled_date', 'scheduled_time', 'meal_name', 'calories',
+                    'protein', 'carbs', 'fats', 'is_consumed', 'notes', 'created_at', 'updated_at',
+                ], meals, batch_size)
+                rows_written += _insert_ignore(cursor, DailyProgress, [
+                    'user', 'date', 'weight', 'calories_consumed', 'calories_burned', 'water_intake_glasses',
+                    'steps_taken', 'mood_rating', 'notes', 'created_at', 'updated_at',
+                ], progress, batch_size)
+                rows_written += _insert_ignore(cursor, GoalTracking, [
+                    'user', 'goal_type', 'goal_title', 'target_value', 'current_value', 'target_date',
+                    'is_achieved', 'created_at', 'updated_at',
+                ], goals, batch_size)
+        yield chunk_start + len(numbers), rows_written
@@ -0,0 +1,326 @@
+"""Offline near-duplicate lookup of past chat answers.
+
+The answer cache only matches questions that normalize to the same text;
+most chat traffic is paraphrases ("best pre-workout meal" / "what to eat
+before training"). Every answered question is embedded with a hashed
+bag-of-terms vectorizer: words are lowercased, stop words dropped and common
+fitness synonyms mapped to one term, then the terms and their character
+trigrams are hashed into ``DIM`` signed buckets and the vector is
+L2-normalized. Vectors live in one NumPy matrix, so a lookup is a single
+matrix-vector product over the rows of the same profile bucket (goal,
+activity, gender, age and BMI band, plus the exact health fields) and the
+same numbers ("3 days a week" never matches "5 days a week"), and an answer
+is served when the best cosine similarity reaches ``SEMANTIC_MATCH_THRESHOLD``.
+
+The index holds at most ``SEMANTIC_INDEX_MAX_ENTRIES`` rows and evicts the
+least recently used one when full. With ``SEMANTIC_INDEX_PATH`` set it is
+loaded from disk on first use and written back (atomically) every
+``SEMANTIC_INDEX_SAVE_EVERY`` new answers and at exit, so restarted workers
+start warm. Workers sharing one file do not merge: the last writer wins. An
+unreadable file is logged and the index starts empty. Adding and the first
+``get_index()`` may touch the file, so async views call them through
+``sync_to_async``.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+import zlib
+from functools import cache
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+DIM = 1024
+
+FORMAT_VERSION = 1
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about am an and any are as at be best better can could do does for from get give good how i if in is it
+me much my of on or please should so some than that the there this to way what when which with would you
+your none
+""".split())
+
+# Fitness vocabulary folded onto one term each
+SYNONYMS = {
+    'training': 'workout', 'train': 'workout', 'exercise': 'workout', 'exercising': 'workout',
+    'gym': 'workout', 'session': 'workout', 'routine': 'workout',
+    'eat': 'meal', 'eating': 'meal', 'food': 'meal', 'foods': 'meal', 'dish': 'meal',
+    'before': 'pre', 'prior': 'pre', 'after': 'post',
+    'lose': 'loss', 'losing': 'loss', 'burn': 'loss', 'cut': 'loss',
+    'build': 'gain', 'bulk': 'gain', 'gaining': 'gain',
+    'muscles': 'muscle', 'sleep': 'rest', 'recovery': 'rest', 'recover': 'rest',
+    'run': 'cardio', 'running': 'cardio', 'jogging': 'cardio',
+}
+
+# Questions with fewer content terms ("and dinner?") depend on the conversation
+MIN_TERMS = 2
+
+TRIGRAM_WEIGHT = 0.3
+
+# A new answer this close to a stored one refreshes it instead of taking a row
+DUPLICATE_SIMILARITY = 0.98
+
+HEALTH_FIELDS = ('medical_conditions', 'medications', 'allergies', 'dietary_restrictions')
+
+
+def question_terms(text):
+    """Content terms of ``text`` with synonyms folded and plural 's' stripped"""
+    terms = []
+    for word in _TERM_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(SYNONYMS.get(word, word))
+    return terms
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode())
+
+
+def embed(text):
+    """Unit-length hashed term + trigram vector of ``text`` (all zeros without content terms)"""
+    vector = np.zeros(DIM, dtype=np.float32)
+    for term in set(question_terms(text)):
+        features = [(term, 1.0)]
+        padded = f"<{term}>"
+        features += [(padded[i:i + 3], TRIGRAM_WEIGHT) for i in range(len(padded) - 2)]
+        for feature, weight in features:
+            h = _hash(feature)
+            # The top bit picks the sign so colliding features tend to cancel out
+            vector[h % DIM] += -weight if h >> 31 else weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _band(value, edges):
+    return sum(value >= edge for edge in edges) if value is not None else ''
+
+
+def _normalized(text):
+    return " ".join(sorted(set(question_terms(text or ''))))
+
+
+def profile_bucket(user_profile):
+    """Class of profiles that may share answers; the health fields have to match exactly"""
+    if user_profile is None:
+        return _hash("no-profile")
+    age = user_profile.get_age()
+    parts = [
+        user_profile.fitness_goal or '', user_profile.activity_level or '', user_profile.gender or '',
+        age // 10 if age is not None else '', _band(user_profile.get_bmi(), (18.5, 25, 30)),
+        *(_normalized(getattr(user_profile, field)) for field in HEALTH_FIELDS),
+    ]
+    return _hash("|".join(str(part) for part in parts))
+
+
+def _scoped(bucket, terms):
+    """Narrow a profile bucket to questions mentioning the same numbers"""
+    numbers = sorted({term for term in terms if term.isdigit()})
+    return _hash(f"{bucket}|{' '.join(numbers)}") if numbers else bucket
+
+
+class SemanticIndex:
+    """Bounded matrix of embedded questions with per-bucket cosine top-k lookup and LRU eviction"""
+
+    def __init__(self, max_entries=5000, threshold=0.85, path='', save_every=50):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.path = path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.size = 0
+            self._allocate(0)
+            self.unsaved = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _allocate(self, capacity):
+        """(Re)allocate the arrays for ``capacity`` rows, keeping the current ones"""
+        size = getattr(self, 'size', 0)
+        vectors = np.zeros((capacity, DIM), dtype=np.float32)
+        buckets = np.zeros(capacity, dtype=np.int64)
+        last_used = np.zeros(capacity, dtype=np.float64)
+        if size:
+            vectors[:size] = self.vectors[:size]
+            buckets[:size] = self.buckets[:size]
+            last_used[:size] = self.last_used[:size]
+        else:
+            self.entries = []
+        self.vectors, self.buckets, self.last_used = vectors, buckets, last_used
+
+    def _scores(self, vector, bucket):
+        """Cosine similarity of every row to ``vector``; rows of other buckets score -1"""
+        scores = self.vectors[:self.size] @ vector
+        scores[self.buckets[:self.size] != bucket] = -1.0
+        return scores
+
+    def search(self, question, bucket, k=1):
+        """Up to ``k`` ``(similarity, question, answer)`` of the bucket, most similar first"""
+        vector = embed(question)
+        bucket = _scoped(bucket, question_terms(question))
+        with self._lock:
+            if not self.size or not vector.any():
+                return []
+            scores = self._scores(vector, bucket)
+            k = min(k, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[row]), *self.entries[row]) for row in top if scores[row] > -1.0]
+
+    def match(self, question, bucket):
+        """The stored answer of the most similar question, if similar enough"""
+        terms = question_terms(question)
+        if len(terms) < MIN_TERMS:
+            return None
+        vector = embed(question)
+        bucket = _scoped(bucket, terms)
+        with self._lock:
+            if self.size:
+                scores = self._scores(vector, bucket)
+                row = int(np.argmax(scores))
+                if scores[row] >= self.threshold:
+                    self.last_used[row] = time.time()
+                    self.hits += 1
+                    return self.entries[row][1]
+            self.misses += 1
+        return None
+
+    def add(self, question, bucket, answer):
+        """Store an answered question; near-identical questions of the bucket are replaced"""
+        terms = question_terms(question)
+        if len(terms) < MIN_TERMS:
+            return
+        vector = embed(question)
+        bucket = _scoped(bucket, terms)
+        with self._lock:
+            row = None
+            if self.size:
+                scores = self._scores(vector, bucket)
+                best = int(np.argmax(scores))
+                if scores[best] >= DUPLICATE_SIMILARITY:
+                    row = best
+            if row is None and self.size < self.max_entries:
+                if self.size == len(self.vectors):
+                    self._allocate(min(self.max_entries, max(64, 2 * self.size)))
+                row = self.size
+                self.size += 1
+                self.entries.append(None)
+            elif row is None:
+                row = int(np.argmin(self.last_used[:self.size]))
+                self.evictions += 1
+            self.vectors[row] = vector
+            self.buckets[row] = bucket
+            self.last_used[row] = time.time()
+            self.entries[row] = (question, answer)
+            self.unsaved += 1
+            save = bool(self.path) and self.unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def save(self, path=None):
+        """Write the index to ``path`` (default: the configured path) through a temporary file"""
+        path = path or self.path
+        if not path:
+            return False
+        with self._lock:
+            size = self.size
+            arrays = {
+                'vectors': self.vectors[:size].copy(),
+                'buckets': self.buckets[:size].copy(),
+                'last_used': self.last_used[:size].copy(),
+            }
+            meta = {'version': FORMAT_VERSION, 'dim': DIM, 'entries': self.entries[:size]}
+            self.unsaved = 0
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, path)
+        return True
+
+    def load(self, path=None):
+        """Replace the index with the one saved at ``path``; returns the number of rows loaded
+
+        A missing, outdated, truncated or corrupt file leaves the index as it was.
+        """
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with np.load(path) as data:
+                meta = json.loads(data['meta'].tobytes())
+                if meta.get('version') != FORMAT_VERSION or meta.get('dim') != DIM:
+                    return 0
+                # Keep the most recently used rows when the file is larger than this index
+                keep = np.argsort(-data['last_used'])[:self.max_entries]
+                vectors, buckets, last_used = data['vectors'][keep], data['buckets'][keep], data['last_used'][keep]
+                entries = [tuple(meta['entries'][row]) for row in keep]
+        except (OSError, EOFError, ValueError, KeyError, IndexError, TypeError, zipfile.BadZipFile) as e:
+            logger.warning("Ignoring unreadable semantic index %s: %s", path, e)
+            return 0
+        with self._lock:
+            self.size = 0
+            self._allocate(len(keep))
+            self.vectors[:] = vectors
+            self.buckets[:] = buckets
+            self.last_used[:] = last_used
+            self.entries = entries
+            self.size = len(keep)
+            self.unsaved = 0
+        return self.size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': self.size,
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'unsaved': self.unsaved,
+                'memory_bytes': self.vectors.nbytes + self.buckets.nbytes + self.last_used.nbytes,
+            }
+
+
+@cache
+def get_index():
+    """Process-wide index built from the SEMANTIC_* settings, loaded from disk on first use"""
+    index = SemanticIndex(
+        max_entries=settings.SEMANTIC_INDEX_MAX_ENTRIES,
+        threshold=settings.SEMANTIC_MATCH_THRESHOLD,
+        path=settings.SEMANTIC_INDEX_PATH,
+        save_every=settings.SEMANTIC_INDEX_SAVE_EVERY,
+    )
+    if index.path:
+        index.load()
+        atexit.register(index.save)
+    return index
+
+
+@receiver(setting_changed)
+def _reset_index(setting, **kwargs):
+    if setting.startswith("SEMANTIC_"):
+        get_index.cache_clear()
@@ -0,0 +1,85 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import goals, nutrition, rollups, sync, versions
+from .answer_cache import answer_cache
+from .context import invalidate_user_context
+from .models import CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking
+from .tokens import resolved_users
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_answers(sender, instance, **kwargs):
+    """Cached chat answers were personalized for the old profile"""
+    answer_cache.invalidate_user(instance.user_id)
+
+
+MODEL_RESOURCES = {
+    WorkoutSchedule: 'workouts',
+    MealPlan: 'meals',
+    DailyProgress: 'progress',
+    GoalTracking: 'goals',
+    UserProfile: 'profile',
+}
+
+
+@receiver([post_save, post_delete], sender=WorkoutSchedule)
+@receiver([post_save, post_delete], sender=MealPlan)
+@receiver([post_save, post_delete], sender=DailyProgress)
+@receiver([post_save, post_delete], sender=GoalTracking)
+@receiver([post_save, post_delete], sender=UserProfile)
+def bump_api_version(sender, instance, **kwargs):
+    """Conditional GETs of the JSON API must see every change to the user's data"""
+    versions.bump(instance.user_id, MODEL_RESOURCES[sender])
+
+
+def _deleting_user(origin):
+    """Whether a delete cascades from a user (``user.delete()`` or a queryset of users)"""
+    return isinstance(origin, CustomUser) or getattr(origin, 'model', None) is CustomUser
+
+
+@receiver(post_delete, sender=WorkoutSchedule)
+@receiver(post_delete, sender=MealPlan)
+@receiver(post_delete, sender=DailyProgress)
+@receiver(post_delete, sender=GoalTracking)
+def record_sync_tombstone(sender, instance, origin=None, **kwargs):
+    """Delta sync reports deleted rows from their tombstones"""
+    # Deleting the user deletes the tombstones too
+    if not _deleting_user(origin):
+        sync.record_deletion(instance)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def forget_resolved_user(sender, instance, **kwargs):
+    """Bearer requests in this process must see deactivation and edits right away"""
+    resolved_users.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def forget_resolved_profile(sender, instance, **kwargs):
+    resolved_users.invalidate(instance.user_id)
+    invalidate_user_context(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def update_nutrition_target(sender, instance, **kwargs):
+    """Keep the stored targets current; bulk-loaded profiles need recompute_nutrition_targets"""
+    nutrition.update_target(instance)
+
+
+@receiver([post_save, post_delete], sender=DailyProgress)
+def refresh_progress_rollups(sender, instance, origin=None, **kwargs):
+    """Keep the entry's week and month rollups current; raw inserts need rebuild_progress_rollups"""
+    # Deleting the user deletes the rollups too
+    if not _deleting_user(origin):
+        rollups.refresh_periods(instance.user_id, {instance.date, getattr(instance, '_loaded_date', None)})
+
+
+@receiver([post_save, post_delete], sender=DailyProgress)
+@receiver([post_save, post_delete], sender=WorkoutSchedule)
+def evaluate_affected_goals(sender, instance, origin=None, **kwargs):
+    """Re-evaluate the user's active goals that depend on the changed entry"""
+    if not _deleting_user(origin):
+        goal_types = goals.PROGRESS_GOAL_TYPES if sender is DailyProgress else goals.WORKOUT_GOAL_TYPES
+        goals.evaluate_user_goals(instance.user_id, goal_types)
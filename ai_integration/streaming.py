@@ -0,0 +1,51 @@
+"""Token-by-token streaming for the AI chat.
+
+The streaming endpoint is an async view, so under the ASGI application
+(``fitness_ai_web.asgi``) a single worker can keep many Gemini streams open
+at once instead of parking one sync worker per answer.
+"""
+import inspect
+import json
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+STREAM_ERROR_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_chat_events(chunks, on_complete=None):
+    """Yield SSE frames for each chunk of ``chunks``, then a final ``done`` or ``error`` frame
+
+    ``on_complete(answer, latency)`` (a function or coroutine function) is called
+    once a full answer was streamed.
+    """
+    parts = []
+    started = time.monotonic()
+    try:
+        async for text in chunks:
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        logger.exception("Chat stream failed")
+        yield sse_event("error", {"message": f"{STREAM_ERROR_MESSAGE} Error: {str(e)}"})
+        return
+    answer = "".join(parts)
+    if on_complete is not None:
+        result = on_complete(answer, time.monotonic() - started)
+        if inspect.isawaitable(result):
+            await result
+    yield sse_event("done", {"answer": answer})
+
+
+async def stream_cached_answer(answer):
+    """Replay a cached answer using the same frames as a live stream"""
+    yield sse_event("token", {"text": answer})
+    yield sse_event("done", {"answer": answer, "cached": True})
@@ -0,0 +1,138 @@
+"""Delta sync (change feed) for offline-capable mobile clients.
+
+A client keeps a local copy of its workouts, meals, progress and goals and
+pulls only what changed since its last sync. Every row carries ``updated_at``
+and every delete leaves a SyncTombstone, so one request returns the rows
+created or changed and the ids deleted since the client's cursor, for all four
+models at once. Each feed is read through its ``(user, updated_at, id)`` index
+in keyset order and rows are sent column-wise (field names once, then plain
+value lists) to keep payloads small.
+
+Rows are stamped when they are written, not when their transaction commits, so
+a caught-up cursor is set ``SYNC_OVERLAP_SECONDS`` in the past and rows changed
+in that window are sent again; clients apply rows as idempotent upserts.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .calendar_index import WORKOUT_FIELDS, MEAL_FIELDS
+from .dashboard import PROGRESS_FIELDS, GOAL_FIELDS
+from .models import WorkoutSchedule, MealPlan, DailyProgress, GoalTracking, SyncTombstone
+
+
+FEEDS = {
+    'workouts': (WorkoutSchedule, WORKOUT_FIELDS),
+    'meals': (MealPlan, MEAL_FIELDS),
+    'progress': (DailyProgress, PROGRESS_FIELDS),
+    'goals': (GoalTracking, GOAL_FIELDS),
+}
+MODEL_FEEDS = {model: name for name, (model, fields) in FEEDS.items()}
+
+# Cursor key of the tombstone feed
+DELETED = 'deleted'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(marks):
+    """Opaque cursor from ``{feed: (updated_at, id)}`` high-water marks"""
+    # isoformat() keeps microseconds, which the (updated_at, id) keyset needs
+    raw = json.dumps({name: [stamp.isoformat(), pk] for name, (stamp, pk) in marks.items()},
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        marks = {name: (datetime.fromisoformat(stamp), int(pk)) for name, (stamp, pk) in raw.items()}
+    except (ValueError, TypeError, AttributeError):
+        raise InvalidCursor("Invalid sync cursor")
+    if any(timezone.is_naive(stamp) for stamp, pk in marks.values()):
+        raise InvalidCursor("Invalid sync cursor")
+    return marks
+
+
+def _after(field, mark):
+    stamp, pk = mark
+    # The redundant >= bound lets the database seek into the index instead of scanning the user's range
+    return Q(**{f"{field}__gte": stamp}) & (Q(**{f"{field}__gt": stamp}) | Q(**{field: stamp, 'id__gt': pk}))
+
+
+def _read_feed(queryset, field, columns, mark, limit):
+    """Up to ``limit`` rows after ``mark`` as ``(stamp, id, ...)`` tuples; ``columns`` start with 'id'"""
+    if mark is not None:
+        queryset = queryset.filter(_after(field, mark))
+    return list(queryset.order_by(field, 'id').values_list(field, *columns)[:limit + 1])
+
+
+def changes_since(user, cursor=None, limit=None, now=None):
+    """Everything that changed for ``user`` since ``cursor`` (None for a first, full sync)
+
+    Returns ``{"cursor", "has_more", "reset", "changes", "deleted"}``. ``changes``
+    maps each feed with rows to ``{"fields": [...], "rows": [[...], ...]}`` and
+    ``deleted`` maps feeds to deleted ids. While ``has_more`` is true the client
+    should pull again right away with the new cursor. ``reset`` means the cursor
+    predates the tombstone retention window: the client must drop its local
+    copy, since this response is a full sync.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    now = now or timezone.now()
+    caught_up = (now - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS), 0)
+    marks = decode_cursor(cursor) if cursor else {}
+    reset = bool(marks) and marks.get(DELETED, caught_up)[0] < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    if reset:
+        marks = {}
+
+    response = {'cursor': None, 'has_more': False, 'reset': reset, 'changes': {}, 'deleted': {}}
+    next_marks = {}
+    for name, (model, fields) in FEEDS.items():
+        rows = _read_feed(model.objects.filter(user=user), 'updated_at', fields, marks.get(name), limit)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response['has_more'] = True
+            next_marks[name] = rows[-1][:2]
+        else:
+            next_marks[name] = caught_up
+        if rows:
+            response['changes'][name] = {'fields': list(fields), 'rows': [list(row[1:]) for row in rows]}
+
+    if marks:
+        tombstones = _read_feed(
+            SyncTombstone.objects.filter(user=user), 'deleted_at', ('id', 'resource', 'object_id'),
+            marks.get(DELETED), limit,
+        )
+        if len(tombstones) > limit:
+            tombstones = tombstones[:limit]
+            response['has_more'] = True
+            next_marks[DELETED] = tombstones[-1][:2]
+        else:
+            next_marks[DELETED] = caught_up
+        for stamp, pk, resource, object_id in tombstones:
+            response['deleted'].setdefault(resource, []).append(object_id)
+    else:
+        # A full sync has nothing to delete on the client
+        next_marks[DELETED] = caught_up
+
+    response['cursor'] = encode_cursor(next_marks)
+    return response
+
+
+def record_deletion(instance):
+    SyncTombstone.objects.create(
+        user_id=instance.user_id, resource=MODEL_FEEDS[type(instance)], object_id=instance.pk
+    )
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than the retention window; returns how many were removed"""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
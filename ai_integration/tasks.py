@@ -0,0 +1,54 @@
+"""Background tasks run by ``manage.py run_jobs`` (see jobs.py)"""
+from datetime import date
+
+from . import conversation, goals, nutrition, plans, rollups
+from .context import load_user_context
+from .jobs import task
+from .seeding import seed_sample_plan
+
+
+@task('seed_sample_plan')
+def seed_sample_plan_task(user):
+    """A week of sample workouts and meals; the completed ones count towards goals"""
+    seed_sample_plan(user)
+    return {'goals_changed': goals.evaluate_user_goals(user.pk)}
+
+
+@task('generate_weekly_plan')
+def generate_weekly_plan_task(user, start=None):
+    """A week of AI-generated workouts and meals, shared with users of the same constraints"""
+    profile = load_user_context(user).profile
+    return plans.generate_weekly_plan(user, profile, date.fromisoformat(start) if start else None)
+
+
+@task('summarize_chat')
+def summarize_chat_task(user):
+    """Fold the user's older chat messages into their rolling summary"""
+    return {'messages_summarized': conversation.refresh_summary(user.pk)}
+
+
+@task('evaluate_goals')
+def evaluate_goals_task(user=None):
+    """One user's active goals, or every active goal"""
+    if user is not None:
+        return {'goals_changed': goals.evaluate_user_goals(user.pk)}
+    goals_done = goals_changed = 0
+    for goals_done, goals_changed in goals.evaluate_goals():
+        pass
+    return {'goals': goals_done, 'goals_changed': goals_changed}
+
+
+@task('recompute_nutrition_targets')
+def recompute_nutrition_targets_task(user=None):
+    profiles_done = 0
+    for profiles_done, rows_written in nutrition.recompute_targets():
+        pass
+    return {'profiles': profiles_done}
+
+
+@task('rebuild_progress_rollups')
+def rebuild_progress_rollups_task(user=None):
+    users_done = rollups_written = 0
+    for users_done, rollups_written in rollups.rebuild_rollups():
+        pass
+    return {'users': users_done, 'rollups': rollups_written}
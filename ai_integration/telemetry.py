@@ -0,0 +1,188 @@
+"""LLM usage telemetry: who called the model, for what, how much and how fast.
+
+Every call through the LLM gateway, and every chat answer served from a
+cache instead, is recorded as an ``LLMCall`` row: user, purpose, cache
+status, outcome, estimated input/output tokens and latency. Rows are buffered
+per process and inserted with one ``bulk_create`` once
+``LLM_TELEMETRY_BATCH_SIZE`` are waiting or ``LLM_TELEMETRY_FLUSH_INTERVAL``
+seconds have passed, so recording adds no query to the request that made the
+call; the remainder is flushed at exit. From async code the insert runs on
+the sync thread instead of the event loop. Telemetry is best effort: a batch
+that fails to insert is logged and dropped.
+
+``daily_usage`` and ``user_usage`` aggregate the table for the admin (calls,
+tokens, cost at ``LLM_*_COST_PER_MTOK``, latency percentiles from a bucketed
+count), each in a single grouped query.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, ExpressionWrapper, FloatField, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LLMCall
+from .prompts import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency buckets the percentiles are read from
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class TelemetryBuffer:
+    """Pending LLMCall rows of this process, inserted in batches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = []
+        self._flushed_at = time.monotonic()
+        # Flushes scheduled from an event loop, kept referenced until they finish
+        self._tasks = set()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def record(self, row):
+        with self._lock:
+            self._rows.append(row)
+            self.recorded += 1
+            due = (len(self._rows) >= settings.LLM_TELEMETRY_BATCH_SIZE
+                   or time.monotonic() - self._flushed_at >= settings.LLM_TELEMETRY_FLUSH_INTERVAL)
+        if due:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        task = loop.create_task(sync_to_async(self.flush)())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def flush(self):
+        """Insert every pending row; returns the number written"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._flushed_at = time.monotonic()
+        if not rows:
+            return 0
+        try:
+            LLMCall.objects.bulk_create(rows, batch_size=500)
+        except DatabaseError as e:
+            # Never fail the LLM call that happened to trigger the flush
+            logger.warning("Dropped %s LLM telemetry rows: %s", len(rows), e)
+            with self._lock:
+                self.dropped += len(rows)
+            return 0
+        with self._lock:
+            self.written += len(rows)
+        return len(rows)
+
+    def clear(self):
+        """Discard pending rows and restart the flush interval"""
+        with self._lock:
+            self._rows = []
+            self._flushed_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._rows), 'recorded': self.recorded, 'written': self.written,
+                    'dropped': self.dropped}
+
+
+buffer = TelemetryBuffer()
+
+atexit.register(buffer.flush)
+
+
+def record(purpose, user_id=None, prompt='', answer='', seconds=0.0, outcome=LLMCall.OK, cache=LLMCall.MISS):
+    """Buffer one call; tokens are only counted for calls that reached the LLM"""
+    called = cache == LLMCall.MISS
+    buffer.record(LLMCall(
+        user_id=user_id,
+        purpose=purpose,
+        cache=cache,
+        outcome=outcome,
+        input_tokens=estimate_tokens(prompt) if called else 0,
+        output_tokens=estimate_tokens(answer or '') if called else 0,
+        latency_ms=round(seconds * 1000),
+        created_at=timezone.now(),
+    ))
+
+
+def cost(input_tokens, output_tokens):
+    """Estimated USD cost of the tokens"""
+    return (input_tokens * settings.LLM_INPUT_COST_PER_MTOK
+            + output_tokens * settings.LLM_OUTPUT_COST_PER_MTOK) / 1_000_000
+
+
+def _bucket_counts():
+    """Cumulative count of rows at or under each latency bucket, as aggregate expressions"""
+    return {f'le_{bound}': Count('id', filter=Q(latency_ms__lte=bound)) for bound in LATENCY_BUCKETS_MS}
+
+
+def _percentile(row, q):
+    """Upper bound of the latency bucket holding the ``q``-th percentile (None above the last bucket)"""
+    if not row['calls']:
+        return None
+    rank = row['calls'] * q / 100
+    return next((bound for bound in LATENCY_BUCKETS_MS if row[f'le_{bound}'] >= rank), None)
+
+
+def _summarize(row):
+    input_tokens, output_tokens = row.pop('total_input_tokens') or 0, row.pop('total_output_tokens') or 0
+    summary = {key: value for key, value in row.items() if not key.startswith('le_') and key != 'spend'}
+    summary.update(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cost=round(cost(input_tokens, output_tokens), 4),
+        p50_ms=_percentile(row, 50),
+        p95_ms=_percentile(row, 95),
+    )
+    return summary
+
+
+def _totals():
+    return {
+        'calls': Count('id'),
+        'llm_calls': Count('id', filter=Q(cache=LLMCall.MISS)),
+        'errors': Count('id', filter=~Q(outcome=LLMCall.OK)),
+        'total_input_tokens': Sum('input_tokens'),
+        'total_output_tokens': Sum('output_tokens'),
+        **_bucket_counts(),
+    }
+
+
+def daily_usage(days=14, now=None):
+    """Totals per day for the last ``days`` days, newest first"""
+    since = (now or timezone.now()) - timedelta(days=days)
+    rows = (LLMCall.objects.filter(created_at__gte=since).annotate(day=TruncDate('created_at'))
+            .values('day').annotate(**_totals()).order_by('-day'))
+    return [_summarize(row) for row in rows]
+
+
+def user_usage(days=30, limit=20, now=None):
+    """Heaviest users of the last ``days`` days by estimated cost"""
+    since = (now or timezone.now()) - timedelta(days=days)
+    spend = ExpressionWrapper(
+        Sum('input_tokens') * settings.LLM_INPUT_COST_PER_MTOK
+        + Sum('output_tokens') * settings.LLM_OUTPUT_COST_PER_MTOK,
+        output_field=FloatField(),
+    )
+    rows = (LLMCall.objects.filter(created_at__gte=since, user__isnull=False)
+            .values('user_id', 'user__phone_number').annotate(**_totals(), spend=spend).order_by('-spend')[:limit])
+    return [_summarize(row) for row in rows]
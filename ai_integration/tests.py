@@ -1,3 +1,1391 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .answer_cache import AnswerCache, answer_cache
+from .chat import answer_question, stored_answer
+from .coalescing import SingleFlight
+from datetime import date, datetime, time, timedelta
+
+from .calendar_index import CalendarIndex, bucket_by_date
+from .context import load_user_context
+from .dashboard import DashboardSnapshot
+from .seeding import seed_population, seed_sample_plan
+from .models import (
+    CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking, SyncTombstone, NutritionTarget,
+    ProgressRollup, Job, GeneratedPlan, ChatMessage, ChatSummary, LLMCall,
+)
+from .nutrition import batch_targets, encode_profiles, recompute_targets, targets
+from .goals import evaluate_goals, evaluate_user_goals
+from . import conversation, jobs, loadtest, metrics, plans, semantic, telemetry, tokens
+from .rollups import rebuild_rollups
+from .prompts import create_personalized_prompt, estimate_tokens, profile_contexts, prompt_stats
+from .llm import CircuitBreaker, LLMGateway, LLMOverloaded, LLMTimeout, LLMUnavailable, StubProvider, get_gateway
+from .streaming import stream_chat_events
+from .sync import changes_since
+from .tokens import resolved_users
+
+
+class TelemetryCleanupMixin:
+    """Drop buffered LLM telemetry after each test
+
+    Left in the buffer, the rows would be flushed by a later test without database
+    access or at exit, after the test database is gone.
+    """
+
+    def tearDown(self):
+        telemetry.buffer.clear()
+        super().tearDown()
+
+
+async def collect_stream(response):
+    return b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+
+async def collect_chunks(chunks):
+    return "".join([text async for text in chunks])
+
+
+@override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider")
+class ChatStreamTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        answer_cache.clear()
+        semantic.get_index().clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550001", password="secret-pass-1")
+        UserProfile.objects.create(user=self.user, height=180, weight=80, fitness_goal="muscle_gain")
+
+    async def test_streams_tokens_then_done(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse("chat_stream"), {"question": "What should I eat?"})
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = await collect_stream(response)
+        self.assertGreater(body.count("event: token"), 1)
+        self.assertIn("event: done", body)
+        self.assertIn(StubProvider.default_answer.split(" ")[0], body)
+        self.assertIn("Muscle Gain", get_gateway().provider.prompts[-1])
+        self.assertEqual(await ChatMessage.objects.filter(user=self.user).acount(), 2)
+
+    async def test_accepts_mobile_json_body(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse("api_chat_stream"), {"message": "Best warm up?"}, content_type="application/json"
+        )
+        body = await collect_stream(response)
+        self.assertIn("event: done", body)
+
+    async def test_expired_bearer_token_gets_json_401(self):
+        token = await sync_to_async(tokens.issue_access_token)(self.user)
+        with override_settings(ACCESS_TOKEN_TTL=-1):
+            response = await self.async_client.post(
+                reverse("api_chat_stream"), {"message": "Best warm up?"}, content_type="application/json",
+                headers={"Authorization": f"Bearer {token}"},
+            )
+        self.assertEqual(response.status_code, 401)
+        # Browser sessions are still sent to the login page
+        response = await self.async_client.post(reverse("chat_stream"), {"question": "Best warm up?"})
+        self.assertEqual(response.status_code, 302)
+
+    async def test_reports_error_frame_when_stream_breaks(self):
+        gateway = LLMGateway(StubProvider(fail_after=2))
+        with self.assertLogs("ai_integration.streaming", "ERROR"):
+            chunks = [frame async for frame in stream_chat_events(gateway.stream("prompt"))]
+        self.assertEqual(sum("event: token" in c for c in chunks), 2)
+        self.assertIn("event: error", chunks[-1])
+
+    def test_classic_chat_goes_through_gateway(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("chat"), {"question": "Best warm up?"})
+        self.assertContains(response, StubProvider.default_answer)
+        self.assertIn("Best warm up?", get_gateway().provider.prompts[-1])
+
+    async def test_requires_question(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse("chat_stream"), {})
+        self.assertEqual(response.status_code, 400)
+
+
+class AnswerCacheTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        answer_cache.clear()
+        answer_cache.reset_stats()
+        self.user = CustomUser.objects.create_user(phone_number="5550002", password="secret-pass-1")
+        self.profile = UserProfile.objects.create(user=self.user, height=170, weight=65, fitness_goal="weight_loss")
+
+    def test_key_ignores_case_whitespace_and_punctuation(self):
+        key = answer_cache.make_key("What should I eat before a workout?", self.profile)
+        self.assertEqual(key, answer_cache.make_key("  what should i eat   before a workout ", self.profile))
+
+    def test_key_changes_with_profile(self):
+        key = answer_cache.make_key("Best cardio?", self.profile)
+        self.profile.weight = 70
+        self.profile.save()
+        self.assertNotEqual(key, answer_cache.make_key("Best cardio?", self.profile))
+
+    def test_lru_eviction_and_ttl_expiry(self):
+        cache = AnswerCache(max_entries=2, ttl=60)
+        cache.set(("a", "fp"), "A")
+        cache.set(("b", "fp"), "B")
+        cache.get(("a", "fp"))
+        cache.set(("c", "fp"), "C")
+        self.assertIsNone(cache.get(("b", "fp")))
+        self.assertEqual(cache.get(("a", "fp")), "A")
+
+        cache.ttl = -1
+        cache.set(("d", "fp"), "D")
+        self.assertIsNone(cache.get(("d", "fp")))
+        self.assertEqual(cache.stats()["evictions"], 2)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_profile_save_invalidates_users_answers(self):
+        key = answer_cache.make_key("Best cardio?", self.profile)
+        answer_cache.set(key, "Run", latency=1.5, user_id=self.user.pk)
+        self.assertEqual(answer_cache.get(key), "Run")
+        self.assertEqual(answer_cache.stats()["saved_seconds"], 1.5)
+
+        self.profile.save()
+        self.assertIsNone(answer_cache.get(key))
+        self.assertEqual(answer_cache.stats()["hits"], 1)
+
+    def test_invalidation_keeps_other_users_answers(self):
+        other = CustomUser.objects.create_user(phone_number="5550026", password="secret-pass-1")
+        shared = answer_cache.make_key("Best cardio?", self.profile)
+        answer_cache.set(shared, "Run", user_id=other.pk)
+        mine = answer_cache.make_key("Best stretch?", self.profile)
+        answer_cache.set(mine, "Hamstrings", user_id=self.user.pk)
+
+        self.assertEqual(answer_cache.invalidate_user(self.user.pk), 1)
+        self.assertIsNone(answer_cache.get(mine))
+        # Same profile fields, so still a valid answer for the other user
+        self.assertEqual(answer_cache.get(shared), "Run")
+
+
+class LLMGatewayTests(TelemetryCleanupMixin, SimpleTestCase):
+    def test_retries_transient_failures(self):
+        provider = StubProvider(answer="ok", fail_times=2)
+        gateway = LLMGateway(provider, max_retries=2, backoff_base=0.001)
+        self.assertEqual(gateway.generate("hi"), "ok")
+        self.assertEqual(len(provider.prompts), 3)
+
+    def test_deadline_raises_timeout(self):
+        gateway = LLMGateway(StubProvider(latency=0.2), max_retries=0)
+        with self.assertRaises(LLMTimeout):
+            gateway.generate("hi", timeout=0.05)
+
+    def test_full_queue_rejects_fast(self):
+        gateway = LLMGateway(StubProvider(latency=0.3), max_concurrency=1, max_queue=0, max_retries=0)
+        gateway._acquire_slot(deadline=float("inf"))
+        try:
+            with self.assertRaises(LLMOverloaded):
+                gateway.generate("hi")
+        finally:
+            gateway._release_slot()
+        self.assertEqual(gateway.stats()["rejected"], 1)
+
+    def test_breaker_opens_then_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        provider = StubProvider(fail_times=5)
+        gateway = LLMGateway(provider, max_retries=0, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                gateway.generate("hi")
+        with self.assertRaises(LLMUnavailable):
+            gateway.generate("hi")
+        self.assertEqual(len(provider.prompts), 2)
+
+    def test_breaker_half_open_trial_closes_on_success(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        gateway = LLMGateway(StubProvider(answer="ok", fail_times=1), max_retries=0, breaker=breaker)
+        with self.assertRaises(RuntimeError):
+            gateway.generate("hi")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(gateway.generate("hi"), "ok")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_cancelled_half_open_stream_releases_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        provider = StubProvider(answer="one two three", latency=0.6, fail_times=1)
+        gateway = LLMGateway(provider, max_retries=0, breaker=breaker)
+        with self.assertRaises(RuntimeError):
+            await gateway.stream("hi").__anext__()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # The client disconnects while the half-open trial is still streaming
+        task = asyncio.create_task(collect_chunks(gateway.stream("hi")))
+        await asyncio.sleep(0.3)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(gateway.stats()["in_flight"], 0)
+
+        # The abandoned trial does not lock the breaker: the next call probes again
+        provider.latency = 0
+        self.assertEqual(await collect_chunks(gateway.stream("hi")), "one two three")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_gemini_sdk_is_imported_on_first_use(self):
+        script = (
+            "import sys, django; django.setup()\n"
+            "from ai_integration.llm import get_gateway, warm_up\n"
+            "get_gateway()\n"
+            "print('google.generativeai' in sys.modules)\n"
+            "warm_up()\n"
+            "print('google.generativeai' in sys.modules)\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "fitness_ai_web.settings",
+               "LLM_PROVIDER": "ai_integration.llm.GeminiProvider", "GEMINI_API_KEY": "test"}
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR, env=env, timeout=60, check=False)
+        self.assertEqual(result.stdout.split(), ["False", "True"], result.stderr)
+
+
+class SingleFlightTests(TelemetryCleanupMixin, SimpleTestCase):
+    def _run_concurrently(self, flight, fn, callers=8):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", fn))) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_identical_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            release.wait(1)
+            return "answer"
+
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        results = self._run_concurrently(flight, slow_call)
+        self.assertEqual(results, ["answer"] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()["coalescing_ratio"], 0.875)
+
+    def test_followers_receive_leader_error(self):
+        def failing_call():
+            raise RuntimeError("boom")
+
+        flight = SingleFlight()
+        with self.assertRaises(RuntimeError):
+            flight.do("k", failing_call)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_cross_worker_mode_reads_published_result(self):
+        flight = SingleFlight(shared_cache=cache, lock_timeout=1, poll_interval=0.01)
+        cache.set("singleflight:lock:k", 1, 5)
+        cache.set("singleflight:result:k", "from another worker", 5)
+        try:
+            self.assertEqual(flight.do("k", lambda: "local"), "from another worker")
+        finally:
+            cache.delete_many(["singleflight:lock:k", "singleflight:result:k"])
+        self.assertEqual(flight.stats()["remote_coalesced"], 1)
+
+
+class PromptBuilderTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        profile_contexts.clear()
+        prompt_stats.reset()
+        self.user = CustomUser.objects.create_user(phone_number="5550003", password="secret-pass-1")
+        self.profile = UserProfile.objects.create(
+            user=self.user, height=175, weight=72, fitness_goal="endurance", allergies="peanuts"
+        )
+
+    def test_drops_empty_fields(self):
+        prompt = create_personalized_prompt("How far should I run?", self.profile)
+        self.assertIn("- Allergies: peanuts", prompt)
+        self.assertIn("- Goal: Improve Endurance", prompt)
+        self.assertNotIn("Not provided", prompt)
+        self.assertNotIn("Medications", prompt)
+
+    def test_profile_block_rebuilt_only_when_profile_changes(self):
+        create_personalized_prompt("q1", self.profile)
+        create_personalized_prompt("q2", self.profile)
+        self.assertEqual((profile_contexts.hits, profile_contexts.misses), (1, 1))
+
+        self.profile.weight = 70
+        self.profile.save()
+        self.assertIn("Weight: 70 kg", create_personalized_prompt("q3", self.profile))
+        self.assertEqual(profile_contexts.misses, 2)
+
+    def test_enforces_token_budget_but_keeps_health_fields(self):
+        self.profile.meal_preferences = "small meals " * 200
+        self.profile.save()
+        prompt = create_personalized_prompt("Plan my week", self.profile, budget=150)
+        self.assertLessEqual(estimate_tokens(prompt), 150)
+        self.assertIn("peanuts", prompt)
+        self.assertNotIn("Meal Preferences", prompt)
+
+    def test_reports_size_before_and_after(self):
+        create_personalized_prompt("What should I eat?", self.profile)
+        stats = prompt_stats.stats()
+        self.assertLess(stats["avg_tokens"], stats["avg_tokens_before"])
+
+
+class DashboardSnapshotTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(phone_number="5550004", password="secret-pass-1")
+        UserProfile.objects.create(
+            user=self.user, height=180, weight=80, gender="male", activity_level="moderate", dob=date(1990, 1, 1)
+        )
+        self.today = date.today()
+        for offset in range(-6, 8):
+            day = self.today + timedelta(days=offset)
+            WorkoutSchedule.objects.create(
+                user=self.user, workout_name="Run", scheduled_date=day, scheduled_time=time(7, 0),
+                duration_minutes=30, workout_type="Cardio",
+            )
+            for hour in (8, 13, 19):
+                MealPlan.objects.create(
+                    user=self.user, meal_type="lunch", scheduled_date=day, scheduled_time=time(hour, 0),
+                    meal_name="Meal", calories=500,
+                )
+        DailyProgress.objects.create(user=self.user, date=self.today, steps_taken=4000)
+        GoalTracking.objects.create(
+            user=self.user, goal_type="endurance", goal_title="10k", target_value=10,
+            target_date=self.today + timedelta(days=30),
+        )
+
+    def test_loads_in_fixed_number_of_queries(self):
+        context = load_user_context(self.user)
+        with self.assertNumQueries(DashboardSnapshot.QUERY_COUNT):
+            snapshot = DashboardSnapshot(self.user, self.today, context=context).load()
+        self.assertEqual(snapshot["counts"]["today_workouts"], 1)
+        self.assertEqual(snapshot["counts"]["today_meals"], 3)
+        self.assertEqual(snapshot["counts"]["upcoming_workouts"], 8)
+        self.assertEqual(snapshot["counts"]["active_goals"], 1)
+        self.assertEqual(snapshot["today_progress"]["steps_taken"], 4000)
+        self.assertGreater(snapshot["daily_calories"], 2000)
+
+    def test_pages_render_from_snapshot(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse("dashboard")), "Normal")
+        self.assertContains(self.client.get(reverse("trainer")), "1 scheduled")
+
+
+class CalendarIndexTests(TelemetryCleanupMixin, TestCase):
+    def test_buckets_rows_by_day_sorted_by_time(self):
+        start = date(2025, 3, 3)
+        rows = [
+            {"scheduled_date": start, "scheduled_time": time(18, 0), "name": "late"},
+            {"scheduled_date": start, "scheduled_time": time(7, 0), "name": "early"},
+            {"scheduled_date": start + timedelta(days=2), "scheduled_time": time(9, 0), "name": "wed"},
+            {"scheduled_date": start + timedelta(days=9), "scheduled_time": time(9, 0), "name": "outside"},
+        ]
+        calendar = bucket_by_date(start, start + timedelta(days=6), workouts=rows)
+        self.assertEqual(len(calendar), 7)
+        self.assertEqual([row["name"] for row in calendar[0]["workouts"]], ["early", "late"])
+        self.assertEqual(calendar[1]["workouts"], [])
+        self.assertEqual(calendar[2]["workouts"][0]["name"], "wed")
+
+    def test_month_range_in_two_queries(self):
+        user = CustomUser.objects.create_user(phone_number="5550005", password="secret-pass-1")
+        WorkoutSchedule.objects.create(
+            user=user, workout_name="Swim", scheduled_date=date(2025, 2, 28), scheduled_time=time(7, 0),
+            duration_minutes=40, workout_type="Cardio",
+        )
+        with self.assertNumQueries(2):
+            calendar = CalendarIndex(user).month(date(2025, 2, 10))
+        self.assertEqual(len(calendar), 28)
+        self.assertEqual(calendar[-1]["workouts"][0]["workout_name"], "Swim")
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTests(TelemetryCleanupMixin, TestCase):
+    """The dashboard and trainer queries must be served by indexes, not table scans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create_user(phone_number=f"55510{i:02d}", password="secret-pass-1") for i in range(20)
+        ]
+        today = date.today()
+        workouts, meals, progress, goals = [], [], [], []
+        for user in cls.users:
+            UserProfile.objects.create(user=user, height=170, weight=70)
+            for offset in range(-30, 30):
+                day = today + timedelta(days=offset)
+                workouts.append(WorkoutSchedule(
+                    user=user, workout_name="Run", scheduled_date=day, scheduled_time=time(7, 0),
+                    duration_minutes=30, workout_type="Cardio",
+                ))
+                meals.extend(
+                    MealPlan(user=user, meal_type="lunch", scheduled_date=day, scheduled_time=time(hour, 0),
+                             meal_name="Meal", calories=400)
+                    for hour in (8, 13, 19)
+                )
+                progress.append(DailyProgress(user=user, date=day))
+            goals.append(GoalTracking(user=user, goal_type="endurance", goal_title="10k", target_value=10,
+                                      target_date=today + timedelta(days=30)))
+        WorkoutSchedule.objects.bulk_create(workouts)
+        MealPlan.objects.bulk_create(meals)
+        DailyProgress.objects.bulk_create(progress)
+        GoalTracking.objects.bulk_create(goals)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assert_indexed(self, captured):
+        with connection.cursor() as cursor:
+            for query in captured:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plan = [row[-1] for row in cursor.fetchall()]
+                for step in plan:
+                    self.assertFalse(
+                        step.startswith("SCAN ") or "TEMP B-TREE" in step,
+                        f"Query fell back to a scan or sort: {step}\n{query['sql']}",
+                    )
+
+    def test_dashboard_snapshot_queries_use_indexes(self):
+        with CaptureQueriesContext(connection) as captured:
+            DashboardSnapshot(self.users[3]).load()
+        self.assert_indexed(captured)
+
+    def test_trainer_calendar_queries_use_indexes(self):
+        with CaptureQueriesContext(connection) as captured:
+            CalendarIndex(self.users[5]).month(date.today())
+        self.assert_indexed(captured)
+
+    def test_sync_feeds_use_indexes(self):
+        cursor = changes_since(self.users[7])["cursor"]
+        with CaptureQueriesContext(connection) as captured:
+            changes_since(self.users[7], cursor)
+        self.assertEqual(len(captured), 5)
+        self.assert_indexed(captured)
+
+    def test_progress_is_unique_per_user_and_day(self):
+        other = CustomUser.objects.create_user(phone_number="5559999", password="secret-pass-1")
+        DailyProgress.objects.create(user=other, date=date.today())
+        with self.assertRaises(IntegrityError):
+            DailyProgress.objects.create(user=other, date=date.today())
+
+
+class SeedingTests(TelemetryCleanupMixin, TestCase):
+    def test_sample_plan_is_two_queries_and_idempotent(self):
+        user = CustomUser.objects.create_user(phone_number="5550006", password="secret-pass-1")
+        with self.assertNumQueries(2):
+            seed_sample_plan(user)
+        seed_sample_plan(user)
+        self.assertEqual(WorkoutSchedule.objects.filter(user=user).count(), 7)
+        self.assertEqual(MealPlan.objects.filter(user=user).count(), 35)
+
+    def test_population_is_rerunnable(self):
+        progress = list(seed_population(5, days=10, chunk_size=2))
+        self.assertEqual(progress[-1][0], 5)
+        self.assertEqual(progress[-1][1], sum(model.objects.count() for model in (
+            CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking)))
+        self.assertEqual(DailyProgress.objects.count(), 50)
+        self.assertEqual(UserProfile.objects.count(), 5)
+        self.assertTrue(self.client.login(username="9000000003", password="loadtest-pass"))
+
+        # Every row already exists, so nothing is reported as written
+        self.assertEqual(list(seed_population(5, days=10, chunk_size=2))[-1], (5, 0))
+        self.assertEqual(MealPlan.objects.count(), 250)
+        self.assertEqual(GoalTracking.objects.count(), 5)
+
+
+class JsonApiTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550007", password="secret-pass-1")
+        UserProfile.objects.create(user=self.user, height=180, weight=80)
+        seed_sample_plan(self.user, start=date(2025, 3, 3), days=14)
+        self.client.force_login(self.user)
+
+    def test_pages_with_cursor_and_sparse_fields(self):
+        url = reverse("api_meals")
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 20, "fields": "meal_name,calories"}
+            if cursor:
+                params["cursor"] = cursor
+            page = self.client.get(url, params).json()
+            self.assertEqual(set(page["results"][0]), {"meal_name", "calories"})
+            seen.extend(page["results"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 70)
+        self.assertEqual(self.client.get(url, {"fields": "password"}).status_code, 400)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_revalidation_is_answered_without_touching_the_tables(self):
+        url = reverse("api_workouts")
+        first = self.client.get(url, {"from": "2025-03-03", "to": "2025-03-09"})
+        self.assertEqual(len(first.json()["results"]), 7)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"from": "2025-03-03", "to": "2025-03-09"},
+                                       HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if "workoutschedule" in q["sql"]])
+
+        # Writes, including the single-UPDATE action, move the ETag
+        workout_id = first.json()["results"][3]["id"]
+        self.client.patch(reverse("api_workout_complete", args=[workout_id]))
+        response = self.client.get(url, {"from": "2025-03-03", "to": "2025-03-09"},
+                                   HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["results"][3]["is_completed"])
+
+    @override_settings(CACHE_SHARED=True)
+    def test_dashboard_validators_expire_at_midnight(self):
+        url = reverse("api_dashboard")
+        first = self.client.get(url)
+        revalidate = {"HTTP_IF_NONE_MATCH": first["ETag"], "HTTP_IF_MODIFIED_SINCE": first["Last-Modified"]}
+        self.assertEqual(self.client.get(url, **revalidate).status_code, 304)
+
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date.today() + timedelta(days=1)
+
+        # Today's lists change with the date, not with a write
+        with mock.patch("ai_integration.api.date", Tomorrow):
+            self.assertEqual(self.client.get(url, **revalidate).status_code, 200)
+            del revalidate["HTTP_IF_NONE_MATCH"]
+            self.assertEqual(self.client.get(url, **revalidate).status_code, 200)
+
+    def test_no_validators_without_a_shared_cache(self):
+        # Another worker's write would not move this process's stamps
+        url = reverse("api_workouts")
+        first = self.client.get(url)
+        self.assertNotIn("ETag", first)
+        self.assertNotIn("Last-Modified", first)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_update_and_progress_upsert(self):
+        response = self.client.post(reverse("api_goals"), {
+            "goal_type": "endurance", "goal_title": "10k", "target_value": 10, "target_date": "2025-06-01",
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        goal_url = reverse("api_goal", args=[response.json()["id"]])
+        self.client.put(goal_url, {"current_value": 4}, content_type="application/json")
+        self.assertEqual(self.client.get(goal_url).json()["current_value"], 4)
+
+        for steps in (1000, 5000):
+            self.client.post(reverse("api_progress"), {"date": "2025-03-04", "steps_taken": steps},
+                             content_type="application/json")
+        self.assertEqual(DailyProgress.objects.get(user=self.user).steps_taken, 5000)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("api_dashboard")).status_code, 401)
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class DeltaSyncTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550008", password="secret-pass-1")
+        seed_sample_plan(self.user, start=date(2025, 3, 3), days=7)
+        self.client.force_login(self.user)
+
+    def pull(self, cursor=None, **params):
+        return self.client.get(reverse("api_sync"), {**params, **({"cursor": cursor} if cursor else {})}).json()
+
+    def test_full_then_incremental_sync_with_tombstones(self):
+        first = self.pull()
+        self.assertEqual(len(first["changes"]["workouts"]["rows"]), 7)
+        self.assertEqual(len(first["changes"]["meals"]["rows"]), 35)
+        self.assertEqual(first["changes"]["meals"]["fields"][0], "id")
+        self.assertEqual(self.pull(first["cursor"])["changes"], {})
+
+        workout = WorkoutSchedule.objects.filter(user=self.user).first()
+        workout.notes = "Felt great"
+        workout.save()
+        meal = MealPlan.objects.filter(user=self.user).first()
+        meal_id = meal.pk
+        meal.delete()
+        delta = self.pull(first["cursor"])
+        self.assertEqual(list(delta["changes"]), ["workouts"])
+        self.assertEqual(delta["changes"]["workouts"]["rows"][0][0], workout.pk)
+        self.assertEqual(delta["deleted"], {"meals": [meal_id]})
+
+    def test_pages_until_caught_up(self):
+        cursor, meals, pages = None, 0, 0
+        while True:
+            page = self.pull(cursor, limit=10)
+            meals += len(page["changes"].get("meals", {}).get("rows", []))
+            cursor, pages = page["cursor"], pages + 1
+            if not page["has_more"]:
+                break
+        self.assertEqual((meals, pages), (35, 4))
+
+    def test_user_deletion_leaves_no_tombstones(self):
+        self.user.delete()
+        self.assertFalse(SyncTombstone.objects.exists())
+
+    def test_bulk_user_deletion_leaves_no_tombstones(self):
+        CustomUser.objects.filter(pk=self.user.pk).delete()
+        self.assertFalse(SyncTombstone.objects.exists())
+
+
+class TokenAuthTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        resolved_users.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550009", password="secret-pass-1")
+        UserProfile.objects.create(user=self.user, height=180, weight=80)
+        self.client = self.client_class(enforce_csrf_checks=True)
+
+    def login(self):
+        response = self.client.post(reverse("api_login"), {"username": "5550009", "password": "secret-pass-1"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_bearer_requests_skip_sessions_and_csrf(self):
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {self.login()['token']}"}
+        self.client.get(reverse("api_profile"), **auth)
+        # Token verification, user and profile all come from memory once resolved
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("api_profile"), **auth)
+        self.assertEqual(response.json()["height"], 180)
+        self.assertNotIn("sessionid", response.cookies)
+
+        response = self.client.post(reverse("api_goals"), {
+            "goal_type": "strength", "goal_title": "Bench 100", "target_value": 100, "target_date": "2025-09-01",
+        }, content_type="application/json", **auth)
+        self.assertEqual(response.status_code, 201)
+
+    def test_invalid_or_expired_token_does_not_fall_back_to_session(self):
+        token = self.login()["token"]
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("api_dashboard"), HTTP_AUTHORIZATION=f"Bearer {token}x")
+        self.assertEqual(response.status_code, 401)
+        with override_settings(ACCESS_TOKEN_TTL=-1):
+            response = self.client.get(reverse("api_dashboard"), HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_rotates_and_reuse_revokes_everything(self):
+        refresh = self.login()["refresh_token"]
+        url = reverse("api_token_refresh")
+        rotated = self.client.post(url, {"refresh_token": refresh}, content_type="application/json").json()
+        self.assertTrue(rotated["success"])
+        self.assertNotEqual(rotated["refresh_token"], refresh)
+
+        reused = self.client.post(url, {"refresh_token": refresh}, content_type="application/json")
+        self.assertEqual(reused.status_code, 401)
+        response = self.client.post(url, {"refresh_token": rotated["refresh_token"]}, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated_user_is_not_served_from_cache(self):
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {self.login()['token']}"}
+        self.assertEqual(self.client.get(reverse("api_profile"), **auth).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("api_profile"), **auth).status_code, 401)
+
+
+@override_settings(CACHE_SHARED=True)
+class UserContextTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550010", password="secret-pass-1")
+        self.profile = UserProfile.objects.create(
+            user=self.user, height=180, weight=80, gender="male", activity_level="moderate",
+            dob=date.today().replace(year=date.today().year - 30) - timedelta(days=1),
+        )
+
+    def test_derived_values_are_memoized(self):
+        context = load_user_context(self.user)
+        self.assertEqual(context.age, 30)
+        self.assertEqual(context.bmr, 10 * 80 + 6.25 * 180 - 5 * 30 + 5)
+        self.assertEqual(context.tdee, int(context.bmr * 1.55))
+        self.assertIs(context.summary, context.summary)
+        self.assertEqual(context.summary["bmi"], 24.69)
+
+    def test_profile_is_cached_across_requests_until_saved(self):
+        load_user_context(CustomUser.objects.get(pk=self.user.pk))
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(load_user_context(user).profile.weight, 80)
+        self.profile.weight = 78
+        self.profile.save()
+        self.assertEqual(load_user_context(CustomUser.objects.get(pk=self.user.pk)).profile.weight, 78)
+
+    def test_views_share_one_profile_load(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("profile"))
+        # Session and user lookups only: the profile comes from the cached context
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("profile"))
+        self.assertContains(response, "80")
+
+    @override_settings(CACHE_SHARED=False)
+    def test_profile_is_read_per_request_without_a_shared_cache(self):
+        load_user_context(CustomUser.objects.get(pk=self.user.pk))
+        # A save handled by another worker cannot clear this process's cache
+        UserProfile.objects.filter(pk=self.profile.pk).update(weight=78)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(load_user_context(user).profile.weight, 78)
+
+
+class NutritionTests(TelemetryCleanupMixin, TestCase):
+    def test_batch_matches_scalar_targets(self):
+        today = date(2026, 6, 15)
+        rows = [
+            (1, date(1990, 6, 15), "male", 180, 80, "moderate", "muscle_gain"),
+            (2, date(1990, 6, 16), "female", 165, 60, "sedentary", "weight_loss"),
+            (3, date(2000, 1, 1), "other", 170, 45, "", "endurance"),
+            (4, None, "male", 180, 80, "active", ""),
+            (5, date(1985, 3, 3), "female", None, 70, "light", "general_fitness"),
+        ]
+        encoded = encode_profiles(rows, today)
+        computed = batch_targets(**encoded)
+        self.assertEqual(list(encoded["age"][:3]), [36, 35, 26])
+        for i, (user_id, dob, gender, height, weight, activity_level, goal) in enumerate(rows):
+            age = int(encoded["age"][i]) if dob else None
+            expected = targets(weight, height, age, gender, activity_level, goal)
+            if expected is None:
+                self.assertNotEqual(computed["tdee"][i], computed["tdee"][i])
+            else:
+                self.assertEqual(expected, tuple(computed[name][i] for name in expected._fields))
+
+    def test_recompute_and_profile_save_store_targets(self):
+        list(seed_population(3, days=1))
+        NutritionTarget.objects.all().delete()
+        progress = list(recompute_targets(chunk_size=2))
+        self.assertEqual(progress[-1], (3, 1))
+        stored = NutritionTarget.objects.select_related("user__userprofile").get(user__phone_number="9000000001")
+        profile = stored.user.userprofile
+        self.assertEqual(stored.tdee, load_user_context(stored.user).tdee)
+
+        profile.weight += 10
+        profile.save()
+        stored.refresh_from_db()
+        self.assertEqual(stored.calories, targets(profile.weight, profile.height, profile.get_age(), profile.gender,
+                                                  profile.activity_level, profile.fitness_goal).calories)
+
+
+class ProgressRollupTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550011", password="secret-pass-1")
+
+    def rollup(self, period, start):
+        return ProgressRollup.objects.filter(user=self.user, period=period, start=start).first()
+
+    def test_saves_and_deletes_update_their_periods(self):
+        # Sunday 2025-03-30 and Monday 2025-03-31 are different weeks of the same month
+        sunday = DailyProgress.objects.create(user=self.user, date=date(2025, 3, 30), weight=80, steps_taken=5000,
+                                              calories_consumed=2000, mood_rating=6)
+        DailyProgress.objects.create(user=self.user, date=date(2025, 3, 31), weight=79, steps_taken=7000,
+                                     calories_consumed=2200, mood_rating=8)
+        month = self.rollup("month", date(2025, 3, 1))
+        self.assertEqual((month.days_logged, month.steps_taken, month.avg_weight, month.avg_mood), (2, 12000, 79.5, 7))
+        self.assertEqual(self.rollup("week", date(2025, 3, 24)).calories_consumed, 2000)
+
+        # Moving an entry refreshes the periods it left as well
+        sunday = DailyProgress.objects.get(pk=sunday.pk)
+        sunday.date = date(2025, 4, 1)
+        sunday.save()
+        self.assertIsNone(self.rollup("week", date(2025, 3, 24)))
+        self.assertEqual(self.rollup("week", date(2025, 3, 31)).days_logged, 2)
+        self.assertEqual(self.rollup("month", date(2025, 3, 1)).steps_taken, 7000)
+
+        sunday.delete()
+        self.assertIsNone(self.rollup("month", date(2025, 4, 1)))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        list(seed_population(2, days=45, end=date(2025, 5, 20)))
+        progress = list(rebuild_rollups(chunk_size=1))
+        self.assertEqual(progress[-1][0], CustomUser.objects.count())
+        rebuilt = {(r.user_id, r.period, r.start): r for r in ProgressRollup.objects.all()}
+        self.assertEqual(len(rebuilt), 2 * (8 + 2))
+
+        for entry in DailyProgress.objects.filter(date__in=[date(2025, 4, 6), date(2025, 5, 20)]):
+            entry.save()
+        fields = ["days_logged", "calories_consumed", "steps_taken", "avg_weight", "min_weight", "avg_mood"]
+        for rollup in ProgressRollup.objects.all():
+            expected = rebuilt[(rollup.user_id, rollup.period, rollup.start)]
+            self.assertEqual([getattr(rollup, f) for f in fields], [getattr(expected, f) for f in fields])
+
+    def test_trends_read_only_the_rollups(self):
+        for day in range(1, 29):
+            DailyProgress.objects.create(user=self.user, date=date(2025, 2, day), steps_taken=1000 * day)
+        self.client.force_login(self.user)
+        url = reverse("api_progress_trends")
+        # Session, user and the rollup page
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {"period": "week", "limit": 3})
+        weeks = response.json()["results"]
+        self.assertEqual([week["start"] for week in weeks], ["2025-02-24", "2025-02-17", "2025-02-10"])
+        self.assertEqual(weeks[0]["days_logged"], 5)
+        self.assertEqual(weeks[0]["steps_taken_per_day"], 26000)
+        month = self.client.get(url, {"period": "month", "from": "2025-02-14"}).json()["results"]
+        self.assertEqual(month[0]["steps_taken"], 1000 * 28 * 29 // 2)
+        self.assertEqual(self.client.get(url, {"period": "year"}).status_code, 400)
+
+
+class GoalEvaluationTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550012", password="secret-pass-1")
+        self.start = date(2025, 3, 1)
+        self.goals = {}
+        for goal_type, target in [("weight_loss", 3), ("muscle_gain", 1), ("endurance", 100), ("strength", 2),
+                                  ("flexibility", 5), ("nutrition", 2)]:
+            self.goals[goal_type] = GoalTracking.objects.create(
+                user=self.user, goal_type=goal_type, goal_title=goal_type, target_value=target,
+                target_date=date(2025, 3, 31),
+            )
+        # Goals count entries from the day they were set
+        GoalTracking.objects.update(created_at=timezone.make_aware(datetime(2025, 3, 1, 12)))
+
+    def goal(self, goal_type):
+        return GoalTracking.objects.get(pk=self.goals[goal_type].pk)
+
+    def test_entries_update_their_goals(self):
+        NutritionTarget.objects.create(user=self.user, calories=2000)
+        DailyProgress.objects.create(user=self.user, date=date(2025, 2, 28), weight=90)  # Before the goal
+        DailyProgress.objects.create(user=self.user, date=self.start, weight=84, calories_consumed=1950)
+        DailyProgress.objects.create(user=self.user, date=date(2025, 3, 8), weight=82.5, calories_consumed=2500)
+        self.assertEqual(self.goal("weight_loss").current_value, 1.5)
+        self.assertEqual(self.goal("nutrition").current_value, 1)
+
+        for day, workout_type, completed in [(2, "Cardio", True), (3, "HIIT", True), (4, "Strength", True),
+                                             (5, "Cardio", False), (6, "Strength", True)]:
+            WorkoutSchedule.objects.create(user=self.user, workout_name="Session", scheduled_date=date(2025, 3, day),
+                                           scheduled_time=time(7), duration_minutes=60, workout_type=workout_type,
+                                           is_completed=completed)
+        self.assertEqual(self.goal("endurance").current_value, 120)
+        strength = self.goal("strength")
+        self.assertEqual((strength.current_value, strength.is_achieved), (2, True))
+        self.assertEqual(self.goal("flexibility").current_value, 0)
+
+        DailyProgress.objects.create(user=self.user, date=date(2025, 3, 15), weight=80.9)
+        weight_loss = self.goal("weight_loss")
+        self.assertEqual((weight_loss.current_value, weight_loss.is_achieved), (3.1, True))
+        self.assertEqual(self.goal("muscle_gain").current_value, -3.1)
+
+    def test_full_pass_matches_incremental_updates(self):
+        DailyProgress.objects.bulk_create([
+            DailyProgress(user=self.user, date=self.start + timedelta(days=i), weight=85 - i * 0.5) for i in range(10)
+        ])
+        self.assertEqual(self.goal("weight_loss").current_value, 0)  # bulk_create sends no signals
+        progress = list(evaluate_goals(chunk_size=4))
+        self.assertEqual(progress[-1], (6, 2))
+        self.assertEqual(self.goal("weight_loss").current_value, 4.5)
+        self.assertTrue(self.goal("weight_loss").is_achieved)
+        # Nothing changed since: no goal is written again
+        self.assertEqual(evaluate_user_goals(self.user.pk), 0)
+
+
+class JobQueueTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(phone_number="5550013", password="secret-pass-1")
+        self.calls = []
+
+        @jobs.task("test_record")
+        def record(user, value, fail_times=0):
+            self.calls.append(value)
+            if self.calls.count(value) <= fail_times:
+                raise RuntimeError("flaky")
+            return {"value": value}
+
+        self.addCleanup(jobs.TASKS.pop, "test_record")
+
+    def test_runs_by_priority_and_retries_with_backoff(self):
+        low = jobs.enqueue("test_record", user=self.user, value="low")
+        high = jobs.enqueue("test_record", user=self.user, value="high", priority=5, fail_times=1)
+        with self.settings(JOB_RETRY_BACKOFF=0), self.assertLogs("ai_integration.jobs", "WARNING"):
+            self.assertEqual(jobs.work("test", burst=True), 3)
+        self.assertEqual(self.calls, ["high", "high", "low"])
+        high.refresh_from_db()
+        self.assertEqual((high.status, high.attempts, high.result), (Job.SUCCEEDED, 2, {"value": "high"}))
+
+        failing = jobs.enqueue("test_record", user=self.user, value="bad", fail_times=5, max_attempts=2)
+        with self.settings(JOB_RETRY_BACKOFF=0), self.assertLogs("ai_integration.jobs", "WARNING"):
+            jobs.work("test", burst=True)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.FAILED, 2))
+        self.assertIn("RuntimeError: flaky", failing.error)
+        low.refresh_from_db()
+        self.assertEqual(low.status, Job.SUCCEEDED)
+
+    def test_expired_lock_hands_the_job_to_another_worker(self):
+        job = jobs.enqueue("test_record", user=self.user, value="slow")
+        [claimed] = jobs.claim("worker-1")
+        self.assertEqual(jobs.claim("worker-2"), [])
+        later = timezone.now() + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT + 1)
+        self.assertEqual(jobs.requeue_expired(now=later), (1, 0))
+        [reclaimed] = jobs.claim("worker-2", now=later)
+        # The first worker finishing late records nothing
+        self.assertFalse(jobs.run_job(claimed, "worker-1"))
+        self.assertTrue(jobs.run_job(reclaimed, "worker-2"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.SUCCEEDED, 2, "worker-2"))
+
+    def test_sample_data_is_created_in_the_background(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("create_sample_data"))
+        self.assertRedirects(response, reverse("trainer"), fetch_redirect_response=False)
+        self.assertFalse(WorkoutSchedule.objects.filter(user=self.user).exists())
+        job = Job.objects.get(user=self.user)
+        status = self.client.get(reverse("api_job", args=[job.pk]))
+        self.assertEqual(status.json()["status"], Job.QUEUED)
+        self.assertIn("Retry-After", status)
+
+        jobs.work("test", burst=True)
+        self.assertEqual(WorkoutSchedule.objects.filter(user=self.user).count(), 7)
+        self.assertEqual(self.client.get(reverse("api_job", args=[job.pk])).json()["status"], Job.SUCCEEDED)
+        other = CustomUser.objects.create_user(phone_number="5550014", password="secret-pass-1")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse("api_job", args=[job.pk])).status_code, 404)
+
+
+PLAN_REPLY = """Here is your plan:
+```json
+{"workouts": [
+    {"day": 1, "name": "Full Body Circuit", "type": "Strength", "time": "6:30 PM", "duration_minutes": "40"},
+    {"day": 1, "name": "Second workout on day one", "type": "Cardio"},
+    {"day": 3, "name": "Dumbbell Intervals", "type": "HIIT", "time": "07:00"},
+    {"day": 9, "name": "Out of range"},
+    {"day": 5, "name": "Mobility Flow", "type": "Flexibility", "duration_minutes": 30},
+    {"day": 6, "name": "One too many", "type": "Cardio"},
+],
+"meals": [
+    {"day": 1, "meal_type": "Breakfast", "name": "Oats", "calories": 500, "protein": 20},
+    {"day": 1, "meal_type": "lunch", "name": "Lentil Bowl", "calories": 700, "time": "13:00"},
+    {"day": 1, "meal_type": "snack", "name": "Apple", "calories": 100},
+    {"day": 1, "meal_type": "dinner", "name": "Tofu Stir Fry", "calories": 700},
+    {"day": 2, "meal_type": "brunch", "name": "Unknown slot", "calories": 300},
+    {"day": 2, "meal_type": "dinner", "name": "No calories"},
+]}
+```"""
+
+
+@override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider")
+class PlanGenerationTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        # A fresh stub per test, so its prompt log starts empty
+        get_gateway.cache_clear()
+        get_gateway().provider.answer = PLAN_REPLY
+        self.constraints = {**plans.plan_constraints(None), "workouts_per_week": 3, "daily_calories": 2000}
+
+    def make_user(self, phone_number, **profile):
+        user = CustomUser.objects.create_user(phone_number=phone_number, password="secret-pass-1")
+        UserProfile.objects.create(user=user, height=170, weight=70, gender="female", workout_frequency=3,
+                                   dob=date(1990, 1, 1), activity_level="light", **profile)
+        return user
+
+    def test_reply_is_repaired_into_a_full_week(self):
+        plan = plans.repair_plan(plans.parse_plan(PLAN_REPLY), self.constraints)
+        self.assertEqual([(w["day"], w["time"], w["duration_minutes"]) for w in plan["workouts"]],
+                         [(1, "18:30", 40), (3, "07:00", 45), (5, "07:00", 30)])
+        meals = plan["meals"]
+        self.assertEqual(len(meals), 7 * 4)
+        day_one = [meal for meal in meals if meal["day"] == 1]
+        self.assertEqual([meal["meal_type"] for meal in day_one], ["breakfast", "snack1", "lunch", "dinner"])
+        # 2000 kcal target: the model's 2000 kcal day is kept as is
+        self.assertEqual(sum(meal["calories"] for meal in day_one), 2000)
+        self.assertEqual(day_one[0]["carbs"], 50.0)
+        plan = plans.repair_plan(plans.parse_plan(PLAN_REPLY), {**self.constraints, "daily_calories": 1500})
+        self.assertEqual(sum(meal["calories"] for meal in plan["meals"] if meal["day"] == 7), 1500)
+        with self.assertRaises(plans.InvalidPlan):
+            plans.repair_plan(plans.parse_plan('{"workouts": [], "meals": []}'), self.constraints)
+
+    def test_users_with_the_same_constraints_share_one_generation(self):
+        first = self.make_user("5550015", available_equipment="Dumbbells, yoga mat", allergies="none")
+        second = self.make_user("5550016", available_equipment="yoga mat and dumbbells.", allergies="")
+        provider = get_gateway().provider
+        self.assertEqual(plans.generate_weekly_plan(first, first.userprofile, date(2025, 6, 2)),
+                         {"reused": False, "workouts": 3, "meals": 28})
+        self.assertEqual(plans.generate_weekly_plan(second, second.userprofile, date(2025, 6, 2))["reused"], True)
+        self.assertEqual(len(provider.prompts), 1)
+        self.assertIn("dumbbells, yoga mat", provider.prompts[0])
+        self.assertEqual(GeneratedPlan.objects.get().times_used, 2)
+        self.assertEqual(MealPlan.objects.filter(user=second, scheduled_date=date(2025, 6, 8)).count(), 4)
+
+        third = self.make_user("5550017", available_equipment="Dumbbells", dietary_restrictions="vegetarian")
+        self.assertFalse(plans.generate_weekly_plan(third, third.userprofile)["reused"])
+        self.assertEqual(len(provider.prompts), 2)
+
+    def test_user_without_a_profile_gets_the_default_plan(self):
+        user = CustomUser.objects.create_user(phone_number="5550025", password="secret-pass-1")
+        job = jobs.enqueue("generate_weekly_plan", user=user, start="2025-06-02")
+        jobs.work("test", burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result["workouts"]), (Job.SUCCEEDED, plans.DEFAULT_WORKOUTS_PER_WEEK))
+        telemetry.buffer.flush()
+        self.assertEqual(LLMCall.objects.get().user_id, user.pk)
+
+    def test_api_queues_generation(self):
+        user = self.make_user("5550018")
+        self.client.force_login(user)
+        response = self.client.post(reverse("api_generate_plan"), {"start": "2025-06-02"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        jobs.work("test", burst=True)
+        job = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual((job["status"], job["result"]), ("succeeded", {"reused": False, "workouts": 3, "meals": 28}))
+        self.assertEqual(WorkoutSchedule.objects.filter(user=user, scheduled_date=date(2025, 6, 4)).count(), 1)
+
+
+@override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider", CHAT_CONTEXT_TURNS=2, CHAT_SUMMARY_EVERY=3)
+class ConversationTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        answer_cache.clear()
+        semantic.get_index().clear()
+        # Cached user contexts of earlier tests' users with the same ids
+        cache.clear()
+        get_gateway.cache_clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550019", password="secret-pass-1")
+        self.client.force_login(self.user)
+
+    def ask(self, question):
+        response = self.client.post(reverse("api_chat"), {"message": question}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return get_gateway().provider.prompts[-1]
+
+    def test_context_keeps_recent_turns_and_a_rolling_summary(self):
+        prompts = [self.ask(f"Question number {i}?") for i in range(1, 8)]
+        # Two turns verbatim, older ones are left to the summary
+        self.assertIn("User: Question number 6?", prompts[-1])
+        self.assertIn("User: Question number 5?", prompts[-1])
+        self.assertNotIn("Question number 4?", prompts[-1])
+        self.assertEqual(len(prompts[-1]), len(prompts[-2]))
+        # Due once three turns fell out of the window, and queued only once
+        self.assertEqual(Job.objects.filter(task="summarize_chat").count(), 1)
+
+        jobs.work("test", burst=True)
+        # Folded in batches of three turns, up to the verbatim window
+        summary = ChatSummary.objects.get(user=self.user)
+        self.assertEqual(summary.summarized_through, ChatMessage.objects.get(content="Question number 5?").pk + 1)
+        self.assertIn("Summary of older messages: " + StubProvider.default_answer, self.ask("Question number 8?"))
+        self.assertIn("Summary so far: ", get_gateway().provider.prompts[-2])
+        self.assertIn("User: Question number 4?", get_gateway().provider.prompts[-2])
+
+    def test_context_fits_the_token_budget(self):
+        long_question = "How should I train? " * 100
+        text = conversation.render_context("", [(ChatMessage.USER, long_question)] * 2 + [
+            (ChatMessage.ASSISTANT, "Short answer.")], budget=200)
+        self.assertLessEqual(estimate_tokens(text), 200)
+        self.assertIn("Assistant: Short answer.", text)
+        self.assertEqual(text.count("User: "), 1)
+
+    def test_paraphrase_of_an_answered_question_skips_the_llm(self):
+        self.ask("What should I eat before training?")
+        calls = len(get_gateway().provider.prompts)
+        other = CustomUser.objects.create_user(phone_number="5550020", password="secret-pass-1")
+        self.client.force_login(other)
+        response = self.client.post(reverse("api_chat"), {"message": "Best pre-workout meal"},
+                                    content_type="application/json")
+        self.assertEqual(response.json()["message"], StubProvider.default_answer)
+        self.assertEqual(len(get_gateway().provider.prompts), calls)
+        self.assertEqual(ChatMessage.objects.filter(user=other).count(), 2)
+
+    def test_follow_up_in_a_conversation_is_not_answered_from_the_index(self):
+        self.ask("What should I eat before training?")
+        other = CustomUser.objects.create_user(phone_number="5550021", password="secret-pass-1")
+        self.client.force_login(other)
+        self.ask("How much protein per day?")
+        calls = len(get_gateway().provider.prompts)
+        # Mid-conversation, the paraphrase may depend on the earlier turns
+        prompt = self.ask("Best pre-workout meal")
+        self.assertEqual(len(get_gateway().provider.prompts), calls + 1)
+        self.assertIn("User: How much protein per day?", prompt)
+
+    def test_history_pages_newest_first(self):
+        for i in range(1, 4):
+            self.ask(f"Question number {i}?")
+        url = reverse("api_chat_history")
+        page = self.client.get(url, {"limit": 4}).json()
+        self.assertEqual([row["role"] for row in page["results"]], ["assistant", "user"] * 2)
+        self.assertEqual(page["results"][1]["content"], "Question number 3?")
+        older = self.client.get(url, {"limit": 4, "cursor": page["next_cursor"]}).json()
+        self.assertEqual([row["content"] for row in older["results"]][1::2],
+                         ["Question number 1?"])
+        self.assertIsNone(older["next_cursor"])
+
+
+class SemanticIndexTests(TelemetryCleanupMixin, SimpleTestCase):
+    def setUp(self):
+        self.index = semantic.SemanticIndex(max_entries=3, threshold=0.85)
+        self.index.add("What should I eat before training?", 1, "Oats and a banana.")
+
+    def test_paraphrases_match_and_other_questions_do_not(self):
+        self.assertEqual(self.index.match("Best pre-workout meal", 1), "Oats and a banana.")
+        self.assertIsNone(self.index.match("Best post-workout meal", 1))
+        self.assertIsNone(self.index.match("Best pre-workout stretch", 1))
+        # Other profile bucket, too few terms to stand alone, different numbers
+        self.assertIsNone(self.index.match("Best pre-workout meal", 2))
+        self.assertIsNone(self.index.match("And before?", 1))
+        self.index.add("Workout plan for 3 days a week", 1, "Full body A/B/A.")
+        self.assertIsNone(self.index.match("Workout plan for 5 days a week", 1))
+        self.assertEqual(self.index.stats()["hits"], 1)
+
+    def test_bounded_with_least_recently_used_eviction(self):
+        self.index.add("How much protein per day?", 1, "1.6 g/kg.")
+        self.index.add("How do I improve my squat?", 1, "Pause squats.")
+        self.index.match("pre workout meal ideas", 1)
+        self.index.add("How long should I rest between sets?", 1, "Two minutes.")
+        self.assertEqual(self.index.stats()["size"], 3)
+        self.assertIsNone(self.index.match("protein per day", 1))
+        self.assertEqual(self.index.match("Pre-workout meal?", 1), "Oats and a banana.")
+        # A near-identical question refreshes its row instead of taking another
+        self.index.add("what to eat before training", 1, "Toast with honey.")
+        self.assertEqual(self.index.stats()["size"], 3)
+        self.assertEqual(self.index.search("pre workout meal", 1, k=2)[0][2], "Toast with honey.")
+
+    def test_saved_index_starts_warm(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            self.assertTrue(self.index.save(path))
+            warm = semantic.SemanticIndex(path=path)
+            self.assertEqual(warm.load(), 1)
+        self.assertEqual(warm.match("pre-workout meal", 1), "Oats and a banana.")
+
+    def test_unreadable_file_starts_empty(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            self.index.save(path)
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) // 2)
+            index = semantic.SemanticIndex(path=path)
+            with self.assertLogs("ai_integration.semantic", "WARNING"):
+                self.assertEqual(index.load(), 0)
+        self.assertEqual(index.stats()["size"], 0)
+
+
+class LoadTestTests(TelemetryCleanupMixin, SimpleTestCase):
+    def test_stub_answers_like_gemini(self):
+        stub = loadtest.GeminiStub(loadtest.LatencyModel("fixed", mean_ms=5), answer="Warm up first.").start()
+        self.addCleanup(stub.stop)
+        with override_settings(LLM_PROVIDER="ai_integration.llm.GeminiProvider", GEMINI_API_ENDPOINT=stub.url,
+                               GEMINI_API_KEY="test"):
+            self.assertEqual(get_gateway().generate("Best warm up?"), "Warm up first.")
+        self.assertEqual(stub.stats()["requests"], 1)
+
+    def test_report_percentiles_per_endpoint(self):
+        report = loadtest.LoadReport()
+        for ms in range(1, 101):
+            report.record("GET /dashboard/", ms / 1000, 200)
+        report.record("POST /chat/", 0.5, 503)
+        summary = report.summary(duration=10)
+        dashboard = summary["endpoints"]["GET /dashboard/"]
+        self.assertEqual((dashboard["p50_ms"], dashboard["p95_ms"], dashboard["p99_ms"]), (50.5, 95.0, 99.0))
+        self.assertEqual(dashboard["throughput_rps"], 10.0)
+        self.assertEqual((summary["overall"]["requests"], summary["overall"]["failures"]), (101, 1))
+
+
+@override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider")
+class MetricsTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        get_gateway.cache_clear()
+        answer_cache.clear()
+        semantic.get_index().clear()
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550021", password="secret-pass-1")
+        UserProfile.objects.create(user=self.user, height=175, weight=70)
+        self.client.force_login(self.user)
+
+    def series(self, name, view):
+        return metrics.registry.histograms[name, (view,)]
+
+    def test_records_queries_templates_and_llm_time_per_view(self):
+        self.client.get(reverse("dashboard"))
+        queries = self.series("http_request_db_queries", "dashboard")
+        self.assertEqual(sum(queries[:-1]), 1)
+        self.assertGreater(queries[-1], 0)
+        self.assertGreater(self.series("http_request_template_seconds", "dashboard")[-1], 0)
+        self.assertEqual(self.series("http_request_llm_calls", "dashboard")[-1], 0)
+
+        self.client.post(reverse("chat"), {"question": "How do I recover after leg day?"})
+        self.assertEqual(self.series("http_request_llm_calls", "chat")[-1], 1)
+        self.assertEqual(sum(metrics.registry.histograms["llm_call_duration_seconds", ("ok",)][:-1]), 1)
+        self.assertEqual(metrics.registry.counters["http_requests_total", ("chat", "POST", "200")], 1)
+
+    def test_text_format_is_cumulative(self):
+        metrics.registry.observe("http_request_duration_seconds", ("home",), 0.02)
+        metrics.registry.observe("http_request_duration_seconds", ("home",), 3)
+        text = metrics.render(*metrics.merge([metrics.registry.snapshot()]))
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn('http_request_duration_seconds_bucket{view="home",le="0.025"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="home",le="+Inf"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{view="home"} 2', text)
+        self.assertIn('http_request_duration_seconds_sum{view="home"} 3.02', text)
+
+    def test_sums_snapshots_of_other_workers(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.registry.inc("http_requests_total", ("home", "GET", "200"), 3)
+            metrics.flush(force=True)
+            (own,) = glob.glob(os.path.join(directory, f"metrics-{os.getpid()}-*.json"))
+            os.rename(own, os.path.join(directory, "metrics-1-1.json"))
+            text = metrics.collect()
+        self.assertIn('http_requests_total{view="home",method="GET",status="200"} 6', text)
+
+    def test_requests_flush_off_the_request_thread(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory,
+                                                                           METRICS_FLUSH_INTERVAL=0):
+            with mock.patch.object(metrics, "flush", wraps=metrics.flush) as flush:
+                self.client.get(reverse("dashboard"))
+                for thread in threading.enumerate():
+                    if thread.name == "metrics-flush":
+                        thread.join()
+            self.assertEqual(flush.call_count, 1)
+            self.assertEqual(len(glob.glob(os.path.join(directory, "metrics-*.json"))), 1)
+
+    def test_query_counts_from_several_threads_add_up(self):
+        current = metrics.RequestMetrics()
+        workers = [threading.Thread(target=lambda: [current.add_query(0.001) for _ in range(2000)])
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(current.queries, 8000)
+
+    def test_endpoint_requires_staff_or_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertContains(self.client.get(reverse("metrics")), "http_requests_total")
+        self.client.logout()
+        with override_settings(METRICS_TOKEN="scrape-secret"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4")
+
+
+@override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider", LLM_TELEMETRY_BATCH_SIZE=100,
+                   LLM_TELEMETRY_FLUSH_INTERVAL=3600, LLM_INPUT_COST_PER_MTOK=1.0, LLM_OUTPUT_COST_PER_MTOK=2.0)
+class TelemetryTests(TelemetryCleanupMixin, TestCase):
+    def setUp(self):
+        telemetry.buffer.clear()
+        get_gateway.cache_clear()
+        answer_cache.clear()
+        semantic.get_index().clear()
+        cache.clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550022", password="secret-pass-1")
+        self.profile = UserProfile.objects.create(user=self.user, height=175, weight=70)
+
+    def test_calls_are_buffered_then_written_in_one_batch(self):
+        gateway = LLMGateway(StubProvider(answer="x" * 40, fail_times=1), max_retries=0)
+        with self.assertRaises(RuntimeError):
+            gateway.generate("p", purpose=LLMCall.PLAN, user_id=self.user.pk)
+        gateway.generate("p" * 400, purpose=LLMCall.PLAN, user_id=self.user.pk)
+        self.assertFalse(LLMCall.objects.exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(telemetry.buffer.flush(), 2)
+        calls = list(LLMCall.objects.order_by('id').values_list(
+            'purpose', 'outcome', 'input_tokens', 'output_tokens'))
+        self.assertEqual(calls, [(LLMCall.PLAN, LLMCall.ERROR, 1, 0), (LLMCall.PLAN, LLMCall.OK, 100, 10)])
+
+    def test_chat_records_cache_status(self):
+        question = "What should I eat before a long run?"
+        with override_settings(LLM_TELEMETRY_BATCH_SIZE=3):
+            answer_question(question, self.profile, self.user)
+            # A paraphrase only matches the near-duplicate index
+            stored_answer("What to eat before a long run", self.profile, conversation.NO_CONTEXT, self.user.pk)
+            stored_answer(question, self.profile, conversation.NO_CONTEXT, self.user.pk)
+        self.assertEqual(len(telemetry.buffer), 0)
+        rows = list(LLMCall.objects.order_by('id').values_list('user_id', 'purpose', 'cache', 'input_tokens'))
+        self.assertEqual([row[:3] for row in rows], [
+            (self.user.pk, LLMCall.CHAT, LLMCall.MISS),
+            (self.user.pk, LLMCall.CHAT, LLMCall.SEMANTIC),
+            (self.user.pk, LLMCall.CHAT, LLMCall.EXACT),
+        ])
+        self.assertGreater(rows[0][3], 0)
+        self.assertEqual(rows[1][3], 0)
+
+    def test_daily_and_user_aggregates(self):
+        other = CustomUser.objects.create_user(phone_number="5550023", password="secret-pass-1")
+        for latency in (40, 80, 90, 3000):
+            LLMCall.objects.create(user=self.user, purpose=LLMCall.CHAT, input_tokens=1000, output_tokens=500,
+                                   latency_ms=latency)
+        LLMCall.objects.create(user=other, purpose=LLMCall.CHAT, cache=LLMCall.SEMANTIC, latency_ms=1)
+        LLMCall.objects.create(user=other, purpose=LLMCall.CHAT, outcome=LLMCall.TIMEOUT, input_tokens=100,
+                               latency_ms=30000)
+        with self.assertNumQueries(1):
+            (day,) = telemetry.daily_usage()
+        self.assertEqual((day["calls"], day["llm_calls"], day["errors"]), (6, 5, 1))
+        self.assertEqual((day["input_tokens"], day["output_tokens"]), (4100, 2000))
+        self.assertAlmostEqual(day["cost"], 0.0081)
+        self.assertEqual((day["p50_ms"], day["p95_ms"]), (100, 30000))
+        with self.assertNumQueries(1):
+            heaviest, lighter = telemetry.user_usage()
+        self.assertEqual(heaviest["user_id"], self.user.pk)
+        self.assertEqual((heaviest["cost"], heaviest["p50_ms"]), (0.008, 100))
+        self.assertEqual(lighter["user__phone_number"], "5550023")
+
+    def test_admin_shows_usage(self):
+        admin = CustomUser.objects.create_superuser(phone_number="5550024", password="secret-pass-1")
+        self.client.force_login(admin)
+        LLMCall.objects.create(user=self.user, purpose=LLMCall.SUMMARY, input_tokens=10, latency_ms=120)
+        response = self.client.get(reverse("admin:ai_integration_llmcall_changelist"))
+        self.assertContains(response, "Heaviest users")
+        self.assertContains(response, "5550022")
+
+
+@override_settings(LLM_PROVIDER="ai_integration.llm.StubProvider")
+class AsyncDashboardTests(TelemetryCleanupMixin, TransactionTestCase):
+    # Committed rows, so the query pool's own connections can read them
+
+    def setUp(self):
+        cache.clear()
+        get_gateway.cache_clear()
+        self.user = CustomUser.objects.create_user(phone_number="5550025", password="secret-pass-1")
+        UserProfile.objects.create(user=self.user, height=170, weight=65, fitness_goal="weight_loss")
+        self.today = date.today()
+        for offset in range(-2, 4):
+            day = self.today + timedelta(days=offset)
+            WorkoutSchedule.objects.create(user=self.user, workout_name="Swim", scheduled_date=day,
+                                           scheduled_time=time(6, 0), duration_minutes=45, workout_type="Cardio")
+            MealPlan.objects.create(user=self.user, meal_type="breakfast", scheduled_date=day,
+                                    scheduled_time=time(8, 0), meal_name="Oats", calories=400)
+        GoalTracking.objects.create(user=self.user, goal_type="endurance", goal_title="1k swim", target_value=1000,
+                                    target_date=self.today + timedelta(days=60))
+
+    async def test_concurrent_loads_match_sync_load(self):
+        user = await CustomUser.objects.aget(pk=self.user.pk)
+        expected = await sync_to_async(lambda: DashboardSnapshot(user, self.today).load())()
+        for parallel in (False, True):
+            with self.subTest(parallel=parallel):
+                snapshot = await DashboardSnapshot(user, self.today).aload(parallel=parallel)
+                self.assertEqual(snapshot, expected)
+                self.assertEqual(snapshot["counts"]["today_meals"], 1)
+
+    async def test_pool_queries_apply_connection_max_age(self):
+        user = await CustomUser.objects.aget(pk=self.user.pk)
+        with mock.patch("ai_integration.dashboard.close_old_connections") as close_old:
+            await DashboardSnapshot(user, self.today).aload(parallel=True)
+        # Before and after each of the four queries
+        self.assertEqual(close_old.call_count, 2 * DashboardSnapshot.QUERY_COUNT)
+
+    def test_trainer_page_fetches_tip_once_a_day(self):
+        self.client.force_login(self.user)
+        with override_settings(DASHBOARD_AI_TIP=True):
+            self.assertContains(self.client.get(reverse("trainer")), StubProvider.default_answer)
+            self.assertContains(self.client.get(reverse("trainer")), StubProvider.default_answer)
+        self.assertEqual(len(get_gateway().provider.prompts), 1)
+        self.assertIn("weight loss", get_gateway().provider.prompts[0].lower())
+        self.assertContains(self.client.get(reverse("trainer")), "HIIT")
@@ -0,0 +1,170 @@
+"""Bearer token authentication for the mobile API.
+
+Access tokens are short-lived signed payloads (``django.core.signing``), so
+verifying one costs an HMAC check and no database access. Refresh tokens are
+random strings stored only as SHA-256 hashes; each use rotates the token, and
+presenting an already rotated token revokes every refresh token of the user
+(it has been copied). Users resolved from access tokens are kept in a small
+per-process cache for ``AUTH_USER_CACHE_TTL`` seconds together with their
+profile, so an authenticated API request normally needs no query at all.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CustomUser, UserProfile, RefreshToken
+
+
+ACCESS_TOKEN_SALT = "ai_integration.tokens.access"
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def issue_access_token(user):
+    return signing.dumps({'uid': user.pk}, salt=ACCESS_TOKEN_SALT)
+
+
+def verify_access_token(token):
+    """User id of a valid, unexpired access token, else None"""
+    try:
+        return signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=settings.ACCESS_TOKEN_TTL)['uid']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def _hash(raw_token):
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+
+def issue_refresh_token(user):
+    raw_token = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user, token_hash=_hash(raw_token),
+        expires_at=timezone.now() + timedelta(days=settings.REFRESH_TOKEN_TTL_DAYS),
+    )
+    return raw_token
+
+
+def issue_tokens(user):
+    """Response body for a successful login or refresh"""
+    return {
+        'token': issue_access_token(user),
+        'refresh_token': issue_refresh_token(user),
+        'expires_in': settings.ACCESS_TOKEN_TTL,
+    }
+
+
+def rotate_refresh_token(raw_token):
+    """Revoke ``raw_token`` and return its user; raises InvalidToken"""
+    now = timezone.now()
+    with transaction.atomic():
+        token = RefreshToken.objects.select_for_update().select_related('user').filter(
+            token_hash=_hash(raw_token or '')
+        ).first()
+        if token is None or token.expires_at <= now or not token.user.is_active:
+            raise InvalidToken("Invalid or expired refresh token")
+        reused = token.revoked_at is not None
+        if not reused:
+            token.revoked_at = now
+            token.save(update_fields=['revoked_at'])
+    if reused:
+        # A rotated token was presented again: someone else holds a copy
+        revoke_all(token.user_id)
+        raise InvalidToken("Refresh token was already used")
+    return token.user
+
+
+def revoke_refresh_token(raw_token):
+    return RefreshToken.objects.filter(token_hash=_hash(raw_token or ''), revoked_at__isnull=True).update(
+        revoked_at=timezone.now()
+    )
+
+
+def revoke_all(user_id):
+    """Sign the user out of every device once their access tokens expire"""
+    return RefreshToken.objects.filter(user_id=user_id, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+class ResolvedUserCache:
+    """Per-process LRU of active users (with their profile) by id, each kept for ``ttl`` seconds
+
+    Field values are cached rather than instances, and every lookup builds
+    fresh model instances, so requests never share (and mutate) one object.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._user_fields = [field.attname for field in CustomUser._meta.concrete_fields]
+        self._profile_fields = [field.attname for field in UserProfile._meta.concrete_fields]
+        self._profile_rel = CustomUser._meta.get_field('userprofile')
+
+    def get(self, user_id):
+        """Cached user or None; never queries"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+        return self._build(entry[1], entry[2])
+
+    def load(self, user_id):
+        """Fetch an active user and their profile in one query and cache them; None if missing or inactive"""
+        user = CustomUser.objects.select_related('userprofile').filter(pk=user_id, is_active=True).first()
+        if user is None:
+            return None
+        try:
+            profile = user.userprofile
+        except UserProfile.DoesNotExist:
+            profile = None
+        user_values = tuple(getattr(user, name) for name in self._user_fields)
+        profile_values = tuple(getattr(profile, name) for name in self._profile_fields) if profile else None
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user_values, profile_values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return self._build(user_values, profile_values)
+
+    def resolve(self, user_id):
+        return self.get(user_id) or self.load(user_id)
+
+    def _build(self, user_values, profile_values):
+        user = CustomUser.from_db('default', self._user_fields, user_values)
+        profile = UserProfile.from_db('default', self._profile_fields, profile_values) if profile_values else None
+        # user.userprofile is answered from here (or raises DoesNotExist) without a query
+        self._profile_rel.set_cached_value(user, profile)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+resolved_users = ResolvedUserCache(
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_USER_CACHE_TTL,
+)
@@ -1,12 +1,17 @@
 from django.urls import path
 from .views import home, chat_view, login_view, register_view, profile_view, profile_dashboard, personal_trainer_view, create_sample_data
 from . import views
+from . import api
 
 
 urlpatterns = [
     path("", home, name="home"),             
     path("home/", home, name="home"),
     path("chat/", chat_view, name="chat"),    
+    path("chat/stream/", views.chat_stream_view, name="chat_stream"),
+    path("api/chat/stream/", views.chat_stream_view, name="api_chat_stream"),
+    path("chat/cache-stats/", views.chat_cache_stats, name="chat_cache_stats"),
+    path("metrics", views.metrics_view, name="metrics"),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -14,4 +19,29 @@ urlpatterns = [
     path('dashboard/', profile_dashboard, name='dashboard'),
     path('trainer/', personal_trainer_view, name='trainer'),
     path('create-sample-data/', create_sample_data, name='create_sample_data'),
+    path('generate-plan/', views.generate_plan_view, name='generate_plan'),
+
+    # JSON API for the mobile app
+    path('api/auth/login/', api.auth_login_view, name='api_login'),
+    path('api/auth/register/', api.auth_register_view, name='api_register'),
+    path('api/auth/refresh/', api.auth_refresh_view, name='api_token_refresh'),
+    path('api/auth/logout/', api.auth_logout_view, name='api_logout'),
+    path('api/user/dashboard/', api.dashboard_view, name='api_dashboard'),
+    path('api/user/profile/', api.profile_view, name='api_profile'),
+    path('api/chat/', api.chat_view, name='api_chat'),
+    path('api/chat/history/', api.chat_history_view, name='api_chat_history'),
+    path('api/sync/', api.sync_view, name='api_sync'),
+    path('api/jobs/<int:pk>/', api.job_view, name='api_job'),
+    path('api/plans/generate/', api.generate_plan_view, name='api_generate_plan'),
+    path('api/workouts/', api.collection_view, {'resource': 'workouts'}, name='api_workouts'),
+    path('api/workouts/<int:pk>/', api.detail_view, {'resource': 'workouts'}, name='api_workout'),
+    path('api/workouts/<int:pk>/complete/', api.mark_done_view, {'resource': 'workouts'}, name='api_workout_complete'),
+    path('api/meals/', api.collection_view, {'resource': 'meals'}, name='api_meals'),
+    path('api/meals/<int:pk>/', api.detail_view, {'resource': 'meals'}, name='api_meal'),
+    path('api/meals/<int:pk>/consume/', api.mark_done_view, {'resource': 'meals'}, name='api_meal_consume'),
+    path('api/progress/', api.collection_view, {'resource': 'progress'}, name='api_progress'),
+    path('api/progress/trends/', api.progress_trends_view, name='api_progress_trends'),
+    path('api/progress/<int:pk>/', api.detail_view, {'resource': 'progress'}, name='api_progress_entry'),
+    path('api/goals/', api.collection_view, {'resource': 'goals'}, name='api_goals'),
+    path('api/goals/<int:pk>/', api.detail_view, {'resource': 'goals'}, name='api_goal'),
 ]
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Per-user version stamps of API resources, kept in the Django cache.
+
+Every write to a user's workouts, meals, progress, goals or profile bumps the
+matching stamp (see signals.py), so conditional GETs can be answered from the
+cache alone: if the stamp behind the client's ETag has not moved, the API
+replies 304 without touching the ORM. That only holds when every worker sees
+the same stamps, so without a shared cache backend (``CACHE_SHARED``, set by
+``REDIS_URL``) the API does not answer from stamps at all.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+RESOURCES = ('workouts', 'meals', 'progress', 'goals', 'profile')
+
+# Stamps outlive any realistic client cache; a lost stamp only costs one full response
+VERSION_TTL = 30 * 24 * 3600
+
+
+def enabled():
+    """Whether stamps can be trusted: a per-process cache misses writes made by other workers"""
+    return settings.CACHE_SHARED
+
+
+def _key(user_id, resource):
+    return f"apiver:{user_id}:{resource}"
+
+
+def bump(user_id, *resources):
+    """Record that the user's ``resources`` changed now"""
+    stamp = time.time_ns()
+    cache.set_many({_key(user_id, resource): stamp for resource in resources}, VERSION_TTL)
+
+
+def current(user_id, *resources):
+    """Return the stamps of ``resources``, starting a version for any that are unknown"""
+    keys = {_key(user_id, resource): resource for resource in resources}
+    found = cache.get_many(keys)
+    missing = [keys[key] for key in keys if key not in found]
+    if missing:
+        bump(user_id, *missing)
+        found = cache.get_many(keys)
+    return [found.get(_key(user_id, resource), 0) for resource in resources]
+
+
+def last_modified(stamps):
+    return datetime.fromtimestamp(max(stamps) / 1e9, tz=dt_timezone.utc)
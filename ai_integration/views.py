@@ -1,21 +1,35 @@
-from django.http import JsonResponse
+import asyncio
+import json
+import hmac
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-import google.generativeai as genai
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_POST
 from django.utils import timezone
-from .models import CustomUser, UserProfile, WorkoutSchedule, MealPlan, DailyProgress, GoalTracking
+from .models import CustomUser, LLMCall
 from .forms import RegisterForm, LoginForm, UserProfileForm
+from .streaming import stream_chat_events, stream_cached_answer
+from .llm import get_gateway
+from .coalescing import prompt_flight
+from .chat import answer_question, stored_answer, store_answer
+from . import conversation, metrics, semantic
+from .prompts import create_personalized_prompt, prompt_stats
+from .context import aget_user_context
+from .dashboard import DashboardSnapshot, adaily_tip
+from .jobs import enqueue
+from .answer_cache import answer_cache
+from .middleware import bearer_token
 
 
 
-# Configure Gemini once
-genai.configure(api_key=settings.GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
-
 def home(request):
     return render(request, "ai_integration/home.html")
 
@@ -24,24 +38,14 @@ def home(request):
 def chat_view(request):
     answer = None
     question = None
-    user_profile = None
     
     # Get user profile data for personalized responses
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-    except UserProfile.DoesNotExist:
-        user_profile = None
+    user_profile = request.user_context.profile
     
     if request.method == "POST":
         question = request.POST.get("question")
         if question:
-            # Create personalized prompt with user data
-            personalized_prompt = create_personalized_prompt(question, user_profile)
-            try:
-                response = model.generate_content(personalized_prompt)
-                answer = response.text
-            except Exception as e:
-                answer = f"I apologize, but I'm having trouble processing your request right now. Please try again later. Error: {str(e)}"
+            answer, _ = answer_question(question, user_profile, request.user)
     
     return render(request, "ai_integration/chat.html", {
         "answer": answer,
@@ -49,39 +53,87 @@ def chat_view(request):
         "user_profile": user_profile
     })
 
-def create_personalized_prompt(question, user_profile):
-    """Create a personalized prompt based on user's fitness data"""
-    base_prompt = f"""You are a professional fitness and nutrition AI assistant. The user is asking: "{question}"
-
-Please provide a comprehensive, personalized response based on their profile data. Be encouraging, specific, and actionable."""
-
-    if user_profile:
-        profile_data = f"""
-USER PROFILE DATA:
-- Age: {user_profile.get_age() if user_profile.get_age() else 'Not provided'}
-- Gender: {user_profile.get_gender_display() if user_profile.gender else 'Not provided'}
-- Height: {user_profile.height} cm
-- Weight: {user_profile.weight} kg
-- BMI: {user_profile.get_bmi() if user_profile.get_bmi() else 'Not calculated'}
-- Body Fat: {user_profile.body_fat_percentage}%
-- Fitness Goal: {user_profile.get_fitness_goal_display() if user_profile.fitness_goal else 'Not specified'}
-- Activity Level: {user_profile.get_activity_level_display() if user_profile.activity_level else 'Not specified'}
-- Target Weight: {user_profile.target_weight} kg
-- Medical Conditions: {user_profile.medical_conditions or 'None reported'}
-- Medications: {user_profile.medications or 'None reported'}
-- Allergies: {user_profile.allergies or 'None reported'}
-- Preferred Exercise Types: {user_profile.preferred_exercise_types or 'Not specified'}
-- Available Equipment: {user_profile.available_equipment or 'Not specified'}
-- Workout Duration: {user_profile.workout_duration} minutes per session
-- Workout Frequency: {user_profile.workout_frequency} days per week
-- Dietary Restrictions: {user_profile.dietary_restrictions or 'None'}
-- Meal Preferences: {user_profile.meal_preferences or 'Not specified'}
+def stream_login_required(view):
+    """``login_required`` for the async stream view, answering API and bearer requests with a JSON 401
+
+    The mobile client cannot follow a redirect to the login page; a 401 tells
+    it to refresh its access token and retry.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            if bearer_token(request) is not None or request.path.startswith('/api/'):
+                return JsonResponse({"error": "Authentication required"}, status=401)
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@stream_login_required
+async def chat_stream_view(request):
+    """Stream the AI answer as Server-Sent Events while Gemini generates it"""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    # Browser form posts send "question", the mobile client sends JSON {"message": ...}
+    if request.content_type == "application/json":
+        try:
+            question = json.loads(request.body or b"{}").get("message")
+        except ValueError:
+            question = None
+    else:
+        question = request.POST.get("question")
+    if not question:
+        return JsonResponse({"error": "A question is required"}, status=400)
+
+    user = await request.auser()
+    user_profile = (await aget_user_context(request)).profile
+    context = await sync_to_async(conversation.load_context)(user.pk)
+
+    # The first lookup may load the semantic index from disk
+    cache_key, cached_answer = await sync_to_async(stored_answer)(question, user_profile, context, user.pk)
+    if cached_answer is not None:
+        await sync_to_async(conversation.record_turn)(user, question, cached_answer, context)
+        events = stream_cached_answer(cached_answer)
+    else:
+        personalized_prompt = create_personalized_prompt(question, user_profile) + context.text
+
+        async def on_complete(answer, latency):
+            # Every SEMANTIC_INDEX_SAVE_EVERY answers this writes the index file
+            await sync_to_async(store_answer)(cache_key, question, user_profile, context, answer, latency, user.pk)
+            await sync_to_async(conversation.record_turn)(user, question, answer, context)
+
+        chunks = get_gateway().stream(personalized_prompt, purpose=LLMCall.CHAT, user_id=user.pk)
+        events = stream_chat_events(chunks, on_complete=on_complete)
+
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@staff_member_required
+def chat_cache_stats(request):
+    """Hit/miss counters of the answer cache and semantic index, LLM gateway load and prompt coalescing for this worker"""
+    return JsonResponse({
+        **answer_cache.stats(),
+        "semantic": semantic.get_index().stats(),
+        "gateway": get_gateway().stats(),
+        "coalescing": prompt_flight.stats(),
+        "prompts": prompt_stats.stats(),
+    })
 
-Please tailor your response specifically to this user's profile, goals, and constraints. If they ask about exercises, consider their available equipment. If they ask about nutrition, consider their dietary restrictions and meal preferences. Always prioritize their safety and medical conditions.
-"""
-        return base_prompt + profile_data
+def metrics_view(request):
+    """Request, SQL, LLM and template metrics of every worker in the Prometheus text format"""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        allowed = hmac.compare_digest(request.headers.get("Authorization", ""), expected)
     else:
-        return base_prompt + "\n\nNote: The user hasn't completed their profile yet. Encourage them to fill out their profile for more personalized advice."
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse(metrics.collect(), content_type="text/plain; version=0.0.4")
+
 # login and register view 
 
 def register_view(request):
@@ -127,10 +179,7 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     """View and edit user profile"""
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-    except UserProfile.DoesNotExist:
-        profile = None
+    profile = request.user_context.profile
     
     if request.method == 'POST':
         if profile:
@@ -155,194 +204,44 @@ def profile_view(request):
         'profile': profile
     })
 
+async def _snapshot_page(request, template_name, tip=False):
+    """Render a DashboardSnapshot page; with ``tip`` the LLM tip of the day is fetched alongside the queries"""
+    user = await request.auser()
+    context = await aget_user_context(request)
+    snapshot = DashboardSnapshot(user, context=context).aload()
+    if tip and settings.DASHBOARD_AI_TIP:
+        snapshot, ai_tip = await asyncio.gather(snapshot, adaily_tip(context))
+    else:
+        snapshot, ai_tip = await snapshot, None
+    snapshot['ai_tip'] = ai_tip
+    # Templates read the session (messages, request.user), which is sync-only
+    return await sync_to_async(render)(request, template_name, snapshot)
+
 @login_required
-def profile_dashboard(request):
+async def profile_dashboard(request):
     """Personal Trainer Dashboard with daily reminders and progress"""
-    from datetime import date, timedelta
-    
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-    except UserProfile.DoesNotExist:
-        profile = None
-    
-    today = date.today()
-    
-    # Get today's workouts
-    today_workouts = WorkoutSchedule.objects.filter(
-        user=request.user, 
-        scheduled_date=today
-    ).order_by('scheduled_time')
-    
-    # Get today's meals
-    today_meals = MealPlan.objects.filter(
-        user=request.user, 
-        scheduled_date=today
-    ).order_by('scheduled_time')
-    
-    # Get today's progress
-    try:
-        today_progress = DailyProgress.objects.get(user=request.user, date=today)
-    except DailyProgress.DoesNotExist:
-        today_progress = None
-    
-    # Get active goals
-    active_goals = GoalTracking.objects.filter(
-        user=request.user, 
-        is_achieved=False,
-        target_date__gte=today
-    ).order_by('target_date')
-    
-    # Calculate daily calorie needs
-    daily_calories = 0
-    if profile and profile.weight and profile.height and profile.get_age():
-        # Basic BMR calculation (Mifflin-St Jeor Equation)
-        if profile.gender == 'male':
-            bmr = 10 * profile.weight + 6.25 * profile.height - 5 * profile.get_age() + 5
-        else:
-            bmr = 10 * profile.weight + 6.25 * profile.height - 5 * profile.get_age() - 161
-        
-        # Activity multiplier
-        activity_multipliers = {
-            'sedentary': 1.2,
-            'light': 1.375,
-            'moderate': 1.55,
-            'active': 1.725,
-            'very_active': 1.9
-        }
-        multiplier = activity_multipliers.get(profile.activity_level, 1.2)
-        daily_calories = int(bmr * multiplier)
-    
-    # Get upcoming workouts (next 7 days)
-    upcoming_workouts = WorkoutSchedule.objects.filter(
-        user=request.user,
-        scheduled_date__gte=today,
-        scheduled_date__lte=today + timedelta(days=7)
-    ).order_by('scheduled_date', 'scheduled_time')
-    
-    return render(request, 'ai_integration/dashboard.html', {
-        'profile': profile,
-        'today_workouts': today_workouts,
-        'today_meals': today_meals,
-        'today_progress': today_progress,
-        'active_goals': active_goals,
-        'daily_calories': daily_calories,
-        'upcoming_workouts': upcoming_workouts,
-        'today': today
-    })
+    return await _snapshot_page(request, 'ai_integration/dashboard.html')
 
 @login_required
-def personal_trainer_view(request):
+async def personal_trainer_view(request):
     """Main Personal Trainer Interface"""
-    from datetime import date, timedelta
-    
-    today = date.today()
-    
-    # Get user profile
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-    except UserProfile.DoesNotExist:
-        profile = None
-    
-    # Get today's schedule
-    today_workouts = WorkoutSchedule.objects.filter(
-        user=request.user, 
-        scheduled_date=today
-    ).order_by('scheduled_time')
-    
-    today_meals = MealPlan.objects.filter(
-        user=request.user, 
-        scheduled_date=today
-    ).order_by('scheduled_time')
-    
-    # Get this week's schedule
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-    
-    week_workouts = WorkoutSchedule.objects.filter(
-        user=request.user,
-        scheduled_date__range=[week_start, week_end]
-    ).order_by('scheduled_date', 'scheduled_time')
-    
-    week_meals = MealPlan.objects.filter(
-        user=request.user,
-        scheduled_date__range=[week_start, week_end]
-    ).order_by('scheduled_date', 'scheduled_time')
-    
-    # Create week days for template
-    week_days = [week_start + timedelta(days=i) for i in range(7)]
-    
-    return render(request, 'ai_integration/personal_trainer.html', {
-        'profile': profile,
-        'today_workouts': today_workouts,
-        'today_meals': today_meals,
-        'week_workouts': week_workouts,
-        'week_meals': week_meals,
-        'week_days': week_days,
-        'today': today,
-        'week_start': week_start,
-        'week_end': week_end
-    })
+    return await _snapshot_page(request, 'ai_integration/personal_trainer.html', tip=True)
 
 @login_required
 def create_sample_data(request):
     """Create sample workout and meal data for demonstration"""
-    from datetime import date, time, timedelta
-    
-    today = date.today()
-    
-    # Create sample workouts for the week
-    sample_workouts = [
-        {'name': 'Morning Cardio', 'type': 'Cardio', 'time': time(7, 0), 'duration': 30},
-        {'name': 'Strength Training', 'type': 'Strength', 'time': time(18, 0), 'duration': 45},
-        {'name': 'Yoga Session', 'type': 'Flexibility', 'time': time(19, 30), 'duration': 30},
-        {'name': 'HIIT Workout', 'type': 'HIIT', 'time': time(7, 0), 'duration': 25},
-        {'name': 'Swimming', 'type': 'Cardio', 'time': time(17, 0), 'duration': 40},
-    ]
-    
-    # Create sample meals
-    sample_meals = [
-        {'name': 'Protein Oatmeal', 'type': 'breakfast', 'time': time(8, 0), 'calories': 350},
-        {'name': 'Greek Yogurt', 'type': 'snack1', 'time': time(10, 30), 'calories': 150},
-        {'name': 'Grilled Chicken Salad', 'type': 'lunch', 'time': time(13, 0), 'calories': 450},
-        {'name': 'Apple & Almonds', 'type': 'snack2', 'time': time(15, 30), 'calories': 200},
-        {'name': 'Salmon & Vegetables', 'type': 'dinner', 'time': time(19, 0), 'calories': 500},
-    ]
+    # Created by a background worker, not in this request
+    enqueue('seed_sample_plan', user=request.user, priority=10)
     
-    # Create workouts for next 7 days
-    for i in range(7):
-        workout_day = today + timedelta(days=i)
-        workout = sample_workouts[i % len(sample_workouts)]
-        
-        WorkoutSchedule.objects.get_or_create(
-            user=request.user,
-            scheduled_date=workout_day,
-            scheduled_time=workout['time'],
-            defaults={
-                'workout_name': workout['name'],
-                'workout_type': workout['type'],
-                'duration_minutes': workout['duration'],
-                'is_completed': i < 2  # Mark first 2 days as completed
-            }
-        )
-    
-    # Create meals for next 7 days
-    for i in range(7):
-        meal_day = today + timedelta(days=i)
-        for meal in sample_meals:
-            MealPlan.objects.get_or_create(
-                user=request.user,
-                scheduled_date=meal_day,
-                scheduled_time=meal['time'],
-                meal_type=meal['type'],
-                defaults={
-                    'meal_name': meal['name'],
-                    'calories': meal['calories'],
-                    'protein': meal['calories'] * 0.3 / 4,  # Rough protein calculation
-                    'carbs': meal['calories'] * 0.4 / 4,   # Rough carbs calculation
-                    'fats': meal['calories'] * 0.3 / 9,    # Rough fats calculation
-                    'is_consumed': i < 2  # Mark first 2 days as consumed
-                }
-            )
+    messages.success(request, 'Sample data is being created! Refresh your Personal Trainer page in a moment.')
+    return redirect('trainer')
+
+
+@login_required
+@require_POST
+def generate_plan_view(request):
+    """Generate a personalized week of workouts and meals with the AI in the background"""
+    enqueue('generate_weekly_plan', user=request.user, priority=5)
     
-    messages.success(request, 'Sample data created successfully! Check your Personal Trainer page.')
-    return redirect('trainer')
\ No newline at end of file
+    messages.success(request, 'Your AI plan is being generated! Refresh your Personal Trainer page in a minute.')
+    return redirect('trainer')
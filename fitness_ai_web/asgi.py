@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Production serves this application through uvicorn workers (see Procfile), so
+async views such as the streaming chat endpoint can hold many open responses
+per worker while sync views keep running in the thread pool.
 """
 
 import os
@@ -17,6 +17,85 @@ from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Gemini REST endpoint override (e.g. the load-test stub); empty uses Google's API
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+
+# LLM gateway: provider class (use ai_integration.llm.StubProvider for tests/offline runs),
+# per-process concurrency cap, wait queue, per-call deadline, retries and circuit breaker
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ai_integration.llm.GeminiProvider")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2"))  # seconds
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "30"))  # seconds
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # seconds
+# Coalesce identical in-flight prompts across workers through a shared cache
+# (needs a cache backend shared between processes, e.g. Redis or the database cache)
+LLM_COALESCE_ACROSS_WORKERS = os.getenv("LLM_COALESCE_ACROSS_WORKERS", "False").lower() == "true"
+LLM_COALESCE_CACHE = os.getenv("LLM_COALESCE_CACHE", "default")
+# Load the LLM client in each gunicorn worker right after fork (gunicorn.conf.py) rather than on the first call
+LLM_WARMUP = os.getenv("LLM_WARMUP", "True").lower() == "true"
+# LLM telemetry: one LLMCall row per call or cached answer, buffered in memory and inserted
+# LLM_TELEMETRY_BATCH_SIZE at a time or every LLM_TELEMETRY_FLUSH_INTERVAL seconds;
+# costs in the admin use these prices in USD per million tokens
+LLM_TELEMETRY_BATCH_SIZE = int(os.getenv("LLM_TELEMETRY_BATCH_SIZE", "100"))
+LLM_TELEMETRY_FLUSH_INTERVAL = float(os.getenv("LLM_TELEMETRY_FLUSH_INTERVAL", "10"))  # seconds
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0.5"))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "1.5"))
+
+# Upper bound on the estimated input tokens of a chat prompt
+PROMPT_MAX_INPUT_TOKENS = int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "1000"))
+
+# Per-process cache of chat answers keyed by question + profile fingerprint
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000"))
+CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", "3600"))  # seconds
+
+# Delta sync for the mobile app
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))  # rows per model per response
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "5"))  # re-sent window for late commits
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))  # older cursors get a full resync
+
+# Bearer tokens for the mobile app
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))  # seconds
+REFRESH_TOKEN_TTL_DAYS = int(os.getenv("REFRESH_TOKEN_TTL_DAYS", "30"))
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))  # seconds a resolved user is reused
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
+
+# Profile rows cached across requests for request.user_context (dropped on profile save)
+USER_CONTEXT_CACHE_TTL = int(os.getenv("USER_CONTEXT_CACHE_TTL", "300"))  # seconds
+
+# Background jobs (manage.py run_jobs): worker pool size, idle polling, how long a claimed
+# job stays hidden from other workers, retries and the base of the exponential retry backoff
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # seconds
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "600"))  # seconds
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "10"))  # seconds
+
+# AI weekly plans are shared by profiles with identical constraints for this long
+PLAN_REUSE_DAYS = int(os.getenv("PLAN_REUSE_DAYS", "30"))
+
+# Chat context: the latest turns verbatim plus a rolling summary of older ones,
+# together under CHAT_CONTEXT_MAX_TOKENS; the summary absorbs CHAT_SUMMARY_EVERY turns at a time
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "4"))
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "600"))
+CHAT_SUMMARY_EVERY = int(os.getenv("CHAT_SUMMARY_EVERY", "6"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "200"))
+
+# Near-duplicate chat answers served from a per-process vector index of past questions;
+# set SEMANTIC_INDEX_PATH (e.g. /var/lib/fitness_ai/semantic_index.npz) so workers start warm
+SEMANTIC_MATCH_THRESHOLD = float(os.getenv("SEMANTIC_MATCH_THRESHOLD", "0.85"))
+SEMANTIC_INDEX_MAX_ENTRIES = int(os.getenv("SEMANTIC_INDEX_MAX_ENTRIES", "5000"))
+SEMANTIC_INDEX_PATH = os.getenv("SEMANTIC_INDEX_PATH", "")
+SEMANTIC_INDEX_SAVE_EVERY = int(os.getenv("SEMANTIC_INDEX_SAVE_EVERY", "50"))
+
+# Request metrics at /metrics: with METRICS_DIR set, worker processes share their histograms
+# through snapshot files written at most every METRICS_FLUSH_INTERVAL seconds.
+# Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; without a token only staff can read it
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # seconds
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 
 from pathlib import Path
@@ -50,12 +129,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "ai_integration.metrics.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "ai_integration.middleware.bearer_token_middleware",
+    "ai_integration.middleware.user_context_middleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -72,7 +154,8 @@ ROOT_URLCONF = "fitness_ai_web.urls"
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates reporting render times to the request metrics
+        'BACKEND': 'ai_integration.metrics.TimedDjangoTemplates',
         'DIRS': [], 
         'APP_DIRS': True,  
         'OPTIONS': {
@@ -88,6 +171,7 @@ TEMPLATES = [
 
 
 WSGI_APPLICATION = "fitness_ai_web.wsgi.application"
+ASGI_APPLICATION = "fitness_ai_web.asgi.application"
 
 
 # Database
@@ -100,6 +184,36 @@ DATABASES = {
     )
 }
 
+# Dashboard and trainer pages (async views): optionally run their independent queries at the same time
+# on DASHBOARD_QUERY_THREADS threads, each with its own database connection (up to that many extra
+# connections per worker: size max_connections for it; worth it against a remote database, not sqlite),
+# and with DASHBOARD_AI_TIP ask the LLM for the trainer page's tip of the day alongside them
+DASHBOARD_PARALLEL_QUERIES = os.getenv("DASHBOARD_PARALLEL_QUERIES", "False").lower() == "true"
+DASHBOARD_QUERY_THREADS = int(os.getenv("DASHBOARD_QUERY_THREADS", "4"))
+DASHBOARD_AI_TIP = os.getenv("DASHBOARD_AI_TIP", "False").lower() == "true"
+DASHBOARD_TIP_TIMEOUT = float(os.getenv("DASHBOARD_TIP_TIMEOUT", "3"))  # seconds
+
+# Cache
+# API version stamps and cross-worker coalescing need a cache shared by all workers
+REDIS_URL = os.getenv("REDIS_URL")
+# Whether every worker sees the same cache. Without it a write handled by one worker
+# cannot invalidate another's entries, so 304s from version stamps and the cross-request
+# profile cache are turned off and those requests read the database instead
+CACHE_SHARED = os.getenv("CACHE_SHARED", str(bool(REDIS_URL))).lower() == "true"
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 
 # Password validation
@@ -0,0 +1,16 @@
+"""Gunicorn settings, read automatically when gunicorn starts in this directory (see Procfile)"""
+
+
+def post_worker_init(worker):
+    """Load the LLM client in each worker after fork, before it accepts requests"""
+    from django.conf import settings
+
+    if not settings.LLM_WARMUP:
+        return
+    from ai_integration.llm import warm_up
+
+    try:
+        worker.log.info("LLM client warmed up in %.2fs", warm_up())
+    except Exception:
+        # The first LLM call loads it instead (and reports the problem to its caller)
+        worker.log.exception("LLM client warm-up failed")
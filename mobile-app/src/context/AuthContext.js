@@ -1,6 +1,6 @@
 import React, {createContext, useContext, useReducer, useEffect} from 'react';
 import AsyncStorage from '@react-native-async-storage/async-storage';
-import {api} from '../services/api';
+import {authAPI} from '../services/api';
 
 const AuthContext = createContext();
 
@@ -83,15 +83,13 @@ export const AuthProvider = ({children}) => {
     try {
       dispatch({type: 'LOGIN_START'});
       
-      const response = await api.post('/auth/login/', {
-        username: phoneNumber,
-        password: password,
-      });
+      const response = await authAPI.login(phoneNumber, password);
 
       if (response.data.success) {
-        const {user, token} = response.data;
+        const {user, token, refresh_token} = response.data;
         
         await AsyncStorage.setItem('token', token);
+        await AsyncStorage.setItem('refresh_token', refresh_token);
         await AsyncStorage.setItem('user', JSON.stringify(user));
         
         dispatch({
@@ -117,7 +115,7 @@ export const AuthProvider = ({children}) => {
     try {
       dispatch({type: 'LOGIN_START'});
       
-      const response = await api.post('/auth/register/', userData);
+      const response = await authAPI.register(userData);
 
       if (response.data.success) {
         return {success: true, message: 'Registration successful'};
@@ -136,7 +134,13 @@ export const AuthProvider = ({children}) => {
 
   const logout = async () => {
     try {
+      const refreshToken = await AsyncStorage.getItem('refresh_token');
+      if (refreshToken) {
+        // Best effort: the local logout must not depend on the network
+        authAPI.logout(refreshToken).catch(() => {});
+      }
       await AsyncStorage.removeItem('token');
+      await AsyncStorage.removeItem('refresh_token');
       await AsyncStorage.removeItem('user');
       dispatch({type: 'LOGOUT'});
     } catch (error) {
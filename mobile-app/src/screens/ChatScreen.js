@@ -57,26 +57,29 @@ const ChatScreen = ({navigation}) => {
     setInputText('');
     setIsLoading(true);
 
-    try {
-      const response = await chatAPI.sendMessage(inputText.trim());
-      
-      const aiMessage = {
-        id: Date.now() + 1,
-        text: response.data.message || 'I apologize, but I encountered an error. Please try again.',
-        isUser: false,
-        timestamp: new Date().toISOString(),
-      };
+    const aiMessageId = Date.now() + 1;
+    const updateAiMessage = text =>
+      setMessages(prev => {
+        const existing = prev.find(item => item.id === aiMessageId);
+        if (existing) {
+          return prev.map(item => (item.id === aiMessageId ? {...item, text} : item));
+        }
+        return [
+          ...prev,
+          {id: aiMessageId, text, isUser: false, timestamp: new Date().toISOString()},
+        ];
+      });
 
-      setMessages(prev => [...prev, aiMessage]);
+    try {
+      // Render partial text as soon as the first tokens arrive
+      const answer = await chatAPI.streamMessage(userMessage.text, (chunk, soFar) => {
+        setIsLoading(false);
+        updateAiMessage(soFar);
+      });
+      updateAiMessage(answer || 'I apologize, but I encountered an error. Please try again.');
     } catch (error) {
       console.error('Error sending message:', error);
-      const errorMessage = {
-        id: Date.now() + 1,
-        text: 'I apologize, but I encountered an error. Please try again.',
-        isUser: false,
-        timestamp: new Date().toISOString(),
-      };
-      setMessages(prev => [...prev, errorMessage]);
+      updateAiMessage('I apologize, but I encountered an error. Please try again.');
     } finally {
       setIsLoading(false);
     }
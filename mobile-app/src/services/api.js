@@ -27,17 +27,62 @@ api.interceptors.request.use(
   },
 );
 
+// Trade the refresh token for a new pair. Concurrent 401s share one in-flight
+// refresh: the server rotates refresh tokens and treats a reused one as stolen.
+let pendingRefresh = null;
+
+const clearSession = async () => {
+  await AsyncStorage.removeItem('token');
+  await AsyncStorage.removeItem('refresh_token');
+  await AsyncStorage.removeItem('user');
+  // You can dispatch a logout action here
+};
+
+// Resolves with the new access token, or null once the session is gone
+const refreshAccessToken = () => {
+  if (!pendingRefresh) {
+    pendingRefresh = (async () => {
+      const refreshToken = await AsyncStorage.getItem('refresh_token');
+      if (!refreshToken) {
+        return null;
+      }
+      try {
+        const {data} = await axios.post(`${BASE_URL}/api/auth/refresh/`, {
+          refresh_token: refreshToken,
+        });
+        await AsyncStorage.setItem('token', data.token);
+        await AsyncStorage.setItem('refresh_token', data.refresh_token);
+        return data.token;
+      } catch (refreshError) {
+        // Refresh token expired or revoked
+        return null;
+      }
+    })().finally(() => {
+      pendingRefresh = null;
+    });
+  }
+  return pendingRefresh;
+};
+
 // Response interceptor to handle errors
 api.interceptors.response.use(
   response => {
     return response;
   },
   async error => {
-    if (error.response?.status === 401) {
+    const original = error.config;
+    if (error.response?.status === 401 && original && !original._retried) {
+      // Access tokens are short-lived: refresh once and replay the request
+      if (!original.url.includes('/api/auth/')) {
+        original._retried = true;
+        const token = await refreshAccessToken();
+        if (token) {
+          original.headers.Authorization = `Bearer ${token}`;
+          return api(original);
+        }
+      }
       // Token expired or invalid
-      await AsyncStorage.removeItem('token');
-      await AsyncStorage.removeItem('user');
-      // You can dispatch a logout action here
+      await clearSession();
     }
     return Promise.reject(error);
   },
@@ -54,7 +99,8 @@ export const authAPI = {
   register: userData =>
     api.post('/api/auth/register/', userData),
   
-  logout: () => api.post('/api/auth/logout/'),
+  logout: refreshToken =>
+    api.post('/api/auth/logout/', {refresh_token: refreshToken}),
 };
 
 export const userAPI = {
@@ -79,9 +125,107 @@ export const mealAPI = {
   markConsumed: id => api.patch(`/api/meals/${id}/consume/`),
 };
 
+// Parse Server-Sent Event frames out of a partially received response body
+const parseSSEFrames = (text, fromIndex, onEvent) => {
+  let index = fromIndex;
+  let end = text.indexOf('\n\n', index);
+  while (end !== -1) {
+    const frame = text.slice(index, end);
+    const eventLine = frame.match(/^event: (.*)$/m);
+    const dataLine = frame.match(/^data: (.*)$/m);
+    if (eventLine && dataLine) {
+      onEvent(eventLine[1], JSON.parse(dataLine[1]));
+    }
+    index = end + 2;
+    end = text.indexOf('\n\n', index);
+  }
+  return index;
+};
+
 export const chatAPI = {
   sendMessage: message => api.post('/api/chat/', {message}),
-  getChatHistory: () => api.get('/api/chat/history/'),
+  // Newest first; pass next_cursor from the previous page to load older messages
+  getChatHistory: cursor => api.get('/api/chat/history/', {params: cursor ? {cursor} : {}}),
+
+  // Streams the answer token by token; onToken receives each partial chunk.
+  // Resolves with the full answer once the server sends the final "done" event.
+  // An expired access token is refreshed and the question sent again once.
+  streamMessage: async (message, onToken) => {
+    const token = await AsyncStorage.getItem('token');
+    try {
+      return await openChatStream(message, onToken, token);
+    } catch (error) {
+      if (error.status !== 401) {
+        throw error;
+      }
+      const freshToken = await refreshAccessToken();
+      if (!freshToken) {
+        await clearSession();
+        throw error;
+      }
+      return openChatStream(message, onToken, freshToken);
+    }
+  },
+};
+
+const openChatStream = (message, onToken, token) =>
+  new Promise((resolve, reject) => {
+    const xhr = new XMLHttpRequest();
+    let parsedUpTo = 0;
+    let answer = '';
+    let failed = null;
+    const handleEvent = (event, data) => {
+      if (event === 'token') {
+        answer += data.text;
+        onToken && onToken(data.text, answer);
+      } else if (event === 'done') {
+        answer = data.answer;
+      } else if (event === 'error') {
+        failed = new Error(data.message);
+      }
+    };
+    xhr.open('POST', `${BASE_URL}/api/chat/stream/`);
+    xhr.setRequestHeader('Content-Type', 'application/json');
+    xhr.setRequestHeader('Accept', 'text/event-stream');
+    if (token) {
+      xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+    }
+    xhr.onprogress = () => {
+      if (xhr.status < 400) {
+        parsedUpTo = parseSSEFrames(xhr.responseText, parsedUpTo, handleEvent);
+      }
+    };
+    xhr.onload = () => {
+      if (xhr.status >= 400) {
+        const error = new Error(`Chat stream failed with status ${xhr.status}`);
+        error.status = xhr.status;
+        reject(error);
+        return;
+      }
+      parsedUpTo = parseSSEFrames(xhr.responseText, parsedUpTo, handleEvent);
+      if (failed) {
+        reject(failed);
+      } else {
+        resolve(answer);
+      }
+    };
+    xhr.onerror = () => reject(new Error('Network error while streaming chat'));
+    xhr.send(JSON.stringify({message}));
+  });
+
+// Delta sync: pass the cursor from the previous response (null for a full sync)
+// and keep pulling while has_more is true. Rows come column-wise per resource.
+export const syncAPI = {
+  pull: cursor => api.get('/api/sync/', {params: cursor ? {cursor} : {}}),
+};
+
+// Slow work runs as a background job; poll its status until it has finished
+export const jobsAPI = {
+  getJob: id => api.get(`/api/jobs/${id}/`),
+};
+
+export const plansAPI = {
+  generate: data => api.post('/api/plans/generate/', data),
 };
 
 export const progressAPI = {